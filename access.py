@@ -0,0 +1,94 @@
+"""Область доступа пользователя к группам.
+
+Группы пользователя (таблица user_groups) читаются один раз и кэшируются в
+памяти процесса по user_id; add_user, edit_user и delete_user вызывают
+invalidate(). В SQL ограничение накладывается соединением с user_groups по
+первичному ключу (user_id, group_id), а не списком IN (?, ?, ...).
+"""
+import threading
+
+from flask import session
+
+from db import get_db
+import permissions
+
+
+class GroupScopeCache:
+    """Множества group_id пользователей с версиями для сброса."""
+
+    def __init__(self):
+        self._groups = {}
+        self._versions = {}
+        self._lock = threading.Lock()
+
+    def invalidate(self, user_id):
+        user_id = int(user_id)
+        with self._lock:
+            self._versions[user_id] = self._versions.get(user_id, 0) + 1
+            self._groups.pop(user_id, None)
+
+    def group_ids(self, user_id):
+        user_id = int(user_id)
+        with self._lock:
+            version = self._versions.get(user_id, 0)
+            groups = self._groups.get(user_id)
+        if groups is not None:
+            return groups
+        conn = get_db()
+        try:
+            groups = frozenset(
+                row['group_id'] for row in conn.execute("SELECT group_id FROM user_groups WHERE user_id = ?", (user_id,))
+            )
+        finally:
+            conn.close()
+        with self._lock:
+            # Назначения изменились во время чтения — прочитанное не сохраняем
+            if self._versions.get(user_id, 0) == version:
+                self._groups[user_id] = groups
+        return groups
+
+
+cache = GroupScopeCache()
+
+
+def invalidate(user_id):
+    cache.invalidate(user_id)
+
+
+def is_unrestricted():
+    """Администратор видит все группы; роль берётся из кэша прав, а не из копии в сессии."""
+    user_id = session.get('user_id')
+    if user_id is None:
+        return False
+    user = permissions.cache.get(get_db, user_id)
+    return user is not None and user.role == 'admin'
+
+
+def user_group_ids():
+    """Группы текущего пользователя (frozenset; пустой без входа)."""
+    user_id = session.get('user_id')
+    if user_id is None:
+        return frozenset()
+    return cache.group_ids(user_id)
+
+
+def can_access_group(group_id):
+    return is_unrestricted() or group_id in user_group_ids()
+
+
+def has_any_group():
+    return is_unrestricted() or bool(user_group_ids())
+
+
+def scope_join(group_column='s.group_id'):
+    """JOIN, ограничивающий строки группами текущего пользователя: (sql, params).
+
+    Для администратора — пустая строка. Вставляется сразу после FROM-таблицы,
+    параметры идут перед параметрами WHERE.
+    """
+    if is_unrestricted():
+        return "", []
+    return (
+        f" JOIN user_groups scope ON scope.group_id = {group_column} AND scope.user_id = ?",
+        [session.get('user_id')],
+    )
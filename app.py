@@ -6,8 +6,13 @@ from routes.auth import auth_bp
 from routes.students import students_bp
 from routes.admin import admin_bp
 import argparse
-from utils import log_action
+import multiprocessing
+from utils import log_action, configure_file_logging
 from gen_docx import format_grade
+from db import get_db, init_app as init_db_app
+from migrations import migrate
+import export_jobs
+import sql_profiler
 import json
 
 # Инициализация приложения Flask
@@ -31,6 +36,23 @@ app.register_blueprint(admin_bp)
 app.register_blueprint(students_bp)
 app.jinja_env.filters['format_grade'] = format_grade
 
+# Одно соединение с БД на запрос, возвращается в пул по завершении
+init_db_app(app)
+
+# Профилирование SQL по запросам (включается SQL_PROFILING в config.py)
+sql_profiler.init_app(app)
+
+# Файл журнала, обновление схемы существующей базы до последней версии. Воркеры
+# рендеринга (render_engine) импортируют главный модуль повторно как __mp_main__,
+# ещё до того, как parent_process() заполнен, — там это не выполняется
+if __name__ != '__mp_main__' and multiprocessing.parent_process() is None:
+    configure_file_logging()
+    conn = get_db()
+    migrate(conn)
+    # Задания экспорта, прерванные остановкой приложения, выполняются заново
+    export_jobs.recover(conn)
+    conn.close()
+
 # --- Запуск приложения ---
 if __name__ == '__main__':
     """
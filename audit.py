@@ -0,0 +1,230 @@
+"""Асинхронный журнал действий пользователей (audit trail).
+
+log_action() на потоке запроса только кладёт событие в очередь. Фоновый поток
+забирает события пачками, записывает их в таблицы audit_log/audit_log_groups
+одной транзакцией и выводит строку в журнал app.log, поэтому запрос не ждёт
+ни файла, ни базы.
+"""
+import atexit
+import json
+import logging
+import os
+import queue
+import sqlite3
+import threading
+from datetime import datetime
+
+import group_names as group_names_cache
+
+# Логгер приложения (настраивается в utils.py)
+logger = logging.getLogger('Students')
+
+BATCH_SIZE = 500
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS audit_log (
+    id          INTEGER PRIMARY KEY AUTOINCREMENT,
+    created_at  TEXT NOT NULL,
+    user_id     INTEGER,
+    username    TEXT NOT NULL,
+    role        TEXT,
+    action      TEXT NOT NULL,
+    mode        TEXT,
+    student_id  INTEGER,
+    group_ids   TEXT
+);
+CREATE INDEX IF NOT EXISTS idx_audit_log_created ON audit_log (created_at);
+CREATE INDEX IF NOT EXISTS idx_audit_log_user_created ON audit_log (username, created_at);
+CREATE INDEX IF NOT EXISTS idx_audit_log_student ON audit_log (student_id, created_at);
+CREATE TABLE IF NOT EXISTS audit_log_groups (
+    audit_id  INTEGER NOT NULL REFERENCES audit_log (id) ON DELETE CASCADE,
+    group_id  INTEGER NOT NULL,
+    PRIMARY KEY (group_id, audit_id)
+) WITHOUT ROWID;
+"""
+
+
+def install(conn):
+    """Создаёт таблицы журнала и индексы."""
+    conn.executescript(SCHEMA)
+
+
+class AuditWriter:
+    """Очередь событий и фоновый поток, который их записывает."""
+
+    def __init__(self):
+        self._queue = queue.Queue()
+        self._lock = threading.Lock()
+        self._thread = None
+        self._pid = None
+
+    def submit(self, event):
+        self._ensure_started()
+        self._queue.put(event)
+
+    def flush(self):
+        """Ждёт, пока все поставленные события будут записаны."""
+        if self._running():
+            self._queue.join()
+
+    def _running(self):
+        return self._thread is not None and self._pid == os.getpid() and self._thread.is_alive()
+
+    def _ensure_started(self):
+        if self._running():
+            return
+        with self._lock:
+            if self._running():
+                return
+            if self._pid != os.getpid():
+                # В дочернем процессе поток родителя не существует — начинаем заново
+                self._queue = queue.Queue()
+                self._pid = os.getpid()
+            # Поток этого процесса завершился — новый продолжает ту же очередь
+            self._thread = threading.Thread(target=self._run, name='audit-writer', daemon=True)
+            self._thread.start()
+
+    def _run(self):
+        from db import connect
+
+        conn = None
+        while True:
+            batch = [self._queue.get()]
+            while len(batch) < BATCH_SIZE:
+                try:
+                    batch.append(self._queue.get_nowait())
+                except queue.Empty:
+                    break
+            try:
+                if conn is None:
+                    conn = connect()
+                self._write(conn, batch)
+            except Exception as e:
+                # Любая ошибка пачки не должна останавливать поток: иначе очередь растёт,
+                # а flush() при завершении ждёт вечно. События пачки записываются
+                # по одному, и теряются только те, что не записываются сами
+                logger.error(f"Помилка запису журналу дій: {e}")
+                conn = self._write_each(_discard(conn), batch)
+            try:
+                for event in batch:
+                    _log_line(conn, event)
+            except Exception as e:
+                logger.error(f"Помилка виводу журналу дій: {e}")
+            finally:
+                for _ in batch:
+                    self._queue.task_done()
+
+    def _write_each(self, conn, batch):
+        """Записывает события отдельными транзакциями; пропущенные выводит в журнал."""
+        from db import connect
+
+        for event in batch:
+            try:
+                if conn is None:
+                    conn = connect()
+                self._write(conn, [event])
+            except Exception as e:
+                logger.error(f"Подію журналу дій пропущено: {event['username']} - {event['action']}: {e}")
+                conn = _discard(conn)
+        return conn
+
+    def _write(self, conn, batch):
+        for event in batch:
+            audit_id = conn.execute("""
+                INSERT INTO audit_log (created_at, user_id, username, role, action, mode, student_id, group_ids)
+                VALUES (?, ?, ?, ?, ?, ?, ?, ?)
+            """, (
+                event['created_at'], event['user_id'], event['username'], event['role'], event['action'],
+                event['mode'], event['student_id'],
+                json.dumps(event['group_ids']) if event['group_ids'] is not None else None
+            )).lastrowid
+            if event['group_ids']:
+                conn.executemany(
+                    "INSERT OR IGNORE INTO audit_log_groups (audit_id, group_id) VALUES (?, ?)",
+                    [(audit_id, group_id) for group_id in event['group_ids'] if group_id is not None]
+                )
+        conn.commit()
+
+
+def _discard(conn):
+    """Откатывает и закрывает соединение после ошибки записи."""
+    if conn is not None:
+        try:
+            conn.rollback()
+        except sqlite3.Error:
+            pass
+        conn.dispose()
+    return None
+
+
+def _log_line(conn, event):
+    """Строка журнала app.log в прежнем формате."""
+    username, action = event['username'], event['action']
+    if event['mode']:
+        logger.info(f"👤 {username} - {action} (режим: {event['mode']})")
+        return
+    group_ids = [group_id for group_id in (event['group_ids'] or []) if group_id is not None]
+    if event['group_ids'] is not None and event['role'] != 'admin':
+        group_names = ''
+        if group_ids and conn is not None:
+            group_names = ', '.join(group_names_cache.display_names(conn, group_ids))
+        logger.info(f"👤 {username} - {action} (групи: {group_names or 'немає груп'})")
+    else:
+        logger.info(f"👤 {username} - {action}")
+
+
+writer = AuditWriter()
+atexit.register(writer.flush)
+
+
+def _as_list(group_ids):
+    if group_ids is None:
+        return None
+    if isinstance(group_ids, (list, tuple, set)):
+        return list(group_ids)
+    return [group_ids]
+
+
+def record(username, action, group_ids=None, mode=None, student_id=None, user_id=None, role=None):
+    """Ставит событие в очередь записи; не выполняет ввод-вывод."""
+    writer.submit({
+        'created_at': datetime.now().strftime('%Y-%m-%d %H:%M:%S'),
+        'user_id': user_id,
+        'username': username,
+        'role': role,
+        'action': action,
+        'mode': mode,
+        'student_id': student_id,
+        'group_ids': _as_list(group_ids),
+    })
+
+
+def query(conn, username=None, date_from=None, date_to=None, group_id=None, student_id=None, limit=100, offset=0):
+    """События журнала с фильтрами по пользователю, периоду, группе и студенту, новые первыми.
+
+    date_from/date_to — строки 'YYYY-MM-DD' или 'YYYY-MM-DD HH:MM:SS' (date_to включительно по дню).
+    """
+    where = []
+    params = []
+    if username:
+        where.append("a.username = ?")
+        params.append(username)
+    if date_from:
+        where.append("a.created_at >= ?")
+        params.append(date_from)
+    if date_to:
+        where.append("a.created_at <= ?")
+        params.append(date_to if len(date_to) > 10 else f"{date_to} 23:59:59")
+    if group_id:
+        where.append("a.id IN (SELECT audit_id FROM audit_log_groups WHERE group_id = ?)")
+        params.append(group_id)
+    if student_id:
+        where.append("a.student_id = ?")
+        params.append(student_id)
+    where_sql = f"WHERE {' AND '.join(where)}" if where else ""
+    return conn.execute(f"""
+        SELECT a.* FROM audit_log a
+        {where_sql}
+        ORDER BY a.created_at DESC, a.id DESC
+        LIMIT ? OFFSET ?
+    """, params + [limit, offset]).fetchall()
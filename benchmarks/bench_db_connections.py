@@ -0,0 +1,99 @@
+"""Бенчмарк соединений с БД: запросы в секунду для student_list и student_details.
+
+Сравниваются два режима на одной синтетической базе:
+  legacy  — новое sqlite3.connect() на каждый вызов get_db(), как было раньше;
+  pooled  — текущий db.get_db(): одно соединение на запрос, пул, WAL и PRAGMA из config.
+
+Пример:
+    python benchmarks/bench_db_connections.py --groups 20 --students 100 --requests 300
+"""
+import argparse
+import logging
+import os
+import sqlite3
+import sys
+import tempfile
+import time
+
+sys.path.insert(0, os.path.dirname(os.path.abspath(__file__)))
+from synthetic import build_database  # noqa: E402
+
+
+def legacy_get_db_factory(path):
+    """get_db() в том виде, в каком он был до пула соединений."""
+    import db
+
+    def legacy_get_db():
+        conn = sqlite3.connect(path)
+        conn.row_factory = sqlite3.Row
+        conn.create_collation("UKRAINIAN", db.ukrainian_collation)
+        conn.create_function("ukrainian_sort_key", 1, db.ukrainian_sort_key, deterministic=True)
+        conn.execute("PRAGMA foreign_keys = ON")
+        return conn
+
+    return legacy_get_db
+
+
+def patch_get_db(replacement):
+    """Подменяет get_db во всех модулях приложения, которые его импортировали."""
+    patched = {}
+    for name, module in list(sys.modules.items()):
+        if module is not None and callable(getattr(module, 'get_db', None)) and name != 'db':
+            patched[name] = module.get_db
+            module.get_db = replacement
+    return patched
+
+
+def run(client, urls, requests):
+    """Выполняет запросы по кругу и возвращает число запросов в секунду."""
+    for url in urls:
+        response = client.get(url)
+        assert response.status_code == 200, (url, response.status_code)
+    started = time.perf_counter()
+    for index in range(requests):
+        client.get(urls[index % len(urls)])
+    return requests / (time.perf_counter() - started)
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument('--groups', type=int, default=20)
+    parser.add_argument('--students', type=int, default=100, help='студентов в группе')
+    parser.add_argument('--requests', type=int, default=300, help='запросов на каждый сценарий')
+    parser.add_argument('--db', help='путь к базе (по умолчанию временная)')
+    args = parser.parse_args()
+
+    # config.DB_PATH читается при импорте, поэтому путь задаётся до первого импорта приложения
+    path = os.path.abspath(args.db or os.path.join(tempfile.mkdtemp(prefix='students-bench-'), 'students.db'))
+    os.environ['STUDENTS_DB'] = path
+    build_database(path, groups=args.groups, students_per_group=args.students)
+
+    from app import app
+    logging.getLogger('Students').setLevel(logging.WARNING)
+
+    client = app.test_client()
+    client.post('/login', data={'username': 'admin', 'password': 'admin123'})
+
+    total = args.groups * args.students
+    scenarios = {
+        'student_list': ['/students', '/students?sort_by=last_name_UA&sort_order=asc&per_page=50',
+                         '/students?search=Шевч'],
+        'student_details': [f'/students/{student_id}' for student_id in range(1, total + 1, max(total // 20, 1))],
+    }
+
+    results = {}
+    pooled_get_db = sys.modules['db'].get_db
+    for mode in ['legacy', 'pooled']:
+        patch_get_db(legacy_get_db_factory(path) if mode == 'legacy' else pooled_get_db)
+        for name, urls in scenarios.items():
+            results[(name, mode)] = run(client, urls, args.requests)
+
+    print(f"База: {path} ({total} студентів)")
+    print(f"{'сценарій':<18}{'legacy, rps':>14}{'pooled, rps':>14}{'прискорення':>14}")
+    for name in scenarios:
+        legacy, pooled = results[(name, 'legacy')], results[(name, 'pooled')]
+        print(f"{name:<18}{legacy:>14.1f}{pooled:>14.1f}{pooled / legacy:>13.2f}x")
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,103 @@
+"""Бенчмарк кэша шаблонов DOCX: время на документ без кэша, при холодном и тёплом кэше.
+
+Режимы на одном синтетическом шаблоне додатку до диплома:
+  uncached — DocxTemplate(path) на каждый документ, как было раньше;
+  cold     — первый документ после очистки кэша (чтение, разбор и компиляция шаблона);
+  warm     — последующие документы из кэша docx_templates.
+
+Перед замером проверяется, что document.xml результата совпадает в обоих вариантах.
+
+Пример:
+    python benchmarks/bench_docx_templates.py --documents 30
+"""
+import argparse
+import io
+import logging
+import os
+import statistics
+import sys
+import time
+import zipfile
+
+sys.path.insert(0, os.path.dirname(os.path.abspath(__file__)))
+from synthetic import build_template  # noqa: E402
+
+
+def make_context(index, subjects=30):
+    """Контекст одного студента в том виде, в каком его собирает gen_doc."""
+    def rows(prefix, count):
+        return [{'code': f'{prefix}{k + 1}', 'name': f'Дисципліна {k + 1}', 'credits': str(3 + k % 4),
+                 'grade': f'Добре / Good {80 + (index + k) % 10} B'} for k in range(count)]
+
+    return {
+        'last_name_UA': f'Шевченко{index}', 'first_name_UA': 'Тарас', 'middle_name_UA': 'Григорович',
+        'last_name_ENG': f'Shevchenko{index}', 'first_name_ENG': 'Taras', 'birth_date': '09/03/2004',
+        'qualification_name': 'Бакалавр', 'qualification_name_en': 'Bachelor',
+        'specialty': '121 Інженерія програмного забезпечення', 'specialty_en': '121 Software Engineering',
+        'educational_program': 'Інженерія програмного забезпечення', 'study_form_eu': 'Full',
+        'study_years': '4', 'start_year': '2021', 'document_number': f'АА{index:06d}',
+        'accreditation_text': 'Сертифікат про акредитацію', 'diploma_with_honor_text': 'Інформація відсутня',
+        'diploma_number': f'{index:06d}', 'appendix_number': f'{index:06d}',
+        'subjects_grades': rows('ОК', subjects), 'practice_data': rows('П', 2),
+        'coursework_data': rows('К', 2), 'attestation_data': rows('А', 1),
+        'learning_outcomes': ['Результат 1', 'Результат 2'], 'learning_outcomes_en': ['Outcome 1', 'Outcome 2'],
+        'program_includes': ['Модуль 1'], 'program_includes_en': ['Module 1'],
+    }
+
+
+def render(doc, context):
+    out = io.BytesIO()
+    doc.render(context)
+    doc.save(out)
+    return out.getvalue()
+
+
+def document_xml(data):
+    with zipfile.ZipFile(io.BytesIO(data)) as archive:
+        return archive.read('word/document.xml'), archive.read('word/header1.xml')
+
+
+def timed(callable_):
+    started = time.perf_counter()
+    callable_()
+    return time.perf_counter() - started
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument('--documents', type=int, default=30, help='документов на режим (как студентов в группе)')
+    parser.add_argument('--rounds', type=int, default=5, help='повторов холодного замера')
+    parser.add_argument('--template', help='путь к шаблону (по умолчанию синтетический)')
+    args = parser.parse_args()
+
+    from docxtpl import DocxTemplate
+    import docx_templates
+    logging.getLogger('Students').setLevel(logging.WARNING)
+
+    path = args.template or build_template()
+    contexts = [make_context(index) for index in range(args.documents)]
+
+    expected = document_xml(render(DocxTemplate(path), contexts[0]))
+    actual = document_xml(render(docx_templates.load(path), contexts[0]))
+    assert expected == actual, "результат рендеринга из кэша отличается от DocxTemplate"
+
+    uncached = [timed(lambda c=context: render(DocxTemplate(path), c)) for context in contexts]
+
+    cold = []
+    for _ in range(args.rounds):
+        docx_templates.cache.clear()
+        cold.append(timed(lambda: render(docx_templates.load(path), contexts[0])))
+    warm = [timed(lambda c=context: render(docx_templates.load(path), c)) for context in contexts]
+
+    size = os.path.getsize(path)
+    print(f"Шаблон: {path} ({size / 1024:.0f} КБ), документів: {args.documents}")
+    print(f"{'режим':<10}{'мс / документ (медіана)':>26}{'мін':>10}{'макс':>10}")
+    for name, samples in [('uncached', uncached), ('cold', cold), ('warm', warm)]:
+        print(f"{name:<10}{statistics.median(samples) * 1000:>26.1f}"
+              f"{min(samples) * 1000:>10.1f}{max(samples) * 1000:>10.1f}")
+    print(f"Прискорення warm відносно uncached: {statistics.median(uncached) / statistics.median(warm):.2f}x")
+    print(f"Кэш: {docx_templates.cache.stats()}")
+
+
+if __name__ == '__main__':
+    main()
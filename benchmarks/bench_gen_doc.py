@@ -0,0 +1,208 @@
+"""Бенчмарк генерации документов gen_docx на синтетической базе и шаблоне.
+
+Сценарии:
+  single     — документы по одному студенту с замером фаз: загрузка шаблона
+               (холодная и из кэша), выборка данных, сборка контекста,
+               рендеринг и сохранение;
+  sequential — вся группа в одном процессе (render_engine без пула);
+  parallel   — вся группа через пул процессов render_engine (--workers).
+
+Кэш готовых документов (document_cache) на время замеров отключён, кэш
+контекстов групп очищается перед каждым повтором, иначе повторы измеряли бы
+только кэш. Результаты выводятся в JSON (--output) вместе с версией кода;
+--compare печатает отношение к ранее сохранённому файлу, чтобы сравнить
+изменения gen_docx.py между коммитами.
+
+Пример:
+    python benchmarks/bench_gen_doc.py --students 100 --subjects 30 --output before.json
+    python benchmarks/bench_gen_doc.py --students 100 --subjects 30 --compare before.json
+"""
+import argparse
+import io
+import json
+import logging
+import os
+import platform
+import statistics
+import subprocess
+import sys
+import tempfile
+import time
+
+sys.path.insert(0, os.path.dirname(os.path.abspath(__file__)))
+from synthetic import ROOT, build_database, build_template  # noqa: E402
+
+
+def summary(samples):
+    """Медиана, минимум и максимум в миллисекундах."""
+    return {
+        'median_ms': round(statistics.median(samples) * 1000, 3),
+        'min_ms': round(min(samples) * 1000, 3),
+        'max_ms': round(max(samples) * 1000, 3),
+        'samples': len(samples),
+    }
+
+
+def timed(callable_):
+    started = time.perf_counter()
+    result = callable_()
+    return result, time.perf_counter() - started
+
+
+def git_revision():
+    try:
+        return subprocess.run(['git', 'rev-parse', '--short', 'HEAD'], cwd=ROOT, capture_output=True,
+                              text=True, check=True).stdout.strip()
+    except (OSError, subprocess.CalledProcessError):
+        return None
+
+
+def single_scenario(conn, template, student_ids, rounds):
+    """Фазы генерации одного документа (как gen_doc для одного студента)."""
+    import docx_templates
+    import gen_docx
+
+    phases = {name: [] for name in ['template_load_cold', 'template_load', 'data_fetch', 'context', 'render', 'save', 'total']}
+    for _ in range(rounds):
+        docx_templates.cache.clear()
+        _, elapsed = timed(lambda: docx_templates.cache.get(template))
+        phases['template_load_cold'].append(elapsed)
+        for student_id in student_ids:
+            gen_docx.group_contexts.clear()
+            doc, load_time = timed(lambda: docx_templates.load(template))
+            data, fetch_time = timed(lambda: gen_docx.DocumentDataLoader(conn).load(
+                [student_id], gen_docx.template_sources(template))[student_id])
+            context, context_time = timed(lambda: gen_docx.prepare_context(data['student'], data['military'], template, data))
+            _, render_time = timed(lambda: doc.render(context))
+            _, save_time = timed(lambda: doc.save(io.BytesIO()))
+            for name, elapsed in [('template_load', load_time), ('data_fetch', fetch_time), ('context', context_time),
+                                  ('render', render_time), ('save', save_time)]:
+                phases[name].append(elapsed)
+            phases['total'].append(load_time + fetch_time + context_time + render_time + save_time)
+    return {name: summary(samples) for name, samples in phases.items()}
+
+
+def group_scenario(conn, template, group_id, workers, rounds):
+    """Документы всей группы: выборка, контексты и рендеринг через render_engine."""
+    import export_jobs
+    import gen_docx
+    import render_engine
+
+    engine = render_engine.RenderEngine(workers=workers)
+    phases = {name: [] for name in ['data_fetch', 'context', 'render', 'total']}
+    documents = 0
+    try:
+        # Первый проход прогревает шаблон и пул процессов и в замер не входит
+        for round_index in range(rounds + 1):
+            gen_docx.group_contexts.clear()
+            started = time.perf_counter()
+
+            def fetch():
+                students = export_jobs.select_students(conn, group_id)
+                loaded = gen_docx.DocumentDataLoader(conn).load(
+                    [student['id'] for student in students], gen_docx.template_sources(template))
+                return students, loaded
+
+            (students, loaded), fetch_time = timed(fetch)
+            jobs, context_time = timed(lambda: [
+                (gen_docx.document_filename(dict(student)),
+                 gen_docx.prepare_context(dict(student), loaded[student['id']]['military'], template, loaded[student['id']]))
+                for student in students
+            ])
+            results, render_time = timed(lambda: engine.render_many(template, jobs))
+            errors = [result.error for result in results if result.error]
+            assert not errors, errors[:3]
+            if round_index == 0:
+                continue
+            documents = len(jobs)
+            phases['data_fetch'].append(fetch_time)
+            phases['context'].append(context_time)
+            phases['render'].append(render_time)
+            phases['total'].append(time.perf_counter() - started)
+    finally:
+        engine.shutdown()
+
+    result = {name: summary(samples) for name, samples in phases.items()}
+    result['workers'] = workers
+    result['documents'] = documents
+    result['documents_per_second'] = round(documents / statistics.median(phases['total']), 2)
+    return result
+
+
+def compare(results, baseline_path):
+    """Печатает отношение медиан текущего прогона к сохранённому (больше 1 — стало медленнее)."""
+    with open(baseline_path, encoding='utf-8') as f:
+        baseline = json.load(f)
+    print(f"Порівняння з {baseline_path} ({baseline['meta'].get('revision')} -> {results['meta'].get('revision')}):")
+    print(f"{'сценарій / фаза':<34}{'було, мс':>12}{'стало, мс':>12}{'відношення':>12}")
+    for scenario in ['single', 'sequential', 'parallel']:
+        for phase, current in results.get(scenario, {}).items():
+            previous = baseline.get(scenario, {}).get(phase)
+            if not isinstance(current, dict) or not isinstance(previous, dict):
+                continue
+            ratio = current['median_ms'] / previous['median_ms'] if previous['median_ms'] else float('nan')
+            print(f"{scenario + ' / ' + phase:<34}{previous['median_ms']:>12.2f}{current['median_ms']:>12.2f}{ratio:>11.2f}x")
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument('--groups', type=int, default=2)
+    parser.add_argument('--students', type=int, default=50, help='студентов в группе')
+    parser.add_argument('--subjects', type=int, default=30, help='дисциплин в учебном плане группы')
+    parser.add_argument('--filler', type=int, default=200, help='абзацев статического текста в шаблоне')
+    parser.add_argument('--single', type=int, default=10, help='студентов в сценарии single')
+    parser.add_argument('--rounds', type=int, default=3, help='повторов каждого сценария')
+    parser.add_argument('--workers', type=int, default=os.cpu_count() or 1, help='процессов в сценарии parallel')
+    parser.add_argument('--scenarios', default='single,sequential,parallel')
+    parser.add_argument('--template', help='путь к шаблону (по умолчанию синтетический)')
+    parser.add_argument('--db', help='путь к базе (по умолчанию временная)')
+    parser.add_argument('--output', help='файл для результатов JSON (по умолчанию stdout)')
+    parser.add_argument('--compare', help='JSON предыдущего прогона для сравнения')
+    args = parser.parse_args()
+
+    # config.DB_PATH читается при импорте, поэтому путь задаётся до первого импорта приложения
+    path = os.path.abspath(args.db or os.path.join(tempfile.mkdtemp(prefix='students-bench-'), 'students.db'))
+    os.environ['STUDENTS_DB'] = path
+    build_database(path, groups=args.groups, students_per_group=args.students, subjects_per_group=args.subjects)
+    template = os.path.abspath(args.template or build_template(filler_paragraphs=args.filler))
+
+    from db import connect
+    import document_cache
+    import gen_docx  # noqa: F401  (настраивает логгер приложения, уровень понижается после импорта)
+    logging.getLogger('Students').setLevel(logging.WARNING)
+    document_cache.cache.max_bytes = 0
+
+    conn = connect(path)
+    group_id = conn.execute("SELECT MIN(id) FROM groups").fetchone()[0]
+    student_ids = [row[0] for row in conn.execute(
+        "SELECT id FROM students WHERE group_id = ? ORDER BY id LIMIT ?", (group_id, args.single))]
+
+    scenarios = args.scenarios.split(',')
+    results = {'meta': {
+        'revision': git_revision(),
+        'python': platform.python_version(),
+        'cpu_count': os.cpu_count(),
+        'groups': args.groups, 'students': args.students, 'subjects': args.subjects,
+        'filler': args.filler, 'rounds': args.rounds, 'template': template,
+        'template_bytes': os.path.getsize(template),
+    }}
+    if 'single' in scenarios:
+        results['single'] = single_scenario(conn, template, student_ids, args.rounds)
+    if 'sequential' in scenarios:
+        results['sequential'] = group_scenario(conn, template, group_id, 1, args.rounds)
+    if 'parallel' in scenarios:
+        results['parallel'] = group_scenario(conn, template, group_id, args.workers, args.rounds)
+    conn.dispose()
+
+    output = json.dumps(results, ensure_ascii=False, indent=2)
+    if args.output:
+        with open(args.output, 'w', encoding='utf-8') as f:
+            f.write(output + '\n')
+    else:
+        print(output)
+    if args.compare:
+        compare(results, args.compare)
+
+
+if __name__ == '__main__':
+    main()
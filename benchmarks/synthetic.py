@@ -0,0 +1,141 @@
+"""Синтетическая база students.db и шаблон DOCX для бенчмарков.
+
+Схема создаётся штатным init_db.py, затем база заполняется группами,
+учебными планами, студентами, оценками и военными данными. Шаблон по
+структуре повторяет додаток до диплома: поля студента и группы, таблицы
+оценок с циклами {%tr %}, списки и колонтитул.
+"""
+import os
+import random
+import subprocess
+import sys
+import tempfile
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+if ROOT not in sys.path:
+    sys.path.insert(0, ROOT)
+
+LAST_NAMES = ['Шевченко', 'Франко', 'Українка', 'Ґудзь', 'Єрмак', 'Іваненко', 'Їжак', 'Коваль',
+              'Бондар', 'Ткаченко', 'Кравченко', 'Олійник', 'Мельник', 'Зав\'ялов', 'Яковенко']
+FIRST_NAMES = ['Тарас', 'Іван', 'Леся', 'Олена', 'Андрій', 'Марія', 'Юрій', 'Оксана', 'Богдан', 'Ірина']
+MIDDLE_NAMES = ['Петрович', 'Іванівна', 'Андрійович', 'Олегівна', 'Степанович']
+
+
+def build_database(path=None, groups=20, students_per_group=100, subjects_per_group=30, seed=1):
+    """Создаёт базу и возвращает путь к ней (по умолчанию во временном каталоге)."""
+    from db import connect
+
+    if path is None:
+        path = os.path.join(tempfile.mkdtemp(prefix='students-bench-'), 'students.db')
+    if os.path.exists(path):
+        os.remove(path)
+    subprocess.run([sys.executable, os.path.join(ROOT, 'init_db.py')], cwd=ROOT, check=True,
+                   stdout=subprocess.DEVNULL, env={**os.environ, 'STUDENTS_DB': path})
+
+    rng = random.Random(seed)
+    conn = connect(path)
+
+    for group_index in range(groups):
+        group_id = conn.execute("""
+            INSERT INTO groups (name, start_year, study_form, program_credits, degree_level, degree_level_en,
+                knowledge_area, knowledge_area_en, specialty, specialty_en, educational_program,
+                educational_program_en, qualification_name, qualification_name_en,
+                learning_outcomes, learning_outcomes_en, program_includes, program_includes_en)
+            VALUES (?, ?, 'Денна', 240, 'Бакалавр', 'Bachelor', '12 Інформаційні технології',
+                '12 Information Technologies', '121 Інженерія програмного забезпечення',
+                '121 Software Engineering', 'Інженерія програмного забезпечення', 'Software Engineering',
+                'Бакалавр з інженерії програмного забезпечення', 'Bachelor of Software Engineering',
+                'Результат 1\nРезультат 2\nРезультат 3', 'Outcome 1\nOutcome 2\nOutcome 3',
+                'Модуль 1\nМодуль 2', 'Module 1\nModule 2')
+        """, (f'КН-{group_index + 1:03d}', 2020 + group_index % 5)).lastrowid
+
+        conn.executemany(
+            "INSERT INTO subjects (code, name, credits, group_id, position, type) VALUES (?, ?, ?, ?, ?, ?)",
+            [(f'ОК{k + 1}', f'Дисципліна {k + 1}', 3 + k % 4, group_id, k + 1, 'Екзамен' if k % 2 else 'Залік')
+             for k in range(subjects_per_group)]
+        )
+        for table in ['practices', 'courseworks', 'attestations']:
+            conn.executemany(
+                f"INSERT INTO {table} (code, name, credits, type, position, group_id) VALUES (?, ?, ?, 'Екзамен', ?, ?)",
+                [(f'П{k + 1}', f'{table} {k + 1}', 6, k + 1, group_id) for k in range(2)]
+            )
+        subject_ids = [row[0] for row in conn.execute("SELECT id FROM subjects WHERE group_id = ?", (group_id,))]
+        activities = [(row[0], entity_type) for table, entity_type in
+                      [('practices', 'practice'), ('courseworks', 'coursework'), ('attestations', 'attestation')]
+                      for row in conn.execute(f"SELECT id FROM {table} WHERE group_id = ?", (group_id,))]
+
+        for student_index in range(students_per_group):
+            student_id = conn.execute("""
+                INSERT INTO students (last_name_UA, first_name_UA, middle_name_UA, last_name_ENG, first_name_ENG,
+                                      birth_date, group_id, edebo_code)
+                VALUES (?, ?, ?, 'Surname', 'Name', ?, ?, ?)
+            """, (rng.choice(LAST_NAMES), rng.choice(FIRST_NAMES), rng.choice(MIDDLE_NAMES),
+                  f'{rng.randint(1, 28):02d}.{rng.randint(1, 12):02d}.{rng.randint(1998, 2006)}',
+                  group_id, str(10000000 + group_index * students_per_group + student_index))).lastrowid
+            conn.executemany(
+                "INSERT INTO grades (student_id, subject_id, grade) VALUES (?, ?, ?)",
+                [(student_id, subject_id, str(rng.randint(60, 100))) for subject_id in subject_ids]
+            )
+            conn.executemany(
+                "INSERT INTO activity_grades (student_id, entity_id, entity_type, grade) VALUES (?, ?, ?, ?)",
+                [(student_id, entity_id, entity_type, rng.randint(60, 100)) for entity_id, entity_type in activities]
+            )
+            if student_index % 2:
+                conn.execute("""
+                    INSERT INTO military (student_id, registration_number_of_the_DRPVR, military_rank, address_of_residence)
+                    VALUES (?, ?, 'солдат', 'м. Київ')
+                """, (student_id, f'{student_id:08d}'))
+            conn.execute("""
+                INSERT INTO education_documents (student_id, document_type, document_type_en, document_number,
+                    institution_name, institution_name_en, country, country_en, completion_date)
+                VALUES (?, 'Атестат', 'Certificate', ?, 'Ліцей', 'Lyceum', 'Україна', 'Ukraine', '30.06.2019')
+            """, (student_id, f'АА{student_id:06d}'))
+            conn.execute("INSERT INTO diplomas (student_id, diploma_number, appendix_number) VALUES (?, ?, ?)",
+                         (student_id, f'B24/{student_id:06d}', f'{student_id:06d}'))
+    conn.commit()
+    conn.dispose()
+    return path
+
+
+def build_template(path=None, filler_paragraphs=200):
+    """Создаёт шаблон DOCX с тегами docxtpl и возвращает путь к нему.
+
+    Имя файла как у шаблонов додатку в template_word; какие данные загружать,
+    gen_docx определяет по переменным шаблона, а не по имени.
+    """
+    from docx import Document
+
+    if path is None:
+        path = os.path.join(tempfile.mkdtemp(prefix='students-bench-'), 'template_adddiplom.docx')
+
+    document = Document()
+    document.sections[0].header.paragraphs[0].text = "{{ last_name_UA }} {{ first_name_UA }} — {{ diploma_number }}"
+    document.add_heading("Додаток до диплома {{ diploma_number }} / Diploma supplement {{ appendix_number }}", 1)
+    for label, field in [('Прізвище', 'last_name_UA'), ("Ім'я", 'first_name_UA'), ('По батькові', 'middle_name_UA'),
+                         ('Surname', 'last_name_ENG'), ('Name', 'first_name_ENG'), ('Дата народження', 'birth_date'),
+                         ('Кваліфікація', 'qualification_name'), ('Qualification', 'qualification_name_en'),
+                         ('Спеціальність', 'specialty'), ('Specialty', 'specialty_en'),
+                         ('Освітня програма', 'educational_program'), ('Форма навчання', 'study_form_eu'),
+                         ('Строк навчання', 'study_years'), ('Роки', 'start_year'), ('Документ', 'document_number'),
+                         ('Акредитація', 'accreditation_text'), ('Відзнака', 'diploma_with_honor_text')]:
+        document.add_paragraph(f"{label}: {{{{ {field} }}}}")
+
+    for items in ['subjects_grades', 'practice_data', 'coursework_data', 'attestation_data']:
+        table = document.add_table(rows=3, cols=4)
+        table.style = 'Table Grid'
+        table.rows[0].cells[0].text = f"{{%tr for item in {items} %}}"
+        for cell, field in zip(table.rows[1].cells, ['code', 'name', 'credits', 'grade']):
+            cell.text = f"{{{{ item.{field} }}}}"
+        table.rows[2].cells[0].text = "{%tr endfor %}"
+
+    for field in ['learning_outcomes', 'learning_outcomes_en', 'program_includes', 'program_includes_en']:
+        document.add_paragraph(f"{{%p for line in {field} %}}")
+        document.add_paragraph("{{ line }}")
+        document.add_paragraph("{%p endfor %}")
+
+    # Статический текст, как в реальных шаблонах с описанием системы освіти
+    for index in range(filler_paragraphs):
+        document.add_paragraph(f"Інформація про національну систему вищої освіти, пункт {index + 1}. " * 3)
+
+    document.save(path)
+    return path
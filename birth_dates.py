@@ -0,0 +1,90 @@
+"""Нормализованная дата рождения студентов в формате ISO.
+
+Колонка students.birth_date_iso (YYYY-MM-DD) вычисляется SQLite из текстового
+birth_date ('DD.MM.YYYY' или 'YYYY-MM-DD') и индексируется, поэтому
+сортировка и фильтры по году используют поиск по диапазону.
+
+Запуск модуля как скрипта приводит известные форматы birth_date к
+'DD.MM.YYYY' и выводит значения, которые разобрать не удалось.
+"""
+from datetime import datetime
+
+# Форматы, которые встречаются в старых данных и импорте из Excel
+KNOWN_FORMATS = ['%d.%m.%Y', '%Y-%m-%d', '%d/%m/%Y', '%d-%m-%Y', '%Y-%m-%d %H:%M:%S', '%d.%m.%y']
+
+_DMY = "TRIM(birth_date) GLOB '[0-9][0-9].[0-9][0-9].[0-9][0-9][0-9][0-9]'"
+_ISO = "TRIM(birth_date) GLOB '[0-9][0-9][0-9][0-9]-[0-9][0-9]-[0-9][0-9]'"
+
+BIRTH_DATE_ISO_SQL = f"""CASE
+        WHEN {_DMY}
+            THEN SUBSTR(TRIM(birth_date), 7, 4) || '-' || SUBSTR(TRIM(birth_date), 4, 2) || '-' || SUBSTR(TRIM(birth_date), 1, 2)
+        WHEN {_ISO}
+            THEN TRIM(birth_date)
+    END"""
+
+
+def year_start(year):
+    """Нижняя граница диапазона birth_date_iso для фильтра «год рождения от»."""
+    return f"{int(year):04d}-01-01"
+
+
+def install(conn):
+    """Добавляет вычисляемую колонку birth_date_iso и индексы по ней."""
+    existing = {row[1] for row in conn.execute("PRAGMA table_xinfo(students)")}
+    if 'birth_date_iso' not in existing:
+        conn.execute(f"ALTER TABLE students ADD COLUMN birth_date_iso TEXT GENERATED ALWAYS AS ({BIRTH_DATE_ISO_SQL}) VIRTUAL")
+    conn.executescript("""
+    CREATE INDEX IF NOT EXISTS idx_students_birth_date_iso ON students (birth_date_iso, id);
+    CREATE INDEX IF NOT EXISTS idx_students_group_birth_date_iso ON students (group_id, birth_date_iso);
+    """)
+
+
+def parse_birth_date(value):
+    """Разбирает дату рождения в одном из известных форматов; None, если не удалось."""
+    value = (value or '').strip()
+    for fmt in KNOWN_FORMATS:
+        try:
+            return datetime.strptime(value, fmt)
+        except ValueError:
+            continue
+    return None
+
+
+def backfill(conn):
+    """Приводит разбираемые значения birth_date к 'DD.MM.YYYY'.
+
+    Возвращает (количество исправленных, список (id, ФИО, значение) неразобранных).
+    """
+    fixed = 0
+    unparseable = []
+    rows = conn.execute("""
+        SELECT id, last_name_UA, first_name_UA, birth_date, birth_date_iso
+        FROM students
+        WHERE birth_date IS NOT NULL AND TRIM(birth_date) != ''
+    """).fetchall()
+    for student_id, last_name, first_name, birth_date, birth_date_iso in rows:
+        parsed = parse_birth_date(birth_date)
+        if parsed is None:
+            unparseable.append((student_id, f"{last_name} {first_name}", birth_date))
+            continue
+        normalized = parsed.strftime('%d.%m.%Y')
+        if normalized != birth_date or birth_date_iso != parsed.strftime('%Y-%m-%d'):
+            conn.execute("UPDATE students SET birth_date = ? WHERE id = ?", (normalized, student_id))
+            fixed += 1
+    conn.commit()
+    return fixed, unparseable
+
+
+if __name__ == '__main__':
+    from db import connect
+
+    conn = connect()
+    install(conn)
+    fixed, unparseable = backfill(conn)
+    conn.dispose()
+
+    print(f"Виправлено дат народження: {fixed}")
+    if unparseable:
+        print(f"Не вдалося розібрати ({len(unparseable)}):")
+        for student_id, name, value in unparseable:
+            print(f"  id={student_id} {name}: {value!r}")
@@ -0,0 +1,179 @@
+"""Сводные таблицы заполненности данных студентов и групп.
+
+Таблицы student_completeness и group_completeness поддерживаются триггерами
+SQLite на таблицах студентов, оценок и учебных планов, поэтому страницы,
+которые показывают заполненность, читают уже посчитанные значения.
+"""
+
+STUDENT_FIELDS = [
+    'last_name_UA', 'first_name_UA', 'middle_name_UA', 'last_name_ENG',
+    'first_name_ENG', 'birth_date', 'group_id', 'edebo_code'
+]
+
+MILITARY_FIELDS = [
+    'registration_number_of_the_DRPVR',
+    'military_registration_document',
+    'issued_VOD',
+    'military_accounting_specialty_number',
+    'military_rank',
+    'change_credentials',
+    'reason_for_changing_credentials',
+    'being_on_military_registration',
+    'address_of_residence'
+]
+
+ACTIVITY_TABLES = ['practices', 'courseworks', 'attestations']
+
+
+def _filled_sum(alias, fields):
+    """SQL-выражение: количество непустых полей строки."""
+    return ' + '.join(f"(COALESCE(TRIM({alias}.{field}), '') != '')" for field in fields)
+
+
+def _filled(column):
+    return f"({column} IS NOT NULL AND TRIM({column}) != '')"
+
+
+STUDENT_COLUMNS = [
+    'group_id', 'archived', 'fields_filled', 'fields_total', 'has_military',
+    'military_filled', 'military_total', 'grades_filled', 'activities_filled'
+]
+
+
+def _excluded(columns):
+    # UPSERT вместо INSERT OR REPLACE: алгоритм конфликта внешнего оператора
+    # (например, INSERT ... ON CONFLICT в маршрутах) отменяет OR REPLACE в триггере
+    return ', '.join(f"{column} = excluded.{column}" for column in columns)
+
+
+def _refresh_student_sql(condition):
+    """Пересчитывает строки student_completeness для студентов, подходящих под условие."""
+    return f"""
+        INSERT INTO student_completeness (
+            student_id, group_id, archived,
+            fields_filled, fields_total,
+            has_military, military_filled, military_total,
+            grades_filled, activities_filled
+        )
+        SELECT s.id, s.group_id, s.archived,
+               {_filled_sum('s', STUDENT_FIELDS)}, {len(STUDENT_FIELDS)},
+               EXISTS (SELECT 1 FROM military m WHERE m.student_id = s.id),
+               COALESCE((SELECT MAX({_filled_sum('m', MILITARY_FIELDS)}) FROM military m WHERE m.student_id = s.id), 0),
+               {len(MILITARY_FIELDS)},
+               (SELECT COUNT(*) FROM grades g WHERE g.student_id = s.id AND {_filled('g.grade')}),
+               (SELECT COUNT(*) FROM activity_grades ag
+                WHERE ag.student_id = s.id
+                  AND ag.entity_type IN ('practice', 'coursework', 'attestation')
+                  AND {_filled('ag.grade')})
+        FROM students s
+        WHERE {condition}
+        ON CONFLICT (student_id) DO UPDATE SET {_excluded(STUDENT_COLUMNS)};
+    """
+
+
+def _refresh_group_sql(condition):
+    """Пересчитывает строки group_completeness для групп, подходящих под условие."""
+    activities = ' + '.join(f"(SELECT COUNT(*) FROM {table} t WHERE t.group_id = g.id)" for table in ACTIVITY_TABLES)
+    return f"""
+        INSERT INTO group_completeness (group_id, subjects_total, activities_total)
+        SELECT g.id,
+               (SELECT COUNT(*) FROM subjects t WHERE t.group_id = g.id),
+               {activities}
+        FROM groups g
+        WHERE {condition}
+        ON CONFLICT (group_id) DO UPDATE SET {_excluded(['subjects_total', 'activities_total'])};
+    """
+
+
+def _trigger(name, event, table, body):
+    return f"""
+    CREATE TRIGGER IF NOT EXISTS trg_completeness_{name}
+    AFTER {event} ON {table}
+    BEGIN
+        {body}
+    END;
+    """
+
+
+def schema_sql():
+    """DDL сводных таблиц, индексов и триггеров."""
+    statements = ["""
+    CREATE TABLE IF NOT EXISTS student_completeness (
+        student_id        INTEGER PRIMARY KEY,
+        group_id          INTEGER,
+        archived          BOOLEAN DEFAULT FALSE,
+        fields_filled     INTEGER NOT NULL DEFAULT 0,
+        fields_total      INTEGER NOT NULL DEFAULT 0,
+        has_military      INTEGER NOT NULL DEFAULT 0,
+        military_filled   INTEGER NOT NULL DEFAULT 0,
+        military_total    INTEGER NOT NULL DEFAULT 0,
+        grades_filled     INTEGER NOT NULL DEFAULT 0,
+        activities_filled INTEGER NOT NULL DEFAULT 0
+    );
+    CREATE INDEX IF NOT EXISTS idx_student_completeness_group ON student_completeness (group_id, archived);
+    CREATE TABLE IF NOT EXISTS group_completeness (
+        group_id         INTEGER PRIMARY KEY,
+        subjects_total   INTEGER NOT NULL DEFAULT 0,
+        activities_total INTEGER NOT NULL DEFAULT 0
+    );
+    """]
+
+    # Студенты
+    statements.append(_trigger('students_insert', 'INSERT', 'students', _refresh_student_sql('s.id = NEW.id')))
+    statements.append(_trigger('students_update', 'UPDATE', 'students', _refresh_student_sql('s.id = NEW.id')))
+    statements.append(_trigger(
+        'students_delete', 'DELETE', 'students',
+        "DELETE FROM student_completeness WHERE student_id = OLD.id;"
+    ))
+
+    # Таблицы, которые влияют на заполненность конкретного студента
+    for table in ['military', 'grades', 'activity_grades']:
+        statements.append(_trigger(f'{table}_insert', 'INSERT', table, _refresh_student_sql('s.id = NEW.student_id')))
+        statements.append(_trigger(
+            f'{table}_update', 'UPDATE', table,
+            _refresh_student_sql('s.id = OLD.student_id') + _refresh_student_sql('s.id = NEW.student_id')
+        ))
+        statements.append(_trigger(f'{table}_delete', 'DELETE', table, _refresh_student_sql('s.id = OLD.student_id')))
+
+    # Учебный план группы определяет общее количество оценок
+    for table in ['subjects'] + ACTIVITY_TABLES:
+        statements.append(_trigger(f'{table}_insert', 'INSERT', table, _refresh_group_sql('g.id = NEW.group_id')))
+        statements.append(_trigger(
+            f'{table}_update', 'UPDATE OF group_id', table,
+            _refresh_group_sql('g.id = OLD.group_id') + _refresh_group_sql('g.id = NEW.group_id')
+        ))
+        statements.append(_trigger(f'{table}_delete', 'DELETE', table, _refresh_group_sql('g.id = OLD.group_id')))
+    statements.append(_trigger(
+        'groups_delete', 'DELETE', 'groups',
+        "DELETE FROM group_completeness WHERE group_id = OLD.id;"
+    ))
+
+    return '\n'.join(statements)
+
+
+def drop_triggers(conn):
+    """Удаляет триггеры сводных таблиц (перед их пересозданием в новой версии)."""
+    names = [row[0] for row in conn.execute(
+        "SELECT name FROM sqlite_master WHERE type = 'trigger' AND name LIKE 'trg_completeness_%'"
+    )]
+    for name in names:
+        conn.execute(f"DROP TRIGGER {name}")
+
+
+def rebuild(conn):
+    """Полностью пересчитывает сводные таблицы по текущим данным."""
+    conn.execute("DELETE FROM student_completeness")
+    conn.execute("DELETE FROM group_completeness")
+    conn.execute(_refresh_student_sql('1'))
+    conn.execute(_refresh_group_sql('1'))
+    conn.commit()
+
+
+def install(conn):
+    """Создаёт сводные таблицы и триггеры, при первом запуске заполняет их."""
+    exists = conn.execute(
+        "SELECT 1 FROM sqlite_master WHERE type = 'table' AND name = 'student_completeness'"
+    ).fetchone()
+    conn.executescript(schema_sql())
+    if not exists:
+        rebuild(conn)
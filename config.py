@@ -3,3 +3,42 @@ import os
 
 # Конфигурация приложения
 SECRET_KEY = 'super-secret-key'  # Рекомендуется заменить на уникальный ключ
+
+# База данных SQLite
+DB_PATH = os.environ.get('STUDENTS_DB', 'students.db')
+
+# PRAGMA, которые выполняются для каждого нового соединения
+SQLITE_PRAGMAS = {
+    'journal_mode': 'WAL',
+    'busy_timeout': 5000,        # мс ожидания блокировки вместо ошибки "database is locked"
+    'synchronous': 'NORMAL',     # в режиме WAL безопасно и заметно быстрее FULL
+    'cache_size': -20000,        # ~20 МБ кэша страниц на соединение
+    'mmap_size': 268435456,      # 256 МБ отображения файла в память
+    'foreign_keys': 'ON',
+}
+
+# Сколько простаивающих соединений хранить в пуле
+DB_POOL_SIZE = 8
+
+# Профилирование SQL по запросам (заголовки X-SQL-Count/X-SQL-Time и страница /admin/sql_profile)
+SQL_PROFILING = os.environ.get('SQL_PROFILING', '0') == '1'
+SQL_PROFILER_SLOWEST = 5         # сколько самых медленных запросов хранить по маршруту
+SQL_N_PLUS_ONE_THRESHOLD = 5     # столько одинаковых запросов за запрос считаются подозрением на N+1
+
+# Журнал app.log: ротация по размеру и просмотр на /admin/view_logs
+LOG_MAX_BYTES = 10 * 1024 * 1024   # размер файла, после которого начинается новый
+LOG_BACKUP_COUNT = 10              # сколько ротированных файлов (app.log.1 ...) хранить
+LOG_PAGE_SIZE = 100                # записей на странице просмотра журнала
+
+# Кэш разобранных шаблонов DOCX (docx_templates.py): предел суммарного размера записей
+DOCX_TEMPLATE_CACHE_BYTES = 64 * 1024 * 1024
+
+# Процессов для параллельного рендеринга документов группы (render_engine.py); 1 — без пула
+RENDER_WORKERS = int(os.environ.get('RENDER_WORKERS', min(4, os.cpu_count() or 1)))
+
+# Фоновые задания массовой генерации (export_jobs.py): каталог готовых архивов
+EXPORT_DIR = os.path.join(os.path.dirname(os.path.abspath(__file__)), 'generated_docs', 'exports')
+EXPORT_RETENTION_DAYS = 7   # через сколько дней завершённые задания и их архивы удаляются
+
+# Кэш готовых документов по содержимому шаблона и контекста (document_cache.py): предел суммарного размера
+DOCUMENT_CACHE_BYTES = 128 * 1024 * 1024
@@ -1,19 +1,247 @@
+import os
 import sqlite3
-import locale
+import threading
+import time
+from functools import lru_cache
+from flask import g, has_app_context
+from config import DB_PATH, SQLITE_PRAGMAS, DB_POOL_SIZE
+
+# Порядок букв украинского алфавита; русские буквы вставлены рядом с ближайшими
+UKRAINIAN_ALPHABET = 'абвгґдеёєжзиіїйклмнопрстуфхцчшщъыьэюя'
+
+# Символы, которые не влияют на порядок (как и при сортировке по локали)
+IGNORED_CHARS = "'’ʼ`-"
+
+# Буквы отображаются в область частного использования Unicode, чтобы
+# побайтовое сравнение ключей в SQLite давало алфавитный порядок
+_SORT_KEY_TABLE = {ord(letter): chr(0xE000 + index) for index, letter in enumerate(UKRAINIAN_ALPHABET)}
+_SORT_KEY_TABLE.update({ord(char): None for char in IGNORED_CHARS})
+
+
+@lru_cache(maxsize=65536)
+def ukrainian_sort_key(value):
+    """
+    Ключ сортировки строки по украинскому алфавиту, не зависящий от локали.
+    """
+    if value is None:
+        return ''
+    return ' '.join(str(value).lower().split()).translate(_SORT_KEY_TABLE)
+
 
 def ukrainian_collation(str1, str2):
     """
     Пользовательская функция колляции для сортировки украинских строк.
     """
-    locale.setlocale(locale.LC_COLLATE, 'uk_UA.UTF-8')
-    return locale.strcoll(str1, str2)
+    key1, key2 = ukrainian_sort_key(str1), ukrainian_sort_key(str2)
+    if key1 == key2:
+        key1, key2 = str1, str2
+    return (key1 > key2) - (key1 < key2)
 
-def get_db():
+
+def register_functions(conn):
     """
-    Создает соединение с базой данных SQLite.
+    Регистрирует колляцию UKRAINIAN и функцию ukrainian_sort_key на соединении.
     """
-    conn = sqlite3.connect('students.db')
-    conn.row_factory = sqlite3.Row
     conn.create_collation("UKRAINIAN", ukrainian_collation)
-    conn.execute("PRAGMA foreign_keys = ON")
-    return conn
\ No newline at end of file
+    conn.create_function("ukrainian_sort_key", 1, ukrainian_sort_key, deterministic=True)
+
+
+class TimingCursor(sqlite3.Cursor):
+    """
+    Курсор, который сообщает профилю соединения длительность каждого запроса.
+
+    SQLite выполняет SELECT по мере выборки строк, поэтому время fetchone,
+    fetchmany, fetchall и итерации добавляется к запросу, вернувшему строки.
+    """
+
+    _profile = None
+    _statement = None
+
+    def _timed(self, method, sql, *args):
+        profiler = self._profile = self.connection.profiler
+        if profiler is None:
+            return method(sql, *args)
+        started = time.perf_counter()
+        try:
+            return method(sql, *args)
+        finally:
+            self._statement = profiler.record(sql, time.perf_counter() - started)
+
+    def _fetched(self, method, *args):
+        profiler = self._profile
+        if profiler is None:
+            return method(*args)
+        started = time.perf_counter()
+        try:
+            return method(*args)
+        finally:
+            profiler.add_time(self._statement, time.perf_counter() - started)
+
+    def execute(self, sql, parameters=()):
+        return self._timed(super().execute, sql, parameters)
+
+    def executemany(self, sql, seq_of_parameters):
+        return self._timed(super().executemany, sql, seq_of_parameters)
+
+    def executescript(self, sql_script):
+        return self._timed(super().executescript, sql_script)
+
+    def fetchone(self):
+        return self._fetched(super().fetchone)
+
+    def fetchmany(self, size=None):
+        return self._fetched(super().fetchmany, self.arraysize if size is None else size)
+
+    def fetchall(self):
+        return self._fetched(super().fetchall)
+
+    def __next__(self):
+        return self._fetched(super().__next__)
+
+
+class Connection(sqlite3.Connection):
+    """
+    Соединение, которое можно переиспользовать.
+
+    close() не закрывает соединение, а откатывает незакоммиченные изменения и
+    возвращает его в пул. Пока соединение закреплено за запросом Flask, оно
+    остаётся открытым до конца запроса, а вложенные get_db()/close() только
+    считают пользователей.
+    """
+
+    def __init__(self, *args, **kwargs):
+        super().__init__(*args, **kwargs)
+        self.pool = None
+        self.request_held = False
+        self.users = 0
+        self.profiler = None
+
+    def cursor(self, factory=TimingCursor):
+        return super().cursor(factory)
+
+    # Встроенные Connection.execute*() создают курсор в обход cursor(),
+    # поэтому запросы направляются через TimingCursor явно
+    def execute(self, sql, parameters=()):
+        return self.cursor().execute(sql, parameters)
+
+    def executemany(self, sql, seq_of_parameters):
+        return self.cursor().executemany(sql, seq_of_parameters)
+
+    def executescript(self, sql_script):
+        return self.cursor().executescript(sql_script)
+
+    def close(self):
+        if self.users > 0:
+            self.users -= 1
+        if self.users > 0:
+            return
+        # Как и при настоящем закрытии, незакоммиченные изменения теряются
+        if self.in_transaction:
+            self.rollback()
+        if self.request_held:
+            return
+        if self.pool is not None:
+            self.pool.release(self)
+        else:
+            self.dispose()
+
+    def dispose(self):
+        """Действительно закрывает соединение."""
+        super().close()
+
+
+def connect(path=None):
+    """
+    Открывает новое настроенное соединение: Row, функции и PRAGMA из config.
+    """
+    conn = sqlite3.connect(path or DB_PATH, factory=Connection, check_same_thread=False)
+    conn.row_factory = sqlite3.Row
+    register_functions(conn)
+    for name, value in SQLITE_PRAGMAS.items():
+        conn.execute(f"PRAGMA {name} = {value}")
+    return conn
+
+
+class ConnectionPool:
+    """
+    Небольшой пул соединений; простаивающие соединения хранятся до size штук.
+    """
+
+    def __init__(self, path=None, size=DB_POOL_SIZE):
+        self.path = path
+        self.size = size
+        self._idle = []
+        self._lock = threading.Lock()
+        self._pid = os.getpid()
+
+    def acquire(self):
+        with self._lock:
+            # Соединения, унаследованные от родительского процесса, не используем
+            if self._pid != os.getpid():
+                self._idle = []
+                self._pid = os.getpid()
+            conn = self._idle.pop() if self._idle else None
+        if conn is None:
+            conn = connect(self.path)
+            conn.pool = self
+        conn.users = 1
+        return conn
+
+    def release(self, conn):
+        conn.users = 0
+        conn.request_held = False
+        if conn.profiler is not None:
+            conn.profiler = None
+            conn.set_trace_callback(None)
+        if conn.in_transaction:
+            conn.rollback()
+        with self._lock:
+            if self._pid == os.getpid() and len(self._idle) < self.size:
+                self._idle.append(conn)
+                return
+        conn.dispose()
+
+    def close_all(self):
+        with self._lock:
+            idle, self._idle = self._idle, []
+        for conn in idle:
+            conn.dispose()
+
+
+pool = ConnectionPool()
+
+
+def get_db():
+    """
+    Возвращает соединение с базой данных SQLite.
+
+    Внутри запроса Flask все вызовы получают одно соединение, закреплённое в
+    flask.g; вне запроса соединение берётся из пула. В обоих случаях вызывающий
+    код по-прежнему вызывает conn.close().
+    """
+    if not has_app_context():
+        return pool.acquire()
+    conn = g.get('_db')
+    if conn is None:
+        conn = pool.acquire()
+        conn.request_held = True
+        g._db = conn
+        # Профиль SQL запроса (sql_profiler), если профилирование включено
+        profile = g.get('sql_profile')
+        if profile is not None:
+            conn.profiler = profile
+            conn.set_trace_callback(profile.trace)
+    else:
+        conn.users += 1
+    return conn
+
+
+def close_request_db(exception=None):
+    """Возвращает соединение запроса в пул (teardown_appcontext)."""
+    conn = g.pop('_db', None)
+    if conn is not None:
+        conn.pool.release(conn)
+
+
+def init_app(app):
+    app.teardown_appcontext(close_request_db)
@@ -0,0 +1,74 @@
+"""Кэш сгенерированных документов DOCX по содержимому.
+
+Ключ документа — SHA-256 от отпечатка байтов шаблона (docx_templates) и
+полностью собранного контекста рендеринга в каноническом JSON. Рендеринг
+детерминирован, поэтому одинаковый ключ означает одинаковый документ:
+повторная генерация без изменений в данных отдаётся из кэша, а при экспорте
+группы заново рендерятся только студенты, чьи данные изменились. Изменение
+шаблона или любого поля контекста даёт новый ключ, поэтому явного сброса
+не требуется — устаревшие записи вытесняются по LRU.
+
+Общий объём записей ограничен DOCUMENT_CACHE_BYTES.
+"""
+import hashlib
+import json
+import threading
+from collections import OrderedDict
+
+from config import DOCUMENT_CACHE_BYTES
+
+
+def key(template_digest, context):
+    """Ключ документа для шаблона с отпечатком template_digest и контекста context."""
+    payload = json.dumps(context, sort_keys=True, ensure_ascii=False, separators=(',', ':'), default=repr)
+    digest = hashlib.sha256(template_digest.encode('ascii'))
+    digest.update(b'\0')
+    digest.update(payload.encode('utf-8'))
+    return digest.hexdigest()
+
+
+class DocumentCache:
+    """LRU-кэш байтов документов по ключу с ограничением суммарного размера."""
+
+    def __init__(self, max_bytes=DOCUMENT_CACHE_BYTES):
+        self.max_bytes = max_bytes
+        self._entries = OrderedDict()
+        self._bytes = 0
+        self._lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+
+    def get(self, key):
+        with self._lock:
+            data = self._entries.get(key)
+            if data is None:
+                self.misses += 1
+                return None
+            self._entries.move_to_end(key)
+            self.hits += 1
+            return data
+
+    def put(self, key, data):
+        if len(data) > self.max_bytes:
+            return
+        with self._lock:
+            previous = self._entries.pop(key, None)
+            if previous is not None:
+                self._bytes -= len(previous)
+            self._entries[key] = data
+            self._bytes += len(data)
+            while self._bytes > self.max_bytes:
+                _, evicted = self._entries.popitem(last=False)
+                self._bytes -= len(evicted)
+
+    def clear(self):
+        with self._lock:
+            self._entries.clear()
+            self._bytes = 0
+
+    def stats(self):
+        with self._lock:
+            return {'entries': len(self._entries), 'bytes': self._bytes, 'hits': self.hits, 'misses': self.misses}
+
+
+cache = DocumentCache()
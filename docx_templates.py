@@ -0,0 +1,244 @@
+"""Кэш разобранных шаблонов DOCX для gen_docx.
+
+DocxTemplate(path) при каждом рендеринге заново читает архив с диска,
+сериализует XML тела, очищает его регулярными выражениями (patch_xml) и
+компилирует Jinja. Здесь всё это делается один раз на шаблон: в кэше хранятся
+байты файла, скомпилированные шаблоны Jinja тела, колонтитулов и список
+переменных, на которые ссылаются все рендеримые части (вместе со сносками
+и свойствами документа); для каждого документа выдаётся
+дешёвая копия, которая разбирает архив из памяти и рендерит уже
+скомпилированные шаблоны.
+
+Копия документа открывает пакет с пустым телом: тело каждого документа
+целиком строится из скомпилированного шаблона, исходное разбирать незачем.
+resolve_listing обрабатывает только абзацы с символами \t, \a, \n, \f.
+Обе оптимизации дают тот же документ, что и DocxTemplate.
+
+Ключ кэша — абсолютный путь; при изменении mtime или размера файла запись
+заменяется. Общий объём записей ограничен DOCX_TEMPLATE_CACHE_BYTES.
+"""
+import copy
+import hashlib
+import io
+import os
+import re
+import threading
+import zipfile
+from collections import OrderedDict
+
+from docx import Document
+from docxtpl import DocxTemplate
+from jinja2 import Environment, meta
+from lxml import etree
+
+from config import DOCX_TEMPLATE_CACHE_BYTES
+
+# Символы, которые docxtpl.resolve_listing превращает в разметку (табуляция, абзац, перенос, разрыв страницы)
+_LISTING_CHARS = re.compile('[\t\a\n\f]')
+_PARAGRAPH = re.compile(r"<w:p(?: [^>]*)?>.*?</w:p>", re.DOTALL)
+
+# Части, которые docxtpl рендерит при каждом документе без компиляции (render_footnotes, render_properties)
+_FOOTNOTES_CONTENT_TYPE = 'application/vnd.openxmlformats-officedocument.wordprocessingml.footnotes+xml'
+_RENDERED_PROPERTIES = ('author', 'comments', 'identifier', 'language', 'subject', 'title')
+
+
+class CompiledTemplate:
+    """Разобранный шаблон: байты файла и скомпилированные части."""
+
+    def __init__(self, path, data, stamp):
+        self.path = path
+        self.data = data
+        self.stamp = stamp
+        # Отпечаток содержимого для ключей кэша готовых документов (document_cache)
+        self.digest = hashlib.sha256(data).hexdigest()
+        self.env = Environment()
+        self.parts = {}
+        self.variables = set()
+        self.size = len(data)
+
+        # Предобработка выполняется теми же методами docxtpl, что и при обычном рендеринге
+        helper = DocxTemplate(io.BytesIO(data))
+        helper.init_docx()
+        self.body = self._compile(helper, helper.get_xml(), None)
+        self.package = self._without_body(helper)
+        self.size += len(self.package)
+        for uri in (DocxTemplate.HEADER_URI, DocxTemplate.FOOTER_URI):
+            for _, part in helper.get_headers_footers(uri):
+                xml = helper.get_part_xml(part)
+                encoding = helper.get_headers_footers_encoding(xml)
+                self.parts[str(part.partname)] = (self._compile(helper, xml, str(part.partname)), encoding)
+        self._collect_uncompiled(helper)
+        self.variables = frozenset(self.variables)
+
+    def _collect_uncompiled(self, helper):
+        """Добавляет переменные сносок и свойств документа, которые docxtpl рендерит сам."""
+        for part in helper.docx.part.package.parts:
+            if part.content_type == _FOOTNOTES_CONTENT_TYPE:
+                xml = part.blob.decode('utf-8') if isinstance(part.blob, bytes) else part.blob
+                self.variables |= meta.find_undeclared_variables(self.env.parse(helper.patch_xml(xml)))
+        for name in _RENDERED_PROPERTIES:
+            value = getattr(helper.docx.core_properties, name)
+            if value:
+                self.variables |= meta.find_undeclared_variables(self.env.parse(value))
+
+    def _compile(self, helper, xml, partname):
+        source = re.sub(r"<w:p([ >])", r"\n<w:p\1", helper.patch_xml(xml))
+        self.size += len(source)
+        parsed = self.env.parse(source)
+        # Переменные, которые шаблон берёт из контекста (как get_undeclared_template_variables)
+        self.variables |= meta.find_undeclared_variables(parsed)
+        return self.env.from_string(parsed)
+
+    def _without_body(self, helper):
+        """Байты пакета с пустым телом документа.
+
+        Тело каждого документа строится из скомпилированного шаблона и целиком
+        заменяет исходное (DocxTemplate.map_tree), поэтому разбирать исходное
+        тело при открытии каждого документа незачем.
+        """
+        partname = str(helper.docx.part.partname).lstrip('/')
+        root = copy.deepcopy(helper.docx.element)
+        for child in list(root.body):
+            root.body.remove(child)
+        document_xml = etree.tostring(root, encoding='UTF-8', xml_declaration=True, standalone=True)
+
+        out = io.BytesIO()
+        with zipfile.ZipFile(io.BytesIO(self.data)) as source, zipfile.ZipFile(out, 'w') as target:
+            for info in source.infolist():
+                target.writestr(info, document_xml if info.filename == partname else source.read(info))
+        return out.getvalue()
+
+    def instance(self):
+        """Новый документ для одного рендеринга."""
+        return CachedDocxTemplate(self)
+
+
+class CachedDocxTemplate(DocxTemplate):
+    """DocxTemplate, который рендерит заранее скомпилированные части CompiledTemplate."""
+
+    def __init__(self, compiled):
+        super().__init__(io.BytesIO(compiled.data))
+        self.compiled = compiled
+        self._compiled_body = True
+
+    def render(self, context, jinja_env=None, autoescape=False):
+        # Со своим окружением Jinja тело рендерится docxtpl из исходного пакета
+        compiled_body = jinja_env is None and not autoescape
+        if compiled_body != self._compiled_body:
+            self.docx = None
+            self._compiled_body = compiled_body
+        super().render(context, jinja_env, autoescape)
+
+    def init_docx(self, reload=True):
+        if not self.docx or (self.is_rendered and reload):
+            data = self.compiled.package if self._compiled_body else self.compiled.data
+            self.docx = Document(io.BytesIO(data))
+            self.is_rendered = False
+
+    def resolve_listing(self, xml):
+        # Абзацы без этих символов docxtpl не меняет, поэтому обрабатываются только остальные
+        if not _LISTING_CHARS.search(xml):
+            return xml
+        resolve = super().resolve_listing
+        return _PARAGRAPH.sub(
+            lambda m: resolve(m.group(0)) if _LISTING_CHARS.search(m.group(0)) else m.group(0), xml
+        )
+
+    def _render_compiled(self, template, part, context):
+        # Соответствует DocxTemplate.render_xml_part после компиляции шаблона
+        self.current_rendering_part = part
+        dst_xml = template.render(context)
+        dst_xml = re.sub(r"\n<w:p([ >])", r"<w:p\1", dst_xml)
+        dst_xml = (
+            dst_xml.replace("{_{", "{{")
+            .replace("}_}", "}}")
+            .replace("{_%", "{%")
+            .replace("%_}", "%}")
+        )
+        return self.resolve_listing(dst_xml)
+
+    def build_xml(self, context, jinja_env=None):
+        if jinja_env is not None:
+            return super().build_xml(context, jinja_env)
+        return self._render_compiled(self.compiled.body, self.docx._part, context)
+
+    def build_headers_footers_xml(self, context, uri, jinja_env=None):
+        if jinja_env is not None:
+            yield from super().build_headers_footers_xml(context, uri, jinja_env)
+            return
+        for rel_key, part in self.get_headers_footers(uri):
+            compiled = self.compiled.parts.get(str(part.partname))
+            if compiled is None:
+                xml = self.get_part_xml(part)
+                encoding = self.get_headers_footers_encoding(xml)
+                yield rel_key, self.render_xml_part(self.patch_xml(xml), part, context).encode(encoding)
+                continue
+            template, encoding = compiled
+            yield rel_key, self._render_compiled(template, part, context).encode(encoding)
+
+
+class TemplateCache:
+    """LRU-кэш CompiledTemplate по пути с ограничением суммарного размера."""
+
+    def __init__(self, max_bytes=DOCX_TEMPLATE_CACHE_BYTES):
+        self.max_bytes = max_bytes
+        self._entries = OrderedDict()
+        self._bytes = 0
+        self._lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+
+    def get(self, path):
+        path = os.path.abspath(path)
+        stat = os.stat(path)
+        stamp = (stat.st_mtime_ns, stat.st_size)
+        with self._lock:
+            entry = self._entries.get(path)
+            if entry is not None and entry.stamp == stamp:
+                self._entries.move_to_end(path)
+                self.hits += 1
+                return entry
+            if entry is not None:
+                # Файл изменился — старая запись больше не нужна
+                self._remove(path)
+            self.misses += 1
+
+        with open(path, 'rb') as f:
+            data = f.read()
+        entry = CompiledTemplate(path, data, stamp)
+
+        with self._lock:
+            if path in self._entries:
+                self._remove(path)
+            if entry.size <= self.max_bytes:
+                self._entries[path] = entry
+                self._bytes += entry.size
+                while self._bytes > self.max_bytes:
+                    self._remove(next(iter(self._entries)))
+        return entry
+
+    def _remove(self, path):
+        entry = self._entries.pop(path)
+        self._bytes -= entry.size
+
+    def clear(self):
+        with self._lock:
+            self._entries.clear()
+            self._bytes = 0
+
+    def stats(self):
+        with self._lock:
+            return {'entries': len(self._entries), 'bytes': self._bytes, 'hits': self.hits, 'misses': self.misses}
+
+
+cache = TemplateCache()
+
+
+def load(path):
+    """Копия шаблона path для одного рендеринга (из кэша)."""
+    return cache.get(path).instance()
+
+
+def variables(path):
+    """Имена переменных контекста, на которые ссылается шаблон path (frozenset)."""
+    return cache.get(path).variables
@@ -0,0 +1,431 @@
+"""Фоновая очередь заданий массовой генерации документов группы.
+
+Раньше архив группы собирался прямо в HTTP-запросе: большая группа
+рендерилась минутами, занимала поток waitress и упиралась в таймауты.
+Теперь group_export только ставит задание в таблицу export_jobs, а фоновый
+поток (по образцу audit.AuditWriter) забирает задания по одному, рендерит
+документы порциями через render_engine и после каждой порции записывает
+прогресс (done/total/failed). Готовый ZIP сохраняется в EXPORT_DIR.
+
+Те же функции (select_students, prepare_documents, iter_archive) использует
+generate_group_docs, который отдаёт архив клиенту потоком, не записывая его
+на диск.
+
+Состояние заданий хранится в базе, поэтому они переживают перезапуск:
+recover() при старте приложения возвращает в очередь задания, прерванные
+на середине, и запускает поток, если есть что выполнять.
+
+Завершённые задания хранятся EXPORT_RETENTION_DAYS дней: purge_expired()
+удаляет их архивы и записи при старте и после каждой опустевшей очереди.
+"""
+import json
+import logging
+import os
+import sqlite3
+import threading
+from datetime import datetime, timedelta
+from zipfile import ZipFile
+
+import render_engine
+from birth_dates import year_start
+from config import EXPORT_DIR, EXPORT_RETENTION_DAYS
+from gen_docx import prepare_context, document_filename, DocumentDataLoader, template_sources
+from utils import log_action
+
+# Логгер приложения (настраивается в utils.py)
+logger = logging.getLogger('Students')
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS export_jobs (
+    id           INTEGER PRIMARY KEY AUTOINCREMENT,
+    created_at   TEXT NOT NULL,
+    started_at   TEXT,
+    finished_at  TEXT,
+    user_id      INTEGER,
+    username     TEXT NOT NULL,
+    status       TEXT NOT NULL DEFAULT 'queued' CHECK (status IN ('queued', 'running', 'done', 'failed')),
+    params       TEXT NOT NULL,
+    title        TEXT,
+    total        INTEGER NOT NULL DEFAULT 0,
+    done         INTEGER NOT NULL DEFAULT 0,
+    failed       INTEGER NOT NULL DEFAULT 0,
+    result_path  TEXT,
+    error        TEXT
+);
+CREATE INDEX IF NOT EXISTS idx_export_jobs_status ON export_jobs (status, id);
+CREATE INDEX IF NOT EXISTS idx_export_jobs_user ON export_jobs (user_id, id);
+"""
+
+STUDENTS_QUERY = """
+    SELECT s.*,
+           g.name || ' (' || g.start_year || ', ' || g.study_form || ', ' || g.program_credits || ' кредитів)' AS group_name,
+           g.study_form,
+           g.start_year,
+           g.program_credits,
+           g.qualification_name,
+           g.degree_level,
+           g.specialty,
+           g.educational_program,
+           g.knowledge_area,
+           g.qualification_name_en,
+           g.degree_level_en,
+           g.specialty_en,
+           g.educational_program_en,
+           g.knowledge_area_en,
+           g.institution_name_and_status,
+           g.institution_name_and_status_en,
+           g.entry_requirements,
+           g.entry_requirements_en,
+           g.learning_outcomes,
+           g.learning_outcomes_en,
+           g.program_includes,
+           g.program_includes_en
+    FROM students s
+    LEFT JOIN groups g ON s.group_id = g.id
+    WHERE s.archived = FALSE  -- Исключение архивных студентов
+"""
+
+
+def install(conn):
+    """Создаёт таблицу заданий экспорта."""
+    conn.executescript(SCHEMA)
+
+
+def _now():
+    return datetime.now().strftime('%Y-%m-%d %H:%M:%S')
+
+
+def select_students(conn, group_id=None, birth_year=None, active_students=None):
+    """Студенты для экспорта в постоянном порядке; active_students — id отмеченных в форме."""
+    query = STUDENTS_QUERY
+    params = []
+    # Фильтр по группе, если указан
+    if group_id:
+        query += " AND s.group_id = ?"
+        params.append(group_id)
+    # Фильтр по году рождения, если указан
+    if birth_year:
+        query += " AND s.birth_date_iso >= ?"
+        params.append(year_start(birth_year))
+    # Постоянный порядок документов в архиве
+    query += " ORDER BY s.full_name_sort_key, s.id"
+    students = conn.execute(query, params).fetchall()
+
+    # Фильтрация студентов по активным чекбоксам
+    active_students = {str(student_id) for student_id in (active_students or []) if str(student_id)}
+    if active_students:
+        students = [s for s in students if str(s['id']) in active_students]
+    return students
+
+
+def archive_name(students, group_id, birth_year):
+    """Имя ZIP-архива: группа и год рождения."""
+    group_name = "Зі всіх груп"
+    if group_id and students:
+        group_name = students[0]['group_name'] if students[0]['group_name'] else f"Група_{group_id}"
+    return group_name, f"{group_name}_{str(birth_year) if birth_year else 'Всі роки народження'}.zip"
+
+
+class _ZipSink:
+    """Приёмник без seek для ZipFile: записанные байты забираются порциями через take()."""
+
+    def __init__(self):
+        self._chunks = []
+
+    def write(self, data):
+        self._chunks.append(bytes(data))
+        return len(data)
+
+    def flush(self):
+        pass
+
+    def take(self):
+        data, self._chunks = b''.join(self._chunks), []
+        return data
+
+
+def prepare_documents(conn, students, template):
+    """Контексты документов студентов: (jobs, failures).
+
+    jobs — список (имя файла, контекст) в порядке студентов, failures — (имя
+    файла, ошибка) для студентов, чьи данные не удалось подготовить.
+    Соединение после этого больше не нужно.
+    """
+    # Данные всех студентов загружаются постоянным числом запросов, а не по несколько на студента
+    documents_data = DocumentDataLoader(conn).load(
+        [student['id'] for student in students], template_sources(template)
+    )
+
+    jobs = []
+    failures = []
+    for student in students:
+        student_dict = dict(student)
+        data = documents_data.get(student['id'], {})
+        filename = document_filename(student_dict)
+        try:
+            jobs.append((filename, prepare_context(student_dict, data.get('military'), template, data)))
+        except Exception as e:
+            failures.append((filename, str(e)))
+    return jobs, failures
+
+
+def iter_archive(template, jobs, failures, username, progress=None, chunk_size=None):
+    """Генерирует ZIP-архив документов порциями байтов.
+
+    Документы рендерятся порциями по chunk_size (по умолчанию — по числу
+    процессов рендеринга) и сразу уходят в архив, поэтому в памяти находится
+    не больше одной порции документов. Архив пишется без seek (с дескрипторами
+    данных), его можно отдавать клиенту по мере готовности. После каждой
+    порции вызывается progress(done, failed).
+    """
+    chunk_size = chunk_size or max(1, render_engine.engine.workers)
+    failures = list(failures)
+    written = 0
+    if progress is not None:
+        progress(written, len(failures))
+    sink = _ZipSink()
+    # Порядок файлов в архиве — порядок студентов, а не порядок завершения рендеринга
+    with ZipFile(sink, 'w') as zipf:
+        for start in range(0, len(jobs), chunk_size):
+            chunk = jobs[start:start + chunk_size]
+            results = render_engine.engine.render_many(template, chunk)
+            for (_, context), result in zip(chunk, results):
+                if result.error:
+                    failures.append((result.name, result.error))
+                    continue
+                zipf.writestr(result.name, result.data)
+                written += 1
+                student_name = f"{context.get('last_name_UA', '')} {context.get('first_name_UA', '')}".strip()
+                log_action(username, f"згенерував документ '{result.name}' для студента {student_name}", context.get('group_id'))
+            del results
+            if progress is not None:
+                progress(written, len(failures))
+            yield sink.take()
+        if failures:
+            zipf.writestr("_помилки.txt", "\n".join(f"{name}: {error}" for name, error in failures))
+    yield sink.take()
+
+
+def archive_path(job_id):
+    """Путь архива задания в EXPORT_DIR."""
+    return os.path.join(EXPORT_DIR, f"job_{job_id}.zip")
+
+
+def write_archive(conn, students, template, zip_path, username, progress=None):
+    """Записывает архив документов студентов в файл zip_path.
+
+    Архив пишется во временный файл и переименовывается после завершения,
+    поэтому по zip_path никогда не лежит недописанный архив.
+    """
+    jobs, failures = prepare_documents(conn, students, template)
+    partial_path = f"{zip_path}.part"
+    try:
+        with open(partial_path, 'wb') as f:
+            for data in iter_archive(template, jobs, failures, username, progress):
+                f.write(data)
+        os.replace(partial_path, zip_path)
+    except BaseException:
+        _remove(partial_path)
+        raise
+
+
+def _remove(path):
+    try:
+        os.remove(path)
+    except FileNotFoundError:
+        pass
+
+
+def submit(conn, params, username, user_id=None, title=None):
+    """Ставит задание в очередь и будит фоновый поток; возвращает id задания.
+
+    params — group_id, birth_year, template и active_students (список id).
+    """
+    job_id = conn.execute("""
+        INSERT INTO export_jobs (created_at, user_id, username, params, title)
+        VALUES (?, ?, ?, ?, ?)
+    """, (_now(), user_id, username, json.dumps(params, ensure_ascii=False), title)).lastrowid
+    conn.commit()
+    runner.wake()
+    return job_id
+
+
+def get(conn, job_id):
+    return conn.execute("SELECT * FROM export_jobs WHERE id = ?", (job_id,)).fetchone()
+
+
+def recent(conn, user_id=None, limit=10):
+    """Последние задания пользователя (или всех, если user_id не задан)."""
+    if user_id is None:
+        return conn.execute("SELECT * FROM export_jobs ORDER BY id DESC LIMIT ?", (limit,)).fetchall()
+    return conn.execute(
+        "SELECT * FROM export_jobs WHERE user_id = ? ORDER BY id DESC LIMIT ?", (user_id, limit)
+    ).fetchall()
+
+
+def purge_expired(conn, days=EXPORT_RETENTION_DAYS):
+    """Удаляет завершённые задания старше days дней вместе с их архивами; возвращает их число."""
+    threshold = (datetime.now() - timedelta(days=days)).strftime('%Y-%m-%d %H:%M:%S')
+    expired = conn.execute("""
+        SELECT id, result_path FROM export_jobs
+        WHERE status IN ('done', 'failed') AND finished_at < ?
+    """, (threshold,)).fetchall()
+    for job in expired:
+        if job['result_path']:
+            try:
+                _remove(job['result_path'])
+            except OSError as e:
+                logger.error(f"Не вдалося видалити архів завдання експорту #{job['id']}: {e}")
+                continue
+        conn.execute("DELETE FROM export_jobs WHERE id = ?", (job['id'],))
+    conn.commit()
+    if expired:
+        logger.info(f"Видалено застарілих завдань експорту: {len(expired)}")
+    return len(expired)
+
+
+def recover(conn):
+    """Возвращает в очередь задания, прерванные остановкой приложения, и запускает поток.
+
+    Заодно удаляет устаревшие задания и недописанные архивы, оставшиеся от
+    аварийной остановки.
+    """
+    purge_expired(conn)
+    if os.path.isdir(EXPORT_DIR):
+        for name in os.listdir(EXPORT_DIR):
+            if name.endswith('.part'):
+                _remove(os.path.join(EXPORT_DIR, name))
+    requeued = conn.execute("""
+        UPDATE export_jobs SET status = 'queued', started_at = NULL, done = 0, failed = 0
+        WHERE status = 'running'
+    """).rowcount
+    conn.commit()
+    if requeued:
+        logger.info(f"Повернуто в чергу перерваних завдань експорту: {requeued}")
+    if conn.execute("SELECT 1 FROM export_jobs WHERE status = 'queued' LIMIT 1").fetchone():
+        runner.wake()
+
+
+class ExportRunner:
+    """Фоновый поток, который выполняет задания export_jobs по одному."""
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._wakeup = threading.Event()
+        self._thread = None
+        self._pid = None
+
+    def wake(self):
+        self._ensure_started()
+        self._wakeup.set()
+
+    def _ensure_started(self):
+        if self._thread is not None and self._pid == os.getpid():
+            return
+        with self._lock:
+            if self._thread is not None and self._pid == os.getpid():
+                return
+            # В дочернем процессе поток родителя не существует — начинаем заново
+            self._wakeup = threading.Event()
+            self._pid = os.getpid()
+            self._thread = threading.Thread(target=self._run, name='export-jobs', daemon=True)
+            self._thread.start()
+
+    def _run(self):
+        from db import connect
+
+        conn = None
+        while True:
+            self._wakeup.wait()
+            self._wakeup.clear()
+            try:
+                if conn is None:
+                    conn = connect()
+                # Задания выполняются, пока очередь не опустеет
+                while True:
+                    job = self._claim(conn)
+                    if job is None:
+                        break
+                    try:
+                        self._execute(conn, job)
+                    except Exception as e:
+                        # Ошибка вне обработки в _execute (в том числе при отметке о сбое):
+                        # задание не должно остаться 'running', соединение открывается заново
+                        conn = _discard(conn)
+                        conn = connect()
+                        self._fail(conn, job['id'], e)
+                purge_expired(conn)
+            except Exception as e:
+                # Любая ошибка не должна останавливать поток: иначе очередь не выполняется до перезапуска
+                logger.error(f"Помилка черги завдань експорту: {e}")
+                conn = _discard(conn)
+
+    def _claim(self, conn):
+        # Захват атомарен: задание получит только один поток даже при нескольких процессах
+        job = conn.execute("""
+            UPDATE export_jobs SET status = 'running', started_at = ?
+            WHERE id = (SELECT id FROM export_jobs WHERE status = 'queued' ORDER BY id LIMIT 1)
+            RETURNING *
+        """, (_now(),)).fetchone()
+        conn.commit()
+        return job
+
+    def _execute(self, conn, job):
+        job_id = job['id']
+        params = json.loads(job['params'])
+        template = params.get('template')
+        try:
+            if not template or not os.path.exists(template):
+                raise FileNotFoundError(f"Шаблон {template} не знайдено.")
+            students = select_students(
+                conn, params.get('group_id'), params.get('birth_year'), params.get('active_students')
+            )
+            if not students:
+                raise LookupError("Студентів за заданими фільтрами не знайдено.")
+            group_name, zip_filename = archive_name(students, params.get('group_id'), params.get('birth_year'))
+            conn.execute("UPDATE export_jobs SET total = ?, title = ? WHERE id = ?", (len(students), zip_filename, job_id))
+            conn.commit()
+
+            os.makedirs(EXPORT_DIR, exist_ok=True)
+            zip_path = archive_path(job_id)
+
+            def progress(done, failed):
+                conn.execute("UPDATE export_jobs SET done = ?, failed = ? WHERE id = ?", (done, failed, job_id))
+                conn.commit()
+
+            write_archive(conn, students, template, zip_path, job['username'], progress)
+            conn.execute("""
+                UPDATE export_jobs SET status = 'done', finished_at = ?, result_path = ? WHERE id = ?
+            """, (_now(), zip_path, job_id))
+            conn.commit()
+        except Exception as e:
+            self._fail(conn, job_id, e)
+            return
+
+        birth_year = params.get('birth_year')
+        log_action(job['username'], f"згенерував документи для групи {group_name} (рік народження: {birth_year or 'всі'})")
+
+
+    def _fail(self, conn, job_id, error):
+        """Отмечает задание как завершённое с ошибкой и удаляет недописанный архив."""
+        logger.error(f"Помилка завдання експорту #{job_id}: {error}")
+        conn.rollback()
+        conn.execute("""
+            UPDATE export_jobs SET status = 'failed', finished_at = ?, error = ? WHERE id = ?
+        """, (_now(), str(error), job_id))
+        conn.commit()
+        _remove(f"{archive_path(job_id)}.part")
+
+
+def _discard(conn):
+    """Откатывает и закрывает соединение после ошибки."""
+    if conn is not None:
+        try:
+            conn.rollback()
+        except sqlite3.Error:
+            pass
+        conn.dispose()
+    return None
+
+
+runner = ExportRunner()
@@ -1,18 +1,19 @@
+import io
+import json
 import os
-import re
-import sqlite3
+import threading
 from datetime import datetime
-from docxtpl import DocxTemplate
+from types import MappingProxyType
+import docx_templates
+import document_cache
 
 from utils import log_action, logger as global_logger
 from db import get_db
-from datetime import datetime
 
 def insert_subjects_table(doc, student_id):
     """Вставка таблицы с предметами и оценками студента."""
     # global_logger.debug(f"Запуск insert_subjects_table для student_id={student_id}")
     conn = get_db()
-    conn.row_factory = sqlite3.Row
     student = conn.execute("""
         SELECT s.*, 
                g.name || ' (' || g.start_year || ', ' || g.study_form || ', ' || g.program_credits || ' кредитів)' AS group_name
@@ -104,196 +105,243 @@ def format_grade(grade, subject_type):
     except (ValueError, TypeError):
         return "Ошибка: введите число от 0 до 100" if subject_type == "Залік" else ""
 
-def get_subjects_grades(student_id, group_id):
-    """Получение данных о предметах и их оценках."""
-    # global_logger.debug(f"Запуск get_subjects_grades для student_id={student_id}, group_id={group_id}")
-    conn = get_db()
-    conn.row_factory = sqlite3.Row
-    try:
-        results = conn.execute("""
-            SELECT s.id, s.code, s.name, s.credits, s.type, s.position, IFNULL(g.grade, '') AS grade
-            FROM subjects s
-            LEFT JOIN grades g ON g.subject_id = s.id AND g.student_id = ?
-            WHERE s.group_id = ?
-            ORDER BY s.position
-        """, (student_id, group_id)).fetchall()
-        subjects = [dict(r) for r in results]
-        # global_logger.debug(f"Получено {len(subjects)} предметов: {subjects}")
-        valid_subjects = []
-        for subject in subjects:
-            if all(key in subject for key in ['id', 'code', 'name', 'credits', 'type', 'position', 'grade']):
-                subject = {k: clean_text(v) for k, v in subject.items()}
-                subject['grade'] = format_grade(subject['grade'], subject['type']) if subject['grade'] else ''
-                valid_subjects.append(subject)
-            else:
-                global_logger.warning(f"Неполные данные предмета пропущены: {subject}")
-        return valid_subjects
-    except Exception as e:
-        global_logger.error(f"[get_subjects_grades] Ошибка: {e}")
-        return []
-    finally:
-        conn.close()
-
-def get_practice_data(student_id, group_id):
-    """Получение данных о практиках и их оценках."""
-    # global_logger.debug(f"Запуск get_practice_data для student_id={student_id}, group_id={group_id}")
-    conn = get_db()
-    conn.row_factory = sqlite3.Row
-    try:
-        results = conn.execute("""
-            SELECT p.id, p.code, p.name, p.credits, p.type, p.position, IFNULL(ag.grade, '') AS grade
-            FROM practices p
-            LEFT JOIN activity_grades ag ON ag.entity_id = p.id AND ag.entity_type = 'practice' AND ag.student_id = ?
-            WHERE p.group_id = ?
-            ORDER BY p.position
-        """, (student_id, group_id)).fetchall()
-        practices = [dict(r) for r in results]
-        # global_logger.debug(f"Получено {len(practices)} практик: {practices}")
-        valid_practices = []
-        for practice in practices:
-            if all(key in practice for key in ['id', 'code', 'name', 'credits', 'type', 'position', 'grade']):
-                practice = {k: clean_text(v) for k, v in practice.items()}
-                practice['grade'] = format_grade(practice['grade'], practice['type']) if practice['grade'] else ''
-                valid_practices.append(practice)
-            else:
-                global_logger.warning(f"Неполные данные практики пропущены: {practice}")
-        return valid_practices
-    except Exception as e:
-        global_logger.error(f"[get_practice_data] Ошибка: {e}")
-        return []
-    finally:
-        conn.close()
-
-def get_coursework_data(student_id, group_id):
-    """Получение данных о курсовых работах и их оценках."""
-    # global_logger.debug(f"Запуск get_coursework_data для student_id={student_id}, group_id={group_id}")
-    conn = get_db()
-    conn.row_factory = sqlite3.Row
-    try:
-        results = conn.execute("""
-            SELECT c.id, c.code, c.name, c.credits, c.type, c.position, IFNULL(ag.grade, '') AS grade
-            FROM courseworks c
-            LEFT JOIN activity_grades ag ON ag.entity_id = c.id AND ag.entity_type = 'coursework' AND ag.student_id = ?
-            WHERE c.group_id = ?
-            ORDER BY c.position
-        """, (student_id, group_id)).fetchall()
-        courseworks = [dict(r) for r in results]
-        # global_logger.debug(f"Получено {len(courseworks)} курсовых работ: {courseworks}")
-        valid_courseworks = []
-        for coursework in courseworks:
-            if all(key in coursework for key in ['id', 'code', 'name', 'credits', 'type', 'position', 'grade']):
-                coursework = {k: clean_text(v) for k, v in coursework.items()}
-                coursework['grade'] = format_grade(coursework['grade'], coursework['type']) if coursework['grade'] else ''
-                valid_courseworks.append(coursework)
-            else:
-                global_logger.warning(f"Неполные данные курсовой работы пропущены: {coursework}")
-        return valid_courseworks
-    except Exception as e:
-        global_logger.error(f"[get_coursework_data] Ошибка: {e}")
-        return []
-    finally:
-        conn.close()
-
-def get_attestation_data(student_id, group_id):
-    """Получение данных об аттестациях и их оценках."""
-    # global_logger.debug(f"Запуск get_attestation_data для student_id={student_id}, group_id={group_id}")
-    conn = get_db()
-    conn.row_factory = sqlite3.Row
-    try:
-        results = conn.execute("""
-            SELECT a.id, a.code, a.name, a.credits, a.type, a.position, IFNULL(ag.grade, '') AS grade, IFNULL(ag.name, '') AS student_name
-            FROM attestations a
-            LEFT JOIN activity_grades ag ON ag.entity_id = a.id AND ag.entity_type = 'attestation' AND ag.student_id = ?
-            WHERE a.group_id = ?
-            ORDER BY a.position
-        """, (student_id, group_id)).fetchall()
-        attestations = [dict(r) for r in results]
-        # global_logger.debug(f"Получено {len(attestations)} аттестаций: {attestations}")
-        valid_attestations = []
-        for attestation in attestations:
-            if all(key in attestation for key in ['id', 'code', 'name', 'credits', 'type', 'position', 'grade', 'student_name']):
-                attestation = {k: clean_text(v) for k, v in attestation.items()}
-                attestation['grade'] = format_grade(attestation['grade'], attestation['type']) if attestation['grade'] else ''
-                valid_attestations.append(attestation)
-            else:
-                global_logger.warning(f"Неполные данные аттестации пропущены: {attestation}")
-        return valid_attestations
-    except Exception as e:
-        global_logger.error(f"[get_attestation_data] Ошибка: {e}")
-        return []
-    finally:
-        conn.close()
-
-def gen_doc(student: dict, military: dict, template='template.docx', out='out.docx', user_name='Система'):
-    """Генерирует документ для студента на основе шаблона."""
-    global_logger.debug(f"Запуск gen_doc: student_id={student.get('id', 'unknown')}, template={template}, out={out}")
-    
-    # Проверка входных данных
-    # global_logger.debug(f"Входные данные student: {dict(student)}")
-    # if military:
-        # global_logger.debug(f"Входные данные military: {dict(military)}")
-    # else:
-        # global_logger.debug("Данные military отсутствуют")
-
-    # Проверка существования шаблона
-    if not os.path.exists(template):
-        global_logger.error(f"Шаблон {template} не найден")
-        raise FileNotFoundError(f"Шаблон {template} не найден")
-
-    try:
-        doc = DocxTemplate(template)
-        global_logger.debug(f"Шаблон {template} успешно загружен")
-    except Exception as e:
-        global_logger.error(f"Ошибка при загрузке шаблона {template}: {str(e)}")
-        raise
-
-    # Получение данных о документах об образовании
-    conn = get_db()
-    conn.row_factory = sqlite3.Row
-    education_docs = conn.execute("""
-        SELECT ed.document_type, ed.document_number, ed.institution_name, ed.country, ed.completion_date,
-               ed.document_type_en, ed.institution_name_en, ed.country_en,
-               fed.reference_number, fed.reference_institution, fed.reference_country, fed.reference_issue_date,
-               fed.reference_institution_en, fed.reference_country_en,
-               fed.recognition_certificate_number, fed.recognition_issuer, fed.recognition_date,
-               fed.recognition_issuer_en
-        FROM education_documents ed
-        LEFT JOIN foreign_education_docs fed ON ed.id = fed.education_doc_id
-        WHERE ed.student_id = ?
-        ORDER BY ed.id DESC LIMIT 1
-    """, (student['id'],)).fetchone()
-    conn.close()
-
-    # Преобразование словарей
-    student_dict = {k: clean_text(v) for k, v in dict(student).items()}
-    military_dict = {k: clean_text(v) for k, v in dict(military).items()} if military else {}
-    
-    # Добавление данных об образовании в student_dict
-    if education_docs:
-        for key, value in dict(education_docs).items():
-            student_dict[key] = clean_text(value) if value else ''
-
-    # Форматирование birth_date
-    birth_date = student_dict.get('birth_date', '')
-    # global_logger.debug(f"Исходная birth_date: '{birth_date}', тип: {type(birth_date)}")
-    if birth_date:
+# Колонки группы, которые нужны шаблонам вместе с s.*
+GROUP_COLUMNS = [
+    'start_year', 'study_form', 'program_credits',
+    'qualification_name', 'degree_level', 'specialty', 'educational_program', 'knowledge_area',
+    'qualification_name_en', 'degree_level_en', 'specialty_en', 'educational_program_en', 'knowledge_area_en',
+    'institution_name_and_status', 'institution_name_and_status_en',
+    'entry_requirements', 'entry_requirements_en',
+    'learning_outcomes', 'learning_outcomes_en', 'program_includes', 'program_includes_en',
+]
+
+# Поля группы в данных студента: из них строится общий контекст группы (build_group_context)
+GROUP_KEYS = frozenset(['group_name', *GROUP_COLUMNS])
+
+# Поля группы, которые в контексте документа разбиты на списки строк
+GROUP_LINE_FIELDS = ['program_includes', 'program_includes_en', 'learning_outcomes', 'learning_outcomes_en']
+
+# Дисциплины и виды деятельности с оценками: (ключ контекста, SQL, обязательные поля)
+GRADED_ITEMS = [
+    ('subjects_grades', """
+        SELECT st.id AS student_id, s.id, s.code, s.name, s.credits, s.type, s.position, IFNULL(g.grade, '') AS grade
+        FROM students st
+        JOIN subjects s ON s.group_id = st.group_id
+        LEFT JOIN grades g ON g.subject_id = s.id AND g.student_id = st.id
+        WHERE st.id IN (SELECT value FROM json_each(?))
+        ORDER BY st.id, s.position
+    """, ['id', 'code', 'name', 'credits', 'type', 'position', 'grade']),
+    ('practice_data', """
+        SELECT st.id AS student_id, p.id, p.code, p.name, p.credits, p.type, p.position, IFNULL(ag.grade, '') AS grade
+        FROM students st
+        JOIN practices p ON p.group_id = st.group_id
+        LEFT JOIN activity_grades ag ON ag.entity_id = p.id AND ag.entity_type = 'practice' AND ag.student_id = st.id
+        WHERE st.id IN (SELECT value FROM json_each(?))
+        ORDER BY st.id, p.position
+    """, ['id', 'code', 'name', 'credits', 'type', 'position', 'grade']),
+    ('coursework_data', """
+        SELECT st.id AS student_id, c.id, c.code, c.name, c.credits, c.type, c.position, IFNULL(ag.grade, '') AS grade
+        FROM students st
+        JOIN courseworks c ON c.group_id = st.group_id
+        LEFT JOIN activity_grades ag ON ag.entity_id = c.id AND ag.entity_type = 'coursework' AND ag.student_id = st.id
+        WHERE st.id IN (SELECT value FROM json_each(?))
+        ORDER BY st.id, c.position
+    """, ['id', 'code', 'name', 'credits', 'type', 'position', 'grade']),
+    ('attestation_data', """
+        SELECT st.id AS student_id, a.id, a.code, a.name, a.credits, a.type, a.position,
+               IFNULL(ag.grade, '') AS grade, IFNULL(ag.name, '') AS student_name
+        FROM students st
+        JOIN attestations a ON a.group_id = st.group_id
+        LEFT JOIN activity_grades ag ON ag.entity_id = a.id AND ag.entity_type = 'attestation' AND ag.student_id = st.id
+        WHERE st.id IN (SELECT value FROM json_each(?))
+        ORDER BY st.id, a.position
+    """, ['id', 'code', 'name', 'credits', 'type', 'position', 'grade', 'student_name']),
+]
+
+# Поля военного учёта и документа об образовании, которые попадают в контекст
+MILITARY_COLUMNS = [
+    'registration_number_of_the_DRPVR', 'military_registration_document', 'issued_VOD',
+    'military_accounting_specialty_number', 'military_rank', 'change_credentials',
+    'reason_for_changing_credentials', 'being_on_military_registration', 'address_of_residence',
+]
+EDUCATION_DOC_COLUMNS = [
+    'document_type', 'document_number', 'institution_name', 'country', 'completion_date',
+    'document_type_en', 'institution_name_en', 'country_en',
+    'reference_number', 'reference_institution', 'reference_country', 'reference_issue_date',
+    'reference_institution_en', 'reference_country_en',
+    'recognition_certificate_number', 'recognition_issuer', 'recognition_date', 'recognition_issuer_en',
+]
+
+# Признак диплома с отличием вычисляется по всем оценкам
+HONOURS_VARIABLES = ['diploma_with_honor_text', 'diploma_with_honor_text_en']
+
+# Источники данных DocumentDataLoader и переменные шаблона, которые из них берутся.
+# Студент с группой загружается всегда; остальное — только если шаблон ссылается на его поля.
+DATA_SOURCES = {
+    'military': frozenset(MILITARY_COLUMNS),
+    'education_doc': frozenset(EDUCATION_DOC_COLUMNS),
+    'diploma': frozenset(['diploma_number', 'appendix_number']),
+    'accreditation': frozenset(['accreditation_text', 'accreditation_text_en']),
+    **{key: frozenset([key, *HONOURS_VARIABLES]) for key, _, _ in GRADED_ITEMS},
+}
+ALL_SOURCES = frozenset(DATA_SOURCES)
+
+_template_sources = {}
+
+def template_sources(template):
+    """Источники данных, нужные шаблону, по его переменным; кэшируется по содержимому шаблона."""
+    compiled = docx_templates.cache.get(template)
+    sources = _template_sources.get(compiled.digest)
+    if sources is None:
+        sources = frozenset(name for name, fields in DATA_SOURCES.items() if fields & compiled.variables)
+        _template_sources[compiled.digest] = sources
+    return sources
+
+def prepare_graded_item(item, required_keys):
+    """Строка дисциплины/деятельности для шаблона: текст очищен, оценка отформатирована."""
+    if not all(key in item for key in required_keys):
+        global_logger.warning(f"Неполные данные пропущены: {item}")
+        return None
+    item = {k: clean_text(v) for k, v in item.items()}
+    item['grade'] = format_grade(item['grade'], item['type']) if item['grade'] else ''
+    return item
+
+class DocumentDataLoader:
+    """Загрузка данных для документов сразу для набора студентов.
+
+    Число запросов не зависит от количества студентов: студенты с группами,
+    военные данные, документы об образовании, дипломы, аккредитации и по
+    одному запросу на каждый вид оценок. Запрашиваются только источники, на
+    поля которых ссылается шаблон (template_sources). Идентификаторы
+    передаются одним параметром через json_each, поэтому размер набора не
+    ограничен числом параметров SQLite.
+    """
+
+    def __init__(self, conn=None):
+        self.conn = conn
+
+    def load(self, student_ids, sources=ALL_SOURCES):
+        """Возвращает {student_id: данные} для переданных id (отсутствующие пропускаются).
+
+        Данные — словарь с ключами student, military, education_doc, diploma и
+        ключами загруженных источников из sources (см. DATA_SOURCES и
+        template_sources): subjects_grades, practice_data, coursework_data,
+        attestation_data, accreditation. Незапрошенные military, education_doc
+        и diploma остаются пустыми.
+        """
+        student_ids = [int(student_id) for student_id in student_ids]
+        if not student_ids:
+            return {}
+        conn = self.conn or get_db()
         try:
-            date_obj = datetime.strptime(birth_date, '%d.%m.%Y')
-            birth_date = date_obj.strftime('%d/%m/%Y')
-            # global_logger.debug(f"Отформатированная birth_date: '{birth_date}'")
-        except ValueError:
-            try:
-                date_obj = datetime.strptime(birth_date, '%Y-%m-%d')
-                birth_date = date_obj.strftime('%d/%m/%Y')
-                # global_logger.debug(f"Отформатированная birth_date (альтернативный формат): '{birth_date}'")
-            except ValueError:
-                # global_logger.warning(f"Неизвестный формат birth_date: '{birth_date}', оставляем как есть")
-                birth_date = student_dict['birth_date']
-    
-    student_dict['birth_date'] = birth_date
+            return self._load(conn, json.dumps(student_ids), sources)
+        finally:
+            if self.conn is None:
+                conn.close()
+
+    def _load(self, conn, ids, sources):
+        group_columns = ',\n                   '.join(f"g.{column}" for column in GROUP_COLUMNS)
+        data = {}
+        for row in conn.execute(f"""
+            SELECT s.*,
+                   g.name || ' (' || g.start_year || ', ' || g.study_form || ', ' || g.program_credits || ' кредитів)' AS group_name,
+                   {group_columns}
+            FROM students s
+            LEFT JOIN groups g ON s.group_id = g.id
+            WHERE s.id IN (SELECT value FROM json_each(?))
+        """, (ids,)):
+            data[row['id']] = {
+                'student': dict(row), 'military': {}, 'education_doc': None, 'diploma': None,
+            }
+
+        if 'military' in sources:
+            self._load_military(conn, ids, data)
+        if 'education_doc' in sources:
+            self._load_education_docs(conn, ids, data)
+        if 'diploma' in sources:
+            self._load_diplomas(conn, ids, data)
+        for key, sql, required_keys in GRADED_ITEMS:
+            if key in sources:
+                self._load_graded_items(conn, ids, data, key, sql, required_keys)
+        if 'accreditation' in sources:
+            self._load_accreditations(conn, data)
+        return data
+
+    def _load_military(self, conn, ids, data):
+        for row in conn.execute("SELECT * FROM military WHERE student_id IN (SELECT value FROM json_each(?))", (ids,)):
+            if row['student_id'] in data and not data[row['student_id']]['military']:
+                data[row['student_id']]['military'] = dict(row)
+
+    def _load_education_docs(self, conn, ids, data):
+        # Последний документ об образовании каждого студента
+        for row in conn.execute("""
+            SELECT * FROM (
+                SELECT ed.student_id,
+                       ed.document_type, ed.document_number, ed.institution_name, ed.country, ed.completion_date,
+                       ed.document_type_en, ed.institution_name_en, ed.country_en,
+                       fed.reference_number, fed.reference_institution, fed.reference_country, fed.reference_issue_date,
+                       fed.reference_institution_en, fed.reference_country_en,
+                       fed.recognition_certificate_number, fed.recognition_issuer, fed.recognition_date,
+                       fed.recognition_issuer_en,
+                       ROW_NUMBER() OVER (PARTITION BY ed.student_id ORDER BY ed.id DESC) AS rn
+                FROM education_documents ed
+                LEFT JOIN foreign_education_docs fed ON ed.id = fed.education_doc_id
+                WHERE ed.student_id IN (SELECT value FROM json_each(?))
+            ) WHERE rn = 1
+        """, (ids,)):
+            document = dict(row)
+            del document['student_id'], document['rn']
+            data[row['student_id']]['education_doc'] = document
+
+    def _load_diplomas(self, conn, ids, data):
+        # Последний диплом каждого студента
+        for row in conn.execute("""
+            SELECT student_id, diploma_number, appendix_number FROM (
+                SELECT student_id, diploma_number, appendix_number,
+                       ROW_NUMBER() OVER (PARTITION BY student_id ORDER BY id DESC) AS rn
+                FROM diplomas
+                WHERE student_id IN (SELECT value FROM json_each(?))
+            ) WHERE rn = 1
+        """, (ids,)):
+            data[row['student_id']]['diploma'] = {'diploma_number': row['diploma_number'], 'appendix_number': row['appendix_number']}
+
+    def _load_graded_items(self, conn, ids, data, key, sql, required_keys):
+        for item in data.values():
+            item[key] = []
+        try:
+            for row in conn.execute(sql, (ids,)):
+                item = dict(row)
+                student_id = item.pop('student_id')
+                item = prepare_graded_item(item, required_keys)
+                if item is not None:
+                    data[student_id][key].append(item)
+        except Exception as e:
+            global_logger.error(f"[DocumentDataLoader] Ошибка при загрузке {key}: {e}")
+
+    def _load_accreditations(self, conn, data):
+        # Аккредитация по (ступень, специальность): берётся последняя запись
+        accreditations = {}
+        try:
+            for row in conn.execute("SELECT degree, specialty, text_ua, text_en FROM accreditations ORDER BY id DESC"):
+                accreditations.setdefault((row['degree'], row['specialty']), row)
+        except Exception as e:
+            global_logger.error(f"[DocumentDataLoader] Ошибка при загрузке аккредитаций: {e}")
+        for item in data.values():
+            student = item['student']
+            item['accreditation'] = accreditations.get((student.get('degree_level') or '', student.get('specialty') or ''))
+
+def build_group_context(group, accreditation, with_accreditation):
+    """Общая для всех студентов группы часть контекста.
+
+    group — значения GROUP_KEYS, accreditation — запись аккредитации или
+    None; with_accreditation — была ли аккредитация загружена. Результат не зависит от студента, поэтому считается один раз на
+    группу (GroupContextCache); списки строк хранятся кортежами, чтобы общий
+    контекст нельзя было изменить из контекста одного документа.
+    """
+    group_dict = {k: clean_text(group.get(k)) for k in GROUP_KEYS if k in group}
 
     # Вычисление study_years на основе program_credits
-    program_credits = student_dict.get('program_credits', '')
+    program_credits = group_dict.get('program_credits', '')
     study_years = ''
     try:
         credits = int(program_credits)
@@ -307,32 +355,28 @@ def gen_doc(student: dict, military: dict, template='template.docx', out='out.do
             study_years = '1.5'
         else:
             study_years = str(credits // 60)  # Общее правило: 60 кредитов = 1 год
-        # global_logger.debug(f"program_credits: {program_credits}, study_years: {study_years}")
     except (ValueError, TypeError):
-        # global_logger.warning(f"Невалидное значение program_credits: '{program_credits}', study_years оставлено пустым")
         study_years = ''
-    
-    student_dict['study_years'] = study_years
-    
+
+    group_dict['study_years'] = study_years
+
     # Вычисление study_form_eu на основе study_form
-    if 'adddiplom' in template.lower():
-        study_form = student_dict.get('study_form', '')
-        study_form_eu = ''
-        if study_form == 'Денна':
-            study_form_eu = 'Full'
-        elif study_form == 'Заочна':
-            study_form_eu = 'Part'
-        else:
-            study_form_eu = study_form
-        # global_logger.debug(f"study_form: {study_form}, study_form_eu: {study_form_eu}")
-    
-        student_dict['study_form_eu'] = study_form_eu
-    
+    study_form = group_dict.get('study_form', '')
+    study_form_eu = ''
+    if study_form == 'Денна':
+        study_form_eu = 'Full'
+    elif study_form == 'Заочна':
+        study_form_eu = 'Part'
+    else:
+        study_form_eu = study_form
+
+    group_dict['study_form_eu'] = study_form_eu
+
     # Вычисление end_year на основе start_year, program_credits и degree_level
     end_year = ''
-    start_year = student_dict.get('start_year', '')
-    program_credits = student_dict.get('program_credits', '')
-    degree_level = student_dict.get('degree_level', '')
+    start_year = group_dict.get('start_year', '')
+    program_credits = group_dict.get('program_credits', '')
+    degree_level = group_dict.get('degree_level', '')
     try:
         if program_credits and start_year:
             credits = int(program_credits)
@@ -349,109 +393,121 @@ def gen_doc(student: dict, military: dict, template='template.docx', out='out.do
                     end_year = str(year + 2)
             else:
                 end_year = str(year + (credits // 60))  # Общее правило
-        # global_logger.debug(f"start_year: {start_year}, program_credits: {program_credits}, degree_level: {degree_level}, end_year: {end_year}")
     except (ValueError, TypeError) as e:
         global_logger.warning(f"Ошибка при расчёте end_year: start_year='{start_year}', program_credits='{program_credits}', degree_level='{degree_level}', ошибка: {str(e)}")
         end_year = ''
-    
-    student_dict['end_year'] = end_year
-    
-    student_dict['end_year_short'] = student_dict['end_year'][-2:] if student_dict['end_year'] else ''
-
-    # Проверка новых полей, включая недавно добавленные
-    new_fields = [
-        'qualification_name', 'degree_level', 'specialty', 'educational_program', 'knowledge_area',
-        'qualification_name_en', 'degree_level_en', 'specialty_en', 'educational_program_en', 'knowledge_area_en',
-        'program_credits', 'study_years', 'study_form', 'study_form_eu', 'start_year', 'end_year', 'end_year_short', 
-        'institution_name_and_status', 'institution_name_and_status_en',
-        'entry_requirements', 'entry_requirements_en',
-        'learning_outcomes', 'learning_outcomes_en', 'program_includes', 'program_includes_en',
-        'document_type', 'document_number', 'institution_name', 'country', 'completion_date',
-        'document_type_en', 'institution_name_en', 'country_en',
-        'reference_number', 'reference_institution', 'reference_country', 'reference_issue_date',
-        'reference_institution_en', 'reference_country_en',
-        'recognition_certificate_number', 'recognition_issuer', 'recognition_date',
-        'recognition_issuer_en'
-    ]
-    # global_logger.debug(f"Новые поля в student_dict: {[(k, student_dict.get(k, '')) for k in new_fields]}")
+
+    group_dict['end_year'] = end_year
+
+    group_dict['end_year_short'] = group_dict['end_year'][-2:] if group_dict['end_year'] else ''
 
     if degree_level == "Магістр":
-        student_dict['top_qualification_text'] = "- підготовка кваліфікаційної роботи / preparation of qualification work"
-        student_dict['bottom_qualification_text'] = "- захист кваліфікаційної роботи / defense of qualification work"
+        group_dict['top_qualification_text'] = "- підготовка кваліфікаційної роботи / preparation of qualification work"
+        group_dict['bottom_qualification_text'] = "- захист кваліфікаційної роботи / defense of qualification work"
 
     # Обработка текста для полей с разделением на отдельные строки по \n и удалением лишнего \n
-    fields_to_process = ['program_includes', 'program_includes_en', 'learning_outcomes', 'learning_outcomes_en']
-    for field in fields_to_process:
-        if field in student_dict and student_dict[field]:
-            lines = student_dict[field].split('\n')
-            cleaned_lines = [line.strip() for line in lines if line.strip()]
-            student_dict[field] = cleaned_lines
-            # global_logger.debug(f"Обработан {field} как список: {student_dict[field]}")
+    for field in GROUP_LINE_FIELDS:
+        if field in group_dict and group_dict[field]:
+            lines = group_dict[field].split('\n')
+            group_dict[field] = tuple(line.strip() for line in lines if line.strip())
+
+    # Автоподстановка аккредитации для диплома
+    if with_accreditation:
+        if accreditation:
+            group_dict['accreditation_text'] = accreditation['text_ua']
+            group_dict['accreditation_text_en'] = accreditation['text_en']
+        else:
+            group_dict['accreditation_text'] = ''
+            group_dict['accreditation_text_en'] = ''
+
+    return MappingProxyType(group_dict)
+
+class GroupContextCache:
+    """Неизменяемые контексты групп по group_id.
+
+    Запись хранится вместе с отпечатком исходных данных (значения колонок
+    группы и аккредитация): при изменении группы отпечаток не совпадёт и
+    контекст будет построен заново, явный сброс не нужен.
+    """
+
+    def __init__(self):
+        self._entries = {}
+        self._lock = threading.Lock()
+
+    def get(self, group_id, group, accreditation, with_accreditation):
+        accreditation_key = (accreditation['text_ua'], accreditation['text_en']) if accreditation else None
+        fingerprint = (tuple(group.get(k) for k in GROUP_KEYS), accreditation_key)
+        key = (group_id, with_accreditation)
+        with self._lock:
+            entry = self._entries.get(key)
+        if entry is not None and entry[0] == fingerprint:
+            return entry[1]
+        context = build_group_context(group, accreditation, with_accreditation)
+        # Студенты без группы не кэшируются
+        if group_id is not None:
+            with self._lock:
+                self._entries[key] = (fingerprint, context)
+        return context
+
+    def clear(self):
+        with self._lock:
+            self._entries.clear()
+
+group_contexts = GroupContextCache()
+
+def build_context(data, template):
+    """Контекст шаблона для одного студента из данных DocumentDataLoader.
+
+    Общая часть группы берётся из group_contexts; здесь обрабатываются только
+    поля самого студента.
+    """
+    student = dict(data['student'])
+    group_context = group_contexts.get(student.get('group_id'), student, data.get('accreditation'), 'accreditation' in data)
+
+    # Преобразование словарей
+    student_dict = {k: clean_text(v) for k, v in student.items() if k not in GROUP_KEYS}
+    student_dict.update(group_context)
+    # В кэше группы списки строк — кортежи; документ получает списки, как и раньше
+    for field in GROUP_LINE_FIELDS:
+        if isinstance(student_dict.get(field), tuple):
+            student_dict[field] = list(student_dict[field])
+    military_dict = {k: clean_text(v) for k, v in dict(data['military']).items()} if data['military'] else {}
+
+    # Добавление данных об образовании в student_dict
+    if data['education_doc']:
+        for key, value in data['education_doc'].items():
+            student_dict[key] = clean_text(value) if value else ''
+
+    # Форматирование birth_date
+    birth_date = student_dict.get('birth_date', '')
+    if birth_date:
+        try:
+            date_obj = datetime.strptime(birth_date, '%d.%m.%Y')
+            birth_date = date_obj.strftime('%d/%m/%Y')
+        except ValueError:
+            try:
+                date_obj = datetime.strptime(birth_date, '%Y-%m-%d')
+                birth_date = date_obj.strftime('%d/%m/%Y')
+            except ValueError:
+                birth_date = student_dict['birth_date']
+
+    student_dict['birth_date'] = birth_date
 
     # Объединяем словари
     context = {**student_dict, **military_dict}
-    # global_logger.debug(f"Контекст перед рендерингом: {context}")
 
-    # Данные для диплома
-    try:
-        if 'adddiplom' in template.lower() and 'group_id' in student_dict and 'id' in student_dict:
-            context['subjects_grades'] = get_subjects_grades(student_dict['id'], student_dict['group_id']) or []
-            context['practice_data'] = get_practice_data(student_dict['id'], student_dict['group_id']) or []
-            context['coursework_data'] = get_coursework_data(student_dict['id'], student_dict['group_id']) or []
-            context['attestation_data'] = get_attestation_data(student_dict['id'], student_dict['group_id']) or []
-            # global_logger.debug(f"Данные для диплома: subjects_grades={context['subjects_grades']}, "
-                        # f"practice_data={context['practice_data']}, "
-                        # f"coursework_data={context['coursework_data']}, "
-                        # f"attestation_data={context['attestation_data']}")
-    except Exception as e:
-        global_logger.error(f"Ошибка при получении данных для диплома для студента ID {student_dict.get('id', 'unknown')}: {e}")
-        raise
-    
-    # -----------------------------
-    # Автоподстановка аккредитации для диплома с отладкой
-    # -----------------------------
-    try:
-        if 'adddiplom' in template.lower():
-            conn = get_db()
-            conn.row_factory = sqlite3.Row
-            acc = conn.execute("""
-                SELECT text_ua, text_en
-                FROM accreditations
-                WHERE degree = ? AND specialty = ?
-                ORDER BY id DESC LIMIT 1
-            """, (
-                student_dict.get('degree_level', ''),
-                student_dict.get('specialty', '')
-            )).fetchone()
-            conn.close()
-
-            if acc:
-                context['accreditation_text'] = acc['text_ua']
-                context['accreditation_text_en'] = acc['text_en']
-                # Вывод для отладки
-                #print("=== Автоподстановка аккредитации ===")
-                #print("UA:", acc['text_ua'])
-                #print("EN:", acc['text_en'])
-                #global_logger.debug(f"Автоподстановка аккредитации: UA='{acc['text_ua']}', EN='{acc['text_en']}'")
-            else:
-                context['accreditation_text'] = ''
-                context['accreditation_text_en'] = ''
-                #print("=== Автоподстановка аккредитации ===")
-                #print("Аккредитация не найдена для ступені и спеціальності:")
-                #print("degree_level:", student_dict.get('degree_level', ''))
-                #print("specialty:", student_dict.get('specialty', ''))
-                #global_logger.debug(f"Аккредитация не найдена: degree_level='{student_dict.get('degree_level', '')}', specialty='{student_dict.get('specialty', '')}'")
-
-    except Exception as e:
-        global_logger.error(f"Ошибка при получении аккредитации для диплома студента ID {student_dict.get('id', 'unknown')}: {e}")
-        context['accreditation_text'] = ''
-        context['accreditation_text_en'] = ''
+    # Данные для диплома: оценки, если шаблон на них ссылается
+    graded_loaded = any(key in data for key, _, _ in GRADED_ITEMS)
+    if graded_loaded and 'group_id' in student_dict and 'id' in student_dict:
+        for key, _, _ in GRADED_ITEMS:
+            if key in data:
+                context[key] = data[key] or []
 
     # Проверка на диплом с отличием с отладочной информацией
     context['diploma_with_honor_text'] = student_dict.get('last_name_UA', '')
     context['diploma_with_honor_text_en'] = student_dict.get('last_name_en', '')
 
-    if 'adddiplom' in template.lower():
+    if graded_loaded:
         global_logger.debug(f"Проверка диплома с отличием для шаблона {template}")
 
         all_grades = []
@@ -484,11 +540,6 @@ def gen_doc(student: dict, military: dict, template='template.docx', out='out.do
                 if 'Відмінно / Excellent' in g.get('grade', '')
             )
 
-            good_count = sum(
-                1 for g in graded
-                if 'Добре / Good' in g.get('grade', '')
-            )
-
             satisfactory_count = sum(
                 1 for g in graded
                 if 'Задовільно / Satisfactory' in g.get('grade', '')
@@ -517,21 +568,11 @@ def gen_doc(student: dict, military: dict, template='template.docx', out='out.do
 
         else:
             global_logger.debug("Нет дифференцированных оценок для анализа")
-    
-    
+
     # -----------------------------
-    # Подтягиваем диплом и додаток для Word
+    # Диплом и додаток для Word
     # -----------------------------
-    conn = get_db()
-    conn.row_factory = sqlite3.Row
-    diploma_row = conn.execute("""
-        SELECT diploma_number, appendix_number
-        FROM diplomas
-        WHERE student_id = ?
-        ORDER BY id DESC LIMIT 1
-    """, (student['id'],)).fetchone()
-    conn.close()
-
+    diploma_row = data.get('diploma')
     if diploma_row:
         # дополняем нулями до 6 цифр
         diploma_number = diploma_row['diploma_number'] or ''
@@ -545,17 +586,31 @@ def gen_doc(student: dict, military: dict, template='template.docx', out='out.do
     else:
         context['diploma_number'] = ''
         context['appendix_number'] = ''
-        
+
+    return context
+
+def render_document(context, template, out):
+    """Рендерит шаблон с готовым контекстом и сохраняет документ в out."""
+    # Проверка существования шаблона
+    if not os.path.exists(template):
+        global_logger.error(f"Шаблон {template} не найден")
+        raise FileNotFoundError(f"Шаблон {template} не найден")
+
+    try:
+        # Разобранный шаблон берётся из кэша; для каждого документа — отдельная копия
+        doc = docx_templates.load(template)
+        global_logger.debug(f"Шаблон {template} успешно загружен")
+    except Exception as e:
+        global_logger.error(f"Ошибка при загрузке шаблона {template}: {str(e)}")
+        raise
+
     try:
         doc.render(context)
         global_logger.debug("Шаблон успешно отрендерен")
     except Exception as e:
-        global_logger.error(f"Ошибка при рендеринге документа для студента ID {student_dict.get('id', 'unknown')}: {e}")
+        global_logger.error(f"Ошибка при рендеринге документа для студента ID {context.get('id', 'unknown')}: {e}")
         raise
 
-    student_name = f"{student_dict.get('last_name_UA', '')} {student_dict.get('first_name_UA', '')}".strip()
-    log_action(user_name, f"згенерував документ '{out}' для студента {student_name}", student_dict.get('group_id'))
-    
     try:
         doc.save(out)
         global_logger.debug(f"Документ сохранён как {out}")
@@ -563,4 +618,68 @@ def gen_doc(student: dict, military: dict, template='template.docx', out='out.do
         global_logger.error(f"Ошибка при сохранении документа {out}: {e}")
         raise
 
-    return out
\ No newline at end of file
+    return out
+
+def render_cached(context, template):
+    """Байты документа для контекста; повтор с тем же шаблоном и данными берётся из document_cache."""
+    if not os.path.exists(template):
+        global_logger.error(f"Шаблон {template} не найден")
+        raise FileNotFoundError(f"Шаблон {template} не найден")
+    key = document_cache.key(docx_templates.cache.get(template).digest, context)
+    document = document_cache.cache.get(key)
+    if document is None:
+        out = io.BytesIO()
+        render_document(context, template, out)
+        document = out.getvalue()
+        document_cache.cache.put(key, document)
+    return document
+
+def prepare_context(student, military, template, data=None):
+    """Контекст шаблона для студента; data — данные из DocumentDataLoader, если уже загружены."""
+    if data is None:
+        data = DocumentDataLoader().load([student['id']], template_sources(template)).get(student['id'], {})
+    # Данные, переданные вызывающим кодом, имеют приоритет над загруженными
+    data = {'education_doc': None, 'diploma': None, **data, 'student': student, 'military': military or {}}
+    try:
+        return build_context(data, template)
+    except Exception as e:
+        global_logger.error(f"Ошибка при подготовке данных для студента ID {student.get('id', 'unknown')}: {e}")
+        raise
+
+DOCX_MIMETYPE = 'application/vnd.openxmlformats-officedocument.wordprocessingml.document'
+
+def document_filename(student):
+    """Имя файла документа студента: Фамилия_Имя.docx."""
+    return f"{student['last_name_UA']}_{student['first_name_UA']}.docx".replace(" ", "_")
+
+def gen_doc(student: dict, military: dict, template='template.docx', out=None, user_name='Система', data=None):
+    """Генерирует документ для студента на основе шаблона.
+
+    out — путь или файловый объект; если не задан, документ рендерится в
+    память и возвращается io.BytesIO, готовый к чтению.
+
+    data — готовые данные студента из DocumentDataLoader (при пакетной
+    генерации); если не переданы, загружаются для одного студента тем же
+    загрузчиком.
+    """
+    global_logger.debug(f"Запуск gen_doc: student_id={student.get('id', 'unknown')}, template={template}, out={out}")
+
+    if not os.path.exists(template):
+        global_logger.error(f"Шаблон {template} не найден")
+        raise FileNotFoundError(f"Шаблон {template} не найден")
+
+    context = prepare_context(student, military, template, data)
+    document = render_cached(context, template)
+    if out is None:
+        out = io.BytesIO(document)
+    elif isinstance(out, str):
+        with open(out, 'wb') as f:
+            f.write(document)
+    else:
+        out.write(document)
+
+    student_name = f"{context.get('last_name_UA', '')} {context.get('first_name_UA', '')}".strip()
+    document_name = out if isinstance(out, str) else document_filename(student)
+    log_action(user_name, f"згенерував документ '{document_name}' для студента {student_name}", student.get('group_id'))
+
+    return out
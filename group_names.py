@@ -0,0 +1,66 @@
+"""Кэш отображаемых названий групп для журнала действий.
+
+Названия вида «КН-21 (2021, Денна, 240 кредитів)» читаются из таблицы groups
+целиком одним запросом и хранятся в памяти. Маршруты, которые добавляют,
+изменяют, удаляют или архивируют группы, вызывают invalidate(). Изменения из
+других процессов (update_groups.py, правка базы вручную) invalidate() не
+вызывают, поэтому прочитанное живёт не дольше ttl секунд.
+"""
+import threading
+import time
+
+DISPLAY_NAME_SQL = "name || ' (' || start_year || ', ' || study_form || ', ' || program_credits || ' кредитів)'"
+
+
+class GroupNameCache:
+    """Названия групп по id; загружаются лениво и сбрасываются invalidate() или по истечении ttl."""
+
+    def __init__(self, ttl=60):
+        self.ttl = ttl
+        self._names = None
+        self._expires = 0.0
+        self._generation = 0
+        self._lock = threading.Lock()
+
+    def invalidate(self):
+        with self._lock:
+            self._names = None
+            self._generation += 1
+
+    def _load(self, conn):
+        rows = conn.execute(f"SELECT id, name, start_year, {DISPLAY_NAME_SQL} AS display_name FROM groups").fetchall()
+        return {
+            row['id']: ((row['name'] or '', row['start_year'] or 0), row['display_name'] or row['name'] or '')
+            for row in rows
+        }
+
+    def display_names(self, conn, group_ids):
+        """Названия групп в порядке (name, start_year); неизвестные id пропускаются."""
+        group_ids = [group_id for group_id in group_ids if group_id is not None]
+        if not group_ids:
+            return []
+        now = time.monotonic()
+        with self._lock:
+            names, generation = self._names, self._generation
+            if self._expires <= now:
+                names = None
+        if names is None:
+            names = self._load(conn)
+            with self._lock:
+                # Если группы изменились во время загрузки, прочитанное не сохраняем
+                if self._generation == generation:
+                    self._names = names
+                    self._expires = now + self.ttl
+        found = sorted(names[int(group_id)] for group_id in set(group_ids) if int(group_id) in names)
+        return [display_name for _, display_name in found]
+
+
+cache = GroupNameCache()
+
+
+def display_names(conn, group_ids):
+    return cache.display_names(conn, group_ids)
+
+
+def invalidate():
+    cache.invalidate()
@@ -0,0 +1,197 @@
+"""Постраничное чтение журнала app.log с конца, без загрузки файла в память.
+
+Файл читается блоками фиксированного размера от конца к началу, затем
+продолжается в ротированных файлах app.log.1, app.log.2, ... Позиция в
+журнале — пара (inode файла, смещение в байтах): она остаётся верной и после
+дописывания новых строк, и после ротации. Для каждого набора фильтров
+хранится индекс смещений начала страниц, поэтому на любую уже известную
+страницу можно перейти сразу, а до новой — досчитать от ближайшей известной.
+"""
+import os
+import re
+import threading
+from collections import OrderedDict
+
+BLOCK_SIZE = 64 * 1024
+MAX_LINE_BYTES = 64 * 1024      # более длинные строки обрезаются
+MAX_INDEXES = 32                # сколько индексов страниц (наборов фильтров) хранить
+
+HEADER_RE = re.compile(r'^(\d{4}-\d{2}-\d{2}) \| (\d{2}:\d{2}:\d{2}) \|\s*([A-Z]+) \| ?(.*)$')
+
+LEVELS = ['DEBUG', 'INFO', 'WARNING', 'ERROR', 'CRITICAL']
+
+
+def log_chain(base_path):
+    """Текущий и ротированные файлы журнала от новых к старым: [(path, inode, size)]."""
+    chain = []
+    index = 0
+    while True:
+        path = base_path if index == 0 else f"{base_path}.{index}"
+        try:
+            stat = os.stat(path)
+        except OSError:
+            if index == 0:
+                index += 1
+                continue
+            break
+        chain.append((path, stat.st_ino, stat.st_size))
+        index += 1
+    return chain
+
+
+def _lines_backwards(path, end):
+    """Строки файла от смещения end к началу: (смещение начала строки, bytes)."""
+    with open(path, 'rb') as f:
+        position = end
+        partial = b''
+        while position > 0:
+            size = min(BLOCK_SIZE, position)
+            position -= size
+            f.seek(position)
+            data = f.read(size) + partial
+            lines = data.split(b'\n')
+            partial = lines[0][-MAX_LINE_BYTES:] if len(lines[0]) > MAX_LINE_BYTES else lines[0]
+            offset = position + len(lines[0]) + 1
+            complete = []
+            for line in lines[1:]:
+                complete.append((offset, line))
+                offset += len(line) + 1
+            for item in reversed(complete):
+                yield item
+        if partial:
+            yield 0, partial
+
+
+def iter_entries(chain, start):
+    """Записи журнала, начиная непосредственно перед позицией start, от новых к старым.
+
+    Запись — строка с датой и уровнем вместе со следующими за ней строками
+    продолжения (например, traceback). Возвращает (позиция, запись).
+    """
+    inode, offset = start
+    files = [i for i, (_, file_inode, _) in enumerate(chain) if file_inode == inode]
+    if not files:
+        return
+    for number in range(files[0], len(chain)):
+        path, file_inode, size = chain[number]
+        end = min(offset, size) if number == files[0] else size
+        continuation = []
+        for line_offset, raw in _lines_backwards(path, end):
+            line = raw.decode('utf-8', errors='replace').rstrip('\r')
+            if not line.strip():
+                continue
+            match = HEADER_RE.match(line)
+            if not match:
+                continuation.append(line)
+                continue
+            date, time, level, message = match.groups()
+            yield (file_inode, line_offset), {
+                'date': date, 'time': time, 'level': level, 'message': message,
+                'details': list(reversed(continuation)),
+            }
+            continuation = []
+        if continuation:
+            yield (file_inode, 0), {
+                'date': '', 'time': '', 'level': '', 'message': continuation[-1],
+                'details': list(reversed(continuation[:-1])),
+            }
+
+
+def make_filter(user=None, level=None, text=None):
+    """Предикат записи по пользователю, уровню и подстроке (без учёта регистра)."""
+    user_marker = f"👤 {user} -" if user else None
+    text = text.lower() if text else None
+
+    def matches(entry):
+        if level and entry['level'] != level:
+            return False
+        if user_marker and user_marker not in entry['message']:
+            return False
+        if text and text not in entry['message'].lower() and not any(text in line.lower() for line in entry['details']):
+            return False
+        return True
+
+    return matches
+
+
+def encode_position(position):
+    return f"{position[0]}:{position[1]}"
+
+
+def decode_position(token):
+    try:
+        inode, offset = token.split(':')
+        return int(inode), int(offset)
+    except (AttributeError, ValueError):
+        return None
+
+
+class LogViewer:
+    """Страницы журнала с индексом смещений начала страниц для каждого набора фильтров."""
+
+    def __init__(self, base_path, per_page=100):
+        self.base_path = base_path
+        self.per_page = per_page
+        self._indexes = OrderedDict()
+        self._lock = threading.Lock()
+
+    def anchor(self):
+        """Позиция конца журнала сейчас — начало первой страницы."""
+        chain = log_chain(self.base_path)
+        if not chain:
+            return None
+        return chain[0][1], chain[0][2]
+
+    def _page_starts(self, key, anchor):
+        with self._lock:
+            starts = self._indexes.get(key)
+            if starts is None:
+                starts = [anchor]
+                self._indexes[key] = starts
+                while len(self._indexes) > MAX_INDEXES:
+                    self._indexes.popitem(last=False)
+            else:
+                self._indexes.move_to_end(key)
+            return starts
+
+    def page(self, page=1, anchor=None, user=None, level=None, text=None):
+        """Возвращает (записи, есть_следующая, номер_страницы, known_pages, anchor)."""
+        anchor = anchor or self.anchor()
+        if anchor is None:
+            return [], False, 1, 1, None
+        chain = log_chain(self.base_path)
+        matches = make_filter(user, level, text)
+        starts = self._page_starts((anchor, user, level, text), anchor)
+        page = max(page, 1)
+
+        # Досчитываем индекс до нужной страницы, если её ещё не открывали
+        while len(starts) < page:
+            taken = 0
+            last = None
+            for position, entry in iter_entries(chain, starts[-1]):
+                if matches(entry):
+                    taken += 1
+                    last = position
+                    if taken == self.per_page:
+                        break
+            if taken < self.per_page or last is None:
+                page = len(starts)
+                break
+            with self._lock:
+                if last not in starts:
+                    starts.append(last)
+
+        entries = []
+        has_next = False
+        for position, entry in iter_entries(chain, starts[page - 1]):
+            if not matches(entry):
+                continue
+            if len(entries) == self.per_page:
+                has_next = True
+                with self._lock:
+                    if len(starts) == page:
+                        starts.append(last_position)
+                break
+            entries.append(entry)
+            last_position = position
+        return entries, has_next, page, len(starts), anchor
@@ -0,0 +1,367 @@
+"""Версионированные миграции схемы students.db.
+
+Номер применённой миграции хранится в PRAGMA user_version. migrate() применяет
+по порядку все миграции с большим номером, поэтому им можно обновлять как
+новую пустую базу, так и существующие рабочие базы на месте.
+
+Запуск как скрипта обновляет базу из config.DB_PATH (или --db), предварительно
+сохранив резервную копию.
+"""
+import argparse
+import logging
+import sqlite3
+
+import audit
+import birth_dates
+import completeness
+import export_jobs
+import search_index
+import sort_keys
+
+logger = logging.getLogger('Students')
+
+# Исходная схема, которая раньше создавалась только init_db.py
+BASELINE_SCHEMA = """
+CREATE TABLE IF NOT EXISTS "activity_grades" (
+	"id"	INTEGER,
+	"student_id"	INTEGER NOT NULL,
+	"entity_id"	INTEGER NOT NULL,
+	"entity_type"	TEXT NOT NULL CHECK("entity_type" IN ('practice', 'coursework', 'attestation')),
+	"grade"	INTEGER,
+	"name"	TEXT,
+	PRIMARY KEY("id" AUTOINCREMENT),
+	FOREIGN KEY("student_id") REFERENCES "students"("id") ON DELETE CASCADE ON UPDATE CASCADE
+);
+CREATE TABLE IF NOT EXISTS "attestations" (
+	"id"	INTEGER,
+	"code"	TEXT NOT NULL,
+	"name"	TEXT NOT NULL,
+	"credits"	INTEGER NOT NULL,
+	"type"	TEXT NOT NULL CHECK("type" IN ('Залік', 'Екзамен')),
+	"position"	INTEGER NOT NULL,
+	"group_id"	INTEGER NOT NULL,
+	PRIMARY KEY("id" AUTOINCREMENT),
+	FOREIGN KEY("group_id") REFERENCES "groups"("id")
+);
+CREATE TABLE IF NOT EXISTS "courseworks" (
+	"id"	INTEGER,
+	"code"	TEXT NOT NULL,
+	"name"	TEXT NOT NULL,
+	"credits"	INTEGER NOT NULL,
+	"type"	TEXT NOT NULL CHECK("type" IN ('Залік', 'Екзамен')),
+	"position"	INTEGER NOT NULL,
+	"group_id"	INTEGER NOT NULL,
+	PRIMARY KEY("id" AUTOINCREMENT),
+	FOREIGN KEY("group_id") REFERENCES "groups"("id")
+);
+CREATE TABLE IF NOT EXISTS "education_documents" (
+	"id"	INTEGER,
+	"student_id"	INTEGER NOT NULL,
+	"document_type"	TEXT NOT NULL,
+	"document_type_en"	TEXT NOT NULL,
+	"document_number"	TEXT NOT NULL,
+	"institution_name"	TEXT NOT NULL,
+	"institution_name_en"	TEXT NOT NULL,
+	"country"	TEXT NOT NULL,
+	"country_en"	TEXT NOT NULL,
+	"completion_date"	TEXT NOT NULL,
+	PRIMARY KEY("id" AUTOINCREMENT),
+	FOREIGN KEY("student_id") REFERENCES "students"("id")
+);
+CREATE TABLE IF NOT EXISTS "foreign_education_docs" (
+	"id"	INTEGER,
+	"education_doc_id"	INTEGER NOT NULL,
+	"reference_number"	TEXT,
+	"reference_institution"	TEXT,
+	"reference_institution_en"	TEXT,
+	"reference_country"	TEXT,
+	"reference_country_en"	TEXT,
+	"reference_issue_date"	TEXT,
+	"recognition_certificate_number"	TEXT,
+	"recognition_issuer"	TEXT,
+	"recognition_issuer_en"	TEXT,
+	"recognition_date"	TEXT,
+	PRIMARY KEY("id" AUTOINCREMENT),
+	FOREIGN KEY("education_doc_id") REFERENCES "education_documents"("id")
+);
+CREATE TABLE IF NOT EXISTS "grades" (
+	"id"	INTEGER,
+	"student_id"	INTEGER,
+	"subject_id"	INTEGER,
+	"grade"	TEXT,
+	PRIMARY KEY("id" AUTOINCREMENT),
+	FOREIGN KEY("subject_id") REFERENCES "subjects"("id"),
+	FOREIGN KEY("student_id") REFERENCES "students"("id")
+);
+CREATE TABLE IF NOT EXISTS "groups" (
+	"id"	INTEGER,
+	"name"	TEXT NOT NULL,
+	"start_year"	INTEGER NOT NULL,
+	"study_form"	TEXT NOT NULL CHECK("study_form" IN ('Денна', 'Заочна')),
+	"program_credits"	INTEGER NOT NULL,
+	"degree_level"	TEXT NOT NULL,
+	"degree_level_en"	TEXT NOT NULL,
+	"knowledge_area"	TEXT NOT NULL,
+	"knowledge_area_en"	TEXT NOT NULL,
+	"specialty"	TEXT NOT NULL,
+	"specialty_en"	TEXT NOT NULL,
+	"educational_program"	TEXT NOT NULL,
+	"educational_program_en"	TEXT NOT NULL,
+	"qualification_name"	TEXT NOT NULL,
+	"qualification_name_en"	TEXT NOT NULL,
+	"archived"	BOOLEAN DEFAULT FALSE,
+	PRIMARY KEY("id" AUTOINCREMENT),
+	UNIQUE("name","start_year")
+);
+CREATE TABLE IF NOT EXISTS "military" (
+	"id"	INTEGER,
+	"student_id"	INTEGER,
+	"registration_number_of_the_DRPVR"	TEXT,
+	"military_registration_document"	TEXT,
+	"issued_VOD"	TEXT,
+	"military_accounting_specialty_number"	TEXT,
+	"military_rank"	TEXT,
+	"change_credentials"	TEXT,
+	"reason_for_changing_credentials"	TEXT,
+	"being_on_military_registration"	TEXT,
+	"address_of_residence"	TEXT,
+	PRIMARY KEY("id" AUTOINCREMENT),
+	FOREIGN KEY("student_id") REFERENCES "students"("id")
+);
+CREATE TABLE IF NOT EXISTS "practices" (
+	"id"	INTEGER,
+	"code"	TEXT NOT NULL,
+	"name"	TEXT NOT NULL,
+	"credits"	INTEGER NOT NULL,
+	"type"	TEXT NOT NULL CHECK("type" IN ('Залік', 'Екзамен')),
+	"position"	INTEGER NOT NULL,
+	"group_id"	INTEGER NOT NULL,
+	PRIMARY KEY("id" AUTOINCREMENT),
+	FOREIGN KEY("group_id") REFERENCES "groups"("id")
+);
+CREATE TABLE IF NOT EXISTS "students" (
+	"id"	INTEGER,
+	"last_name_UA"	TEXT,
+	"first_name_UA"	TEXT,
+	"middle_name_UA"	TEXT,
+	"last_name_ENG"	TEXT,
+	"first_name_ENG"	TEXT,
+	"birth_date"	TEXT,
+	"group_id"	INTEGER,
+	"edebo_code"	VARCHAR(50),
+	"archived"	BOOLEAN DEFAULT FALSE,
+	PRIMARY KEY("id" AUTOINCREMENT),
+	FOREIGN KEY("group_id") REFERENCES "groups"("id")
+);
+CREATE TABLE IF NOT EXISTS "subjects" (
+	"id"	INTEGER,
+	"code"	TEXT,
+	"name"	TEXT NOT NULL,
+	"credits"	INTEGER,
+	"group_id"	INTEGER,
+	"position"	INTEGER DEFAULT 0,
+	"type"	TEXT DEFAULT 'Залік' CHECK("type" IN ('Залік', 'Екзамен')),
+	PRIMARY KEY("id" AUTOINCREMENT),
+	FOREIGN KEY("group_id") REFERENCES "groups"("id")
+);
+CREATE TABLE IF NOT EXISTS "user_groups" (
+	"user_id"	INTEGER,
+	"group_id"	INTEGER,
+	PRIMARY KEY("user_id","group_id"),
+	FOREIGN KEY("group_id") REFERENCES "groups"("id") ON DELETE CASCADE,
+	FOREIGN KEY("user_id") REFERENCES "users"("id") ON DELETE CASCADE
+);
+CREATE TABLE IF NOT EXISTS "users" (
+	"id"	INTEGER,
+	"username"	TEXT UNIQUE,
+	"password_hash"	TEXT,
+	"role"	TEXT NOT NULL CHECK("role" IN ('admin', 'user')),
+	"is_admin"	INTEGER DEFAULT 0,
+	"permissions"	TEXT DEFAULT '[]',
+	PRIMARY KEY("id" AUTOINCREMENT)
+);
+CREATE TABLE IF NOT EXISTS accreditations (
+    id INTEGER PRIMARY KEY AUTOINCREMENT,
+    degree TEXT NOT NULL,          
+    specialty TEXT NOT NULL,       
+    text_ua TEXT,
+    text_en TEXT
+);
+CREATE TABLE IF NOT EXISTS diplomas (
+    id INTEGER PRIMARY KEY AUTOINCREMENT,
+    student_id INTEGER NOT NULL,
+    diploma_number TEXT,
+    appendix_number TEXT,
+    FOREIGN KEY (student_id) REFERENCES students(id)
+);
+"""
+
+# Колонки, которые маршруты уже читают и пишут, но исходная схема не создавала
+MISSING_COLUMNS = {
+    'groups': [
+        ('course', 'INTEGER DEFAULT 1'),
+        ('institution_name_and_status', 'TEXT'),
+        ('institution_name_and_status_en', 'TEXT'),
+        ('entry_requirements', 'TEXT'),
+        ('entry_requirements_en', 'TEXT'),
+        ('learning_outcomes', 'TEXT'),
+        ('learning_outcomes_en', 'TEXT'),
+        ('program_includes', 'TEXT'),
+        ('program_includes_en', 'TEXT'),
+    ],
+}
+
+# Индексы под соединения и фильтры в routes/ и gen_docx.py
+HOT_PATH_INDEXES = """
+CREATE INDEX IF NOT EXISTS idx_students_group_archived ON students (group_id, archived);
+CREATE INDEX IF NOT EXISTS idx_grades_student_subject ON grades (student_id, subject_id);
+CREATE INDEX IF NOT EXISTS idx_grades_subject ON grades (subject_id);
+CREATE INDEX IF NOT EXISTS idx_activity_grades_student_entity ON activity_grades (student_id, entity_type, entity_id);
+CREATE INDEX IF NOT EXISTS idx_activity_grades_entity ON activity_grades (entity_id, entity_type);
+CREATE INDEX IF NOT EXISTS idx_military_student ON military (student_id);
+CREATE INDEX IF NOT EXISTS idx_subjects_group_position ON subjects (group_id, position);
+CREATE INDEX IF NOT EXISTS idx_practices_group_position ON practices (group_id, position);
+CREATE INDEX IF NOT EXISTS idx_courseworks_group_position ON courseworks (group_id, position);
+CREATE INDEX IF NOT EXISTS idx_attestations_group_position ON attestations (group_id, position);
+CREATE INDEX IF NOT EXISTS idx_diplomas_student ON diplomas (student_id);
+CREATE INDEX IF NOT EXISTS idx_education_documents_student ON education_documents (student_id);
+CREATE INDEX IF NOT EXISTS idx_foreign_education_docs_document ON foreign_education_docs (education_doc_id);
+CREATE INDEX IF NOT EXISTS idx_user_groups_group ON user_groups (group_id);
+"""
+
+
+# Уникальные ключи таблиц оценок и дипломов: (таблица, колонки ключа,
+# выражение «запись заполнена», старый неуникальный индекс, новый индекс)
+UNIQUE_KEYS = [
+    ('grades', 'student_id, subject_id', "grade IS NOT NULL AND TRIM(grade) != ''",
+     'idx_grades_student_subject', 'ux_grades_student_subject'),
+    ('activity_grades', 'student_id, entity_type, entity_id', "grade IS NOT NULL",
+     'idx_activity_grades_student_entity', 'ux_activity_grades_student_entity'),
+    ('diplomas', 'student_id', "diploma_number IS NOT NULL AND TRIM(diploma_number) != ''",
+     'idx_diplomas_student', 'ux_diplomas_student'),
+]
+
+
+def _baseline(conn):
+    conn.executescript(BASELINE_SCHEMA)
+
+
+def _missing_columns(conn):
+    for table, columns in MISSING_COLUMNS.items():
+        existing = {row[1] for row in conn.execute(f"PRAGMA table_info({table})")}
+        for column, definition in columns:
+            if column not in existing:
+                conn.execute(f"ALTER TABLE {table} ADD COLUMN {column} {definition}")
+
+
+def _hot_path_indexes(conn):
+    conn.executescript(HOT_PATH_INDEXES)
+    conn.execute("ANALYZE")
+
+
+def _derived_structures(conn):
+    completeness.install(conn)
+    search_index.install(conn)
+    sort_keys.install(conn)
+    birth_dates.install(conn)
+
+
+def _unique_grades(conn):
+    """Удаляет дубликаты (оставляя заполненную и самую новую запись) и создаёт UNIQUE-индексы."""
+    # Триггеры заполненности прежней версии использовали INSERT OR REPLACE,
+    # который не срабатывает внутри UPSERT-запросов
+    completeness.drop_triggers(conn)
+    completeness.install(conn)
+    for table, key, filled, old_index, new_index in UNIQUE_KEYS:
+        removed = conn.execute(f"""
+            DELETE FROM {table}
+            WHERE id IN (
+                SELECT id FROM (
+                    SELECT id, ROW_NUMBER() OVER (
+                        PARTITION BY {key}
+                        ORDER BY ({filled}) DESC, id DESC
+                    ) AS position
+                    FROM {table}
+                )
+                WHERE position > 1
+            )
+        """).rowcount
+        if removed:
+            logger.info(f"Міграція: видалено {removed} дублікатів з {table}")
+        conn.execute(f"DROP INDEX IF EXISTS {old_index}")
+        conn.execute(f"CREATE UNIQUE INDEX IF NOT EXISTS {new_index} ON {table} ({key})")
+
+
+def _sort_keys_without_triggers(conn):
+    """Ключи сортировки ФИО пишутся приложением: триггеры с ukrainian_sort_key мешали записи вне приложения."""
+    sort_keys.drop_triggers(conn)
+    sort_keys.rebuild(conn)
+
+
+# (версия, описание, функция); новые миграции добавляются только в конец
+MIGRATIONS = [
+    (1, 'базова схема', _baseline),
+    (2, 'відсутні колонки груп', _missing_columns),
+    (3, 'індекси гарячих запитів', _hot_path_indexes),
+    (4, 'заповненість, пошук FTS5, ключі сортування, ISO-дата народження', _derived_structures),
+    (5, 'унікальні оцінки та дипломи', _unique_grades),
+    (6, 'журнал дій audit_log', audit.install),
+    (7, 'черга завдань масової генерації export_jobs', export_jobs.install),
+    (8, 'ключі сортування без SQL-функцій у тригерах', _sort_keys_without_triggers),
+]
+
+LATEST_VERSION = MIGRATIONS[-1][0]
+
+
+def current_version(conn):
+    return conn.execute("PRAGMA user_version").fetchone()[0]
+
+
+def migrate(conn, backup_path=None):
+    """Применяет недостающие миграции; возвращает список применённых версий.
+
+    Если указан backup_path и база не пуста, перед изменениями делается её копия.
+    """
+    version = current_version(conn)
+    pending = [migration for migration in MIGRATIONS if migration[0] > version]
+    if not pending:
+        return []
+
+    has_tables = conn.execute("SELECT 1 FROM sqlite_master WHERE type = 'table' LIMIT 1").fetchone()
+    if backup_path and has_tables:
+        target = sqlite3.connect(backup_path)
+        conn.backup(target)
+        target.close()
+        logger.info(f"Резервна копія бази перед міграцією: {backup_path}")
+
+    applied = []
+    for number, description, step in pending:
+        step(conn)
+        conn.execute(f"PRAGMA user_version = {number}")
+        conn.commit()
+        applied.append(number)
+        logger.info(f"Застосовано міграцію {number}: {description}")
+    return applied
+
+
+if __name__ == '__main__':
+    from config import DB_PATH
+    from db import connect
+
+    parser = argparse.ArgumentParser(description='Оновлення схеми students.db до останньої версії.')
+    parser.add_argument('--db', default=DB_PATH, help='шлях до бази (за замовчуванням config.DB_PATH)')
+    parser.add_argument('--no-backup', action='store_true', help='не робити резервну копію перед міграцією')
+    args = parser.parse_args()
+
+    conn = connect(args.db)
+    before = current_version(conn)
+    backup_path = None if args.no_backup else f"{args.db}.v{before}.bak"
+    applied = migrate(conn, backup_path=backup_path)
+    conn.dispose()
+
+    if applied:
+        print(f"Схему оновлено з версії {before} до {applied[-1]}: {', '.join(map(str, applied))}")
+        if backup_path:
+            print(f"Резервна копія: {backup_path}")
+    else:
+        print(f"Схема вже актуальна (версія {before})")
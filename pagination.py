@@ -0,0 +1,69 @@
+"""Курсорная (keyset) пагинация и кэш количества записей для списков."""
+import base64
+import json
+import threading
+import time
+
+
+def encode_cursor(sort_by, sort_order, key, row_id):
+    """Упаковывает позицию в списке (значение сортировки + id) в непрозрачный токен."""
+    payload = json.dumps([sort_by, sort_order, key, row_id], ensure_ascii=False, separators=(',', ':'))
+    return base64.urlsafe_b64encode(payload.encode('utf-8')).decode('ascii').rstrip('=')
+
+
+def decode_cursor(token, sort_by, sort_order):
+    """Распаковывает токен курсора.
+
+    Возвращает (key, row_id) или None, если токен повреждён или был выдан
+    для другой сортировки.
+    """
+    if not token:
+        return None
+    try:
+        padded = token + '=' * (-len(token) % 4)
+        token_sort_by, token_sort_order, key, row_id = json.loads(base64.urlsafe_b64decode(padded).decode('utf-8'))
+    except (ValueError, TypeError):
+        return None
+    if token_sort_by != sort_by or token_sort_order != sort_order:
+        return None
+    # bool — подкласс int, но в курсоре означает подделанный токен
+    if not isinstance(row_id, int) or isinstance(row_id, bool):
+        return None
+    # Ключ подставляется параметром в условие keyset — допустимы только скалярные значения SQLite
+    if key is not None and (not isinstance(key, (str, int, float)) or isinstance(key, bool)):
+        return None
+    return key, row_id
+
+
+class CountCache:
+    """Кэш результатов COUNT(*) с ограниченным временем жизни и размером."""
+
+    def __init__(self, ttl=30, max_entries=256):
+        self.ttl = ttl
+        self.max_entries = max_entries
+        self._entries = {}
+        self._lock = threading.Lock()
+
+    def get_or_count(self, conn, query, params):
+        """Возвращает кэшированное количество или выполняет запрос."""
+        cache_key = (query, tuple(params))
+        now = time.monotonic()
+        with self._lock:
+            entry = self._entries.get(cache_key)
+            if entry and entry[0] > now:
+                return entry[1]
+
+        total = conn.execute(query, params).fetchone()[0]
+
+        with self._lock:
+            if len(self._entries) >= self.max_entries:
+                # Удаляем устаревшие записи, а если их нет — самую старую
+                expired = [k for k, (expires, _) in self._entries.items() if expires <= now]
+                for k in expired or [min(self._entries, key=lambda k: self._entries[k][0])]:
+                    del self._entries[k]
+            self._entries[cache_key] = (now + self.ttl, total)
+        return total
+
+    def clear(self):
+        with self._lock:
+            self._entries.clear()
@@ -0,0 +1,72 @@
+"""Кэш прав пользователей для permission_required.
+
+Права (role, is_admin, permissions) читаются из таблицы users один раз и
+хранятся в памяти процесса по user_id. У каждого пользователя есть номер
+версии; маршруты управления пользователями увеличивают его через bump(),
+после чего запись считается устаревшей и перечитывается при следующем
+запросе. Так отзыв прав действует сразу, а обычный запрос не обращается
+к базе.
+"""
+import json
+import threading
+from collections import namedtuple
+
+UserPermissions = namedtuple('UserPermissions', ['role', 'is_admin', 'permissions', 'version'])
+
+
+class PermissionCache:
+    def __init__(self):
+        self._entries = {}
+        self._versions = {}
+        self._lock = threading.Lock()
+
+    def bump(self, user_id):
+        """Помечает права пользователя изменёнными."""
+        user_id = int(user_id)
+        with self._lock:
+            self._versions[user_id] = self._versions.get(user_id, 0) + 1
+            self._entries.pop(user_id, None)
+
+    def get(self, conn_factory, user_id):
+        """Права пользователя или None, если его нет в базе.
+
+        conn_factory вызывается только при промахе кэша.
+        """
+        user_id = int(user_id)
+        with self._lock:
+            version = self._versions.get(user_id, 0)
+            entry = self._entries.get(user_id)
+            if user_id in self._entries and (entry is None or entry.version == version):
+                return entry
+        entry = self._load(conn_factory, user_id, version)
+        with self._lock:
+            # Права изменились во время чтения — сохранять прочитанное нельзя
+            if self._versions.get(user_id, 0) == version:
+                self._entries[user_id] = entry
+        return entry
+
+    def _load(self, conn_factory, user_id, version):
+        conn = conn_factory()
+        try:
+            user = conn.execute("""
+                SELECT role, is_admin, permissions
+                FROM users
+                WHERE id = ?
+            """, (user_id,)).fetchone()
+        finally:
+            conn.close()
+        if not user:
+            return None
+        return UserPermissions(
+            role=user['role'],
+            is_admin=bool(user['is_admin']) or (user['role'] == 'admin'),
+            permissions=json.loads(user['permissions'] or '[]'),
+            version=version,
+        )
+
+
+cache = PermissionCache()
+
+
+def bump(user_id):
+    cache.bump(user_id)
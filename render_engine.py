@@ -0,0 +1,164 @@
+"""Параллельный рендеринг документов DOCX в пуле процессов.
+
+Рендеринг docxtpl занимает процессор и держит GIL, поэтому документы группы
+распределяются по процессам. Воркеры получают готовые контексты (данные
+загружены заранее, gen_docx.DocumentDataLoader) и держат разобранные шаблоны
+в своём кэше docx_templates; шаблон прогревается при запуске воркера.
+Воркеры запускаются через forkserver, а не fork: приложение многопоточное
+(waitress, audit, export_jobs), и fork в момент, когда другой поток держит
+блокировку кэша или соединение SQLite, оставил бы воркер с блокировкой,
+которую никто не освободит. Результаты возвращаются в порядке заданий,
+ошибка одного документа не прерывает остальные. Журнал воркеры передают
+через очередь процессу приложения, который один пишет app.log. Документы с неизменными
+данными берутся из document_cache и в пул не отправляются.
+"""
+import io
+import multiprocessing
+import os
+import threading
+from collections import namedtuple
+from concurrent.futures import ProcessPoolExecutor
+from concurrent.futures.process import BrokenProcessPool
+
+import document_cache
+import docx_templates
+from config import RENDER_WORKERS
+from gen_docx import render_document
+from utils import logger, log_queue_listener, log_to_queue
+
+RenderResult = namedtuple('RenderResult', ['name', 'data', 'error'])
+
+
+def _init_worker(templates, log_queue):
+    """Инициализация воркера: журнал через очередь процесса приложения, заранее разобранные шаблоны."""
+    log_to_queue(log_queue)
+    for template in templates:
+        try:
+            docx_templates.cache.get(template)
+        except OSError as e:
+            logger.error(f"Не вдалося завантажити шаблон {template} у воркері: {e}")
+
+
+def _mp_context():
+    """Контекст запуска воркеров: forkserver, где он есть, иначе spawn."""
+    if 'forkserver' not in multiprocessing.get_all_start_methods():
+        return multiprocessing.get_context('spawn')
+    context = multiprocessing.get_context('forkserver')
+    # Сервер заранее импортирует модули рендеринга, но не __main__ (app.py с миграциями)
+    context.set_forkserver_preload(['render_engine'])
+    return context
+
+
+def render_to_bytes(template, context):
+    """Рендерит один документ в память и возвращает байты DOCX."""
+    out = io.BytesIO()
+    render_document(context, template, out)
+    return out.getvalue()
+
+
+class RenderEngine:
+    """Пул процессов для рендеринга; создаётся лениво и переиспользуется между запросами."""
+
+    def __init__(self, workers=RENDER_WORKERS):
+        self.workers = workers
+        self._executor = None
+        self._pid = None
+        self._lock = threading.Lock()
+        # Записи журнала воркеров: app.log открыт только в процессе приложения
+        self._log_queue = None
+        self._log_listener = None
+
+    def _get_executor(self, template):
+        with self._lock:
+            if self._executor is not None and self._pid == os.getpid():
+                return self._executor
+            context = _mp_context()
+            if self._log_listener is None or self._pid != os.getpid():
+                self._log_queue = context.Queue()
+                self._log_listener = log_queue_listener(self._log_queue)
+            self._executor = ProcessPoolExecutor(
+                max_workers=self.workers, mp_context=context, initializer=_init_worker,
+                initargs=([template], self._log_queue)
+            )
+            self._pid = os.getpid()
+            return self._executor
+
+    def _reset(self):
+        with self._lock:
+            executor, self._executor = self._executor, None
+        if executor is not None:
+            executor.shutdown(wait=False, cancel_futures=True)
+
+    def shutdown(self):
+        self._reset()
+        with self._lock:
+            listener, self._log_listener = self._log_listener, None
+        if listener is not None and self._pid == os.getpid():
+            listener.stop()
+
+    def render_many(self, template, jobs):
+        """Рендерит jobs — список (имя, контекст) — и возвращает RenderResult в том же порядке.
+
+        Документы, уже лежащие в document_cache, не рендерятся; в пул уходят
+        только промахи, их результаты добавляются в кэш.
+        """
+        jobs = list(jobs)
+        try:
+            template_digest = docx_templates.cache.get(template).digest
+        except OSError:
+            # Шаблон недоступен — ошибку сообщит рендеринг каждого документа
+            template_digest = None
+        keys = [document_cache.key(template_digest, context) if template_digest else None for _, context in jobs]
+        results = [None] * len(jobs)
+        pending = []
+        for index, ((name, _), key) in enumerate(zip(jobs, keys)):
+            document = document_cache.cache.get(key) if key else None
+            if document is None:
+                pending.append(index)
+            else:
+                results[index] = RenderResult(name, document, None)
+
+        rendered = self._render_uncached(template, [jobs[index] for index in pending])
+        for index, result in zip(pending, rendered):
+            if result.error is None and keys[index]:
+                document_cache.cache.put(keys[index], result.data)
+            results[index] = result
+        return results
+
+    def _render_uncached(self, template, jobs):
+        if self.workers <= 1 or len(jobs) <= 1:
+            return [self._render_one(template, name, context) for name, context in jobs]
+
+        executor = self._get_executor(template)
+        try:
+            futures = [(name, executor.submit(render_to_bytes, template, context)) for name, context in jobs]
+        except BrokenProcessPool:
+            self._reset()
+            executor = self._get_executor(template)
+            futures = [(name, executor.submit(render_to_bytes, template, context)) for name, context in jobs]
+
+        results = []
+        broken = False
+        for name, future in futures:
+            try:
+                results.append(RenderResult(name, future.result(), None))
+            except BrokenProcessPool as e:
+                broken = True
+                results.append(RenderResult(name, None, f"процес рендерингу завершився аварійно: {e}"))
+            except Exception as e:
+                logger.error(f"Помилка при генерації документа {name}: {e}")
+                results.append(RenderResult(name, None, str(e)))
+        if broken:
+            # Следующий вызов создаст новый пул
+            self._reset()
+        return results
+
+    def _render_one(self, template, name, context):
+        try:
+            return RenderResult(name, render_to_bytes(template, context), None)
+        except Exception as e:
+            logger.error(f"Помилка при генерації документа {name}: {e}")
+            return RenderResult(name, None, str(e))
+
+
+engine = RenderEngine()
@@ -1,18 +1,27 @@
-from flask import Blueprint, render_template, request, redirect, url_for, session, flash, send_file
+from flask import Blueprint, render_template, request, redirect, url_for, session, flash, send_file, jsonify, abort, Response, stream_with_context
 from datetime import datetime
+from urllib.parse import quote
 from zipfile import ZipFile
 import os
 import sqlite3
 from werkzeug.security import generate_password_hash
 from db import get_db
-from utils import log_action, permission_required
+from config import LOG_PAGE_SIZE
+from utils import log_action, permission_required, log_file_path
 from gen_docx import gen_doc
+import export_jobs
+import audit
+from birth_dates import year_start
+import sql_profiler
+import log_reader
+import group_names
+import permissions
+import access
 import logging
 import openpyxl
 from werkzeug.utils import secure_filename
 import pandas as pd
 import json
-import locale
 import uuid
 import re
 from openpyxl import load_workbook
@@ -22,6 +31,8 @@ from deep_translator import GoogleTranslator
 translator = GoogleTranslator(source="auto", target="en")
 translation_cache = {}
 
+log_viewer = log_reader.LogViewer(log_file_path, per_page=LOG_PAGE_SIZE)
+
 admin_bp = Blueprint('admin', __name__)
 
 # Список дозволів (на основі ваших роутів)
@@ -39,7 +50,8 @@ PERMISSIONS = [
     'manage_students',              # Управління студентами
     'manage_accreditations',        # Управління акредетаціями
     'manage_diplomas',              # Управління номерами диплома і додатку
-    'import_education_docs'         # Управління імпортом документів
+    'import_education_docs',        # Управління імпортом документів
+    'view_completeness'             # Заповненість даних по групах
     
     # Додайте інші, якщо є
     ]
@@ -61,6 +73,7 @@ def manage_diplomas():
         """, (group_id,))
         students = cursor.fetchall()
 
+        rows = []
         for student in students:
             student_id = student['id']
 
@@ -71,21 +84,14 @@ def manage_diplomas():
             if diploma_number:
                 diploma_number = diploma_number.zfill(6)
 
-            # проверяем, есть ли запись
-            cursor.execute("SELECT id FROM diplomas WHERE student_id=?", (student_id,))
-            exists = cursor.fetchone()
-            if exists:
-                cursor.execute("""
-                    UPDATE diplomas
-                    SET diploma_number=?, appendix_number=?
-                    WHERE student_id=?
-                """, (diploma_number, appendix_number, student_id))
-            else:
-                cursor.execute("""
-                    INSERT INTO diplomas(student_id, diploma_number, appendix_number)
-                    VALUES (?, ?, ?)
-                """, (student_id, diploma_number, appendix_number))
+            rows.append((student_id, diploma_number, appendix_number))
 
+        cursor.executemany("""
+            INSERT INTO diplomas(student_id, diploma_number, appendix_number)
+            VALUES (?, ?, ?)
+            ON CONFLICT (student_id) DO UPDATE
+            SET diploma_number = excluded.diploma_number, appendix_number = excluded.appendix_number
+        """, rows)
         conn.commit()
         flash("Дані збережено")
         return redirect(url_for('admin.manage_diplomas', group_id=group_id))
@@ -106,25 +112,10 @@ def manage_diplomas():
             FROM students s
             LEFT JOIN diplomas d ON s.id = d.student_id
             WHERE s.group_id = ?
+            ORDER BY s.full_name_sort_key, s.id
         """, (selected_group,))
         students = cursor.fetchall()
 
-        # Украинская сортировка
-        try:
-            locale.setlocale(locale.LC_COLLATE, 'uk_UA.UTF-8')
-        except locale.Error:
-            try:
-                locale.setlocale(locale.LC_COLLATE, 'Ukrainian_Ukraine.1251')
-            except locale.Error:
-                pass
-
-        students = sorted(
-            students,
-            key=lambda s: locale.strxfrm(
-                f"{s['last_name_UA']} {s['first_name_UA']} {s['middle_name_UA']}"
-            )
-        )
-
     return render_template(
         "manage_diplomas.html",
         groups=groups,
@@ -215,7 +206,7 @@ def manage_education_documents():
         SELECT id, last_name_UA, first_name_UA 
         FROM students 
         WHERE archived = FALSE 
-        ORDER BY last_name_UA, first_name_UA
+        ORDER BY full_name_sort_key, id
     """)
     students = cursor.fetchall()
 
@@ -242,7 +233,7 @@ def manage_education_documents():
               AND s.id NOT IN (
                   SELECT student_id FROM education_documents
               )
-            ORDER BY s.last_name_UA, s.first_name_UA
+            ORDER BY s.full_name_sort_key, s.id
         """, (selected_group_id,))
         students_without_docs = cursor.fetchall()
 
@@ -279,7 +270,7 @@ def manage_education_documents():
         LEFT  JOIN foreign_education_docs fed ON ed.id = fed.education_doc_id
         WHERE s.archived = FALSE
           AND g.archived = FALSE
-        ORDER BY g.name, s.last_name_UA, s.first_name_UA, ed.id
+        ORDER BY g.name, s.full_name_sort_key, ed.id
     """)
     rows = cursor.fetchall()
 
@@ -622,6 +613,7 @@ def manage_groups():
                             learning_outcomes, learning_outcomes_en, program_includes, program_includes_en
                         ))
                         conn.commit()
+                        group_names.invalidate()
                         flash("Групу додано успішно.", "success")
                         log_action(
                             session.get('username', 'невідомо'),
@@ -703,6 +695,7 @@ def manage_groups():
                             group_id
                         ))
                         conn.commit()
+                        group_names.invalidate()
                         flash("Групу відредаговано успішно.", "success")
                         log_action(
                             session.get('username', 'невідомо'),
@@ -731,6 +724,7 @@ def manage_groups():
             else:
                 conn.execute("DELETE FROM groups WHERE id = ?", (group_id,))
                 conn.commit()
+                group_names.invalidate()
                 flash("Групу видалено успішно.", "success")
                 log_action(
                     session.get('username', 'невідомо'),
@@ -782,18 +776,8 @@ def manage_subjects():
         cursor.execute('SELECT * FROM subjects WHERE group_id = ? ORDER BY position', (selected_group_id,))
         subjects = cursor.fetchall()
         if selected_subject_id:
-            cursor.execute('SELECT * FROM students WHERE group_id = ?', (selected_group_id,))
+            cursor.execute('SELECT * FROM students WHERE group_id = ? ORDER BY full_name_sort_key, id', (selected_group_id,))
             students = cursor.fetchall()
-
-            import locale
-            locale.setlocale(locale.LC_COLLATE, 'uk_UA.UTF-8')
-
-            students = sorted(
-                students,
-                key=lambda s: locale.strxfrm(
-                    f"{s['last_name_UA']} {s['first_name_UA']} {s['middle_name_UA']}"
-                )
-            )
             cursor.execute('SELECT id, student_id, subject_id, grade FROM grades WHERE subject_id = ?', (selected_subject_id,))
             grades = cursor.fetchall()
     
@@ -929,6 +913,8 @@ def manage_subjects():
                 subject_id = request.form['subject_id']
                 cursor.execute('SELECT id FROM students WHERE group_id = ?', (group_id,))
                 student_ids = [row['id'] for row in cursor.fetchall()]
+                upserts = []
+                deletes = []
                 for student_id in student_ids:
                     grade_key = f'grade_{student_id}'
                     grade_id_key = f'grade_id_{student_id}'
@@ -941,22 +927,18 @@ def manage_subjects():
                             if not (0 <= grade <= 100):
                                 flash(f'Оценка для студента {student_id} должна быть от 0 до 100', 'error')
                                 continue
-                            if grade_id:
-                                cursor.execute(
-                                    'UPDATE grades SET grade = ? WHERE id = ? AND student_id = ? AND subject_id = ?',
-                                    (grade, grade_id, student_id, subject_id)
-                                )
-                            else:
-                                cursor.execute(
-                                    'INSERT INTO grades (student_id, subject_id, grade) VALUES (?, ?, ?)',
-                                    (student_id, subject_id, grade)
-                                )
+                            upserts.append((student_id, subject_id, grade))
                         except ValueError:
                             flash(f'Некорректная оценка для студента {student_id}', 'error')
                             continue
                     else:
                         if grade_id:
-                            cursor.execute('DELETE FROM grades WHERE id = ? AND student_id = ? AND subject_id = ?', (grade_id, student_id, subject_id))
+                            deletes.append((student_id, subject_id))
+                cursor.executemany("""
+                    INSERT INTO grades (student_id, subject_id, grade) VALUES (?, ?, ?)
+                    ON CONFLICT (student_id, subject_id) DO UPDATE SET grade = excluded.grade
+                """, upserts)
+                cursor.executemany('DELETE FROM grades WHERE student_id = ? AND subject_id = ?', deletes)
                 conn.commit()
                 flash('Оценки обновлены', 'success')
             except (KeyError, ValueError) as e:
@@ -1013,18 +995,8 @@ def manage_activities():
                 if selected_entity_id:
                     try:
                         selected_entity_id = int(selected_entity_id)
-                        cursor.execute('SELECT * FROM students WHERE group_id = ?', (selected_group_id,))
+                        cursor.execute('SELECT * FROM students WHERE group_id = ? ORDER BY full_name_sort_key, id', (selected_group_id,))
                         students = cursor.fetchall()
-
-                        import locale
-                        locale.setlocale(locale.LC_COLLATE, 'uk_UA.UTF-8')
-
-                        students = sorted(
-                            students,
-                            key=lambda s: locale.strxfrm(
-                                f"{s['last_name_UA']} {s['first_name_UA']} {s['middle_name_UA']}"
-                            )
-                        )
                         cursor.execute('SELECT id, student_id, entity_id, entity_type, grade, name FROM activity_grades WHERE entity_id = ? AND entity_type = ?', 
                                      (selected_entity_id, selected_entity_type))
                         grades = cursor.fetchall()
@@ -1179,6 +1151,8 @@ def manage_activities():
                     entity_id = request.form['entity_id']
                     cursor.execute('SELECT id FROM students WHERE group_id = ?', (group_id,))
                     student_ids = [row['id'] for row in cursor.fetchall()]
+                    upserts = []
+                    deletes = []
                     for student_id in student_ids:
                         grade_key = f'grade_{student_id}'
                         grade_id_key = f'grade_id_{student_id}'
@@ -1195,25 +1169,21 @@ def manage_activities():
                                     flash(f'Оценка для студента {student_id} должна быть от 0 до 100', 'error')
                                     continue
 
-                                if grade_id:
-                                    cursor.execute(
-                                        'UPDATE activity_grades SET grade = ?, name = ? WHERE id = ? AND student_id = ? AND entity_id = ? AND entity_type = ?',
-                                        (grade, name, grade_id, student_id, entity_id, entity_type)
-                                    )
-                                else:
-                                    cursor.execute(
-                                        'INSERT INTO activity_grades (student_id, entity_id, entity_type, grade, name) VALUES (?, ?, ?, ?, ?)',
-                                        (student_id, entity_id, entity_type, grade, name)
-                                    )
+                                upserts.append((student_id, entity_id, entity_type, grade, name))
                             except ValueError:
                                 flash(f'Некорректная оценка для студента {student_id}', 'error')
                                 continue
                         else:
                             if grade_id:
-                                cursor.execute(
-                                    'DELETE FROM activity_grades WHERE id = ? AND student_id = ? AND entity_id = ? AND entity_type = ?',
-                                    (grade_id, student_id, entity_id, entity_type)
-                                )
+                                deletes.append((student_id, entity_id, entity_type))
+                    cursor.executemany("""
+                        INSERT INTO activity_grades (student_id, entity_id, entity_type, grade, name) VALUES (?, ?, ?, ?, ?)
+                        ON CONFLICT (student_id, entity_type, entity_id) DO UPDATE SET grade = excluded.grade, name = excluded.name
+                    """, upserts)
+                    cursor.executemany(
+                        'DELETE FROM activity_grades WHERE student_id = ? AND entity_id = ? AND entity_type = ?',
+                        deletes
+                    )
                     conn.commit()
                     flash('Оценки обновлены', 'success')
                 except (KeyError, ValueError) as e:
@@ -1239,21 +1209,124 @@ def manage_activities():
 @admin_bp.route('/admin/view_logs')
 @permission_required('view_logs')
 def view_logs():
-    """Отображение логов действий пользователей."""
-    current_dir = os.path.dirname(__file__)
-    project_root = os.path.dirname(current_dir)
-    log_file_path = os.path.join(project_root, 'app.log')
-    
-    logs = []
-    if os.path.exists(log_file_path):
-        try:
-            with open(log_file_path, 'r', encoding='utf-8') as file:
-                logs = [line.strip() for line in file if line.strip()]
-        except Exception as e:
-            logging.error(f"Ошибка при чтении файла: {e}")
-    
+    """Отображение логов действий пользователей постранично, от новых к старым."""
+    page = request.args.get('page', 1, type=int)
+    user = request.args.get('user', '').strip() or None
+    level = request.args.get('level', '').strip() or None
+    if level not in log_reader.LEVELS:
+        level = None
+    text = request.args.get('q', '').strip() or None
+    # Позиция конца журнала на момент открытия первой страницы: новые строки не сдвигают страницы
+    anchor = log_reader.decode_position(request.args.get('anchor'))
+
+    entries, has_next, page, known_pages, anchor = [], False, 1, 1, None
+    try:
+        entries, has_next, page, known_pages, anchor = log_viewer.page(
+            page=page, anchor=anchor, user=user, level=level, text=text
+        )
+    except OSError as e:
+        logging.error(f"Ошибка при чтении файла: {e}")
+
     log_action(session.get('username', 'невідомо'), "переглянув логи дій користувачів")
-    return render_template('view_logs.html', logs=logs[::-1])
+    return render_template(
+        'view_logs.html',
+        logs=entries,
+        page=page,
+        known_pages=known_pages,
+        has_next=has_next,
+        anchor=log_reader.encode_position(anchor) if anchor else None,
+        levels=log_reader.LEVELS,
+        filters={'user': user or '', 'level': level or '', 'q': text or ''},
+    )
+
+@admin_bp.route('/admin/audit_log')
+@permission_required('view_logs')
+def audit_log():
+    """Журнал дій з таблиці audit_log з фільтрами за користувачем, періодом, групою та студентом."""
+    page = max(request.args.get('page', 1, type=int), 1)
+    filters = {
+        'username': request.args.get('username', '').strip(),
+        'date_from': request.args.get('date_from', '').strip(),
+        'date_to': request.args.get('date_to', '').strip(),
+        'group_id': request.args.get('group_id', type=int),
+        'student_id': request.args.get('student_id', type=int),
+    }
+    for key in ('date_from', 'date_to'):
+        try:
+            datetime.strptime(filters[key], '%Y-%m-%d')
+        except ValueError:
+            filters[key] = ''
+
+    conn = get_db()
+    groups = conn.execute("SELECT id, name, start_year FROM groups ORDER BY name, start_year").fetchall()
+    # Одна лишняя строка показывает, есть ли следующая страница
+    rows = audit.query(conn, limit=LOG_PAGE_SIZE + 1, offset=(page - 1) * LOG_PAGE_SIZE,
+                       **{key: value or None for key, value in filters.items()})
+    has_next = len(rows) > LOG_PAGE_SIZE
+    events = []
+    for row in rows[:LOG_PAGE_SIZE]:
+        event = dict(row)
+        group_ids = json.loads(row['group_ids']) if row['group_ids'] else []
+        event['groups'] = group_names.display_names(conn, group_ids)
+        events.append(event)
+    conn.close()
+
+    log_action(session.get('username', 'невідомо'), "переглянув журнал дій (audit_log)")
+    return render_template(
+        'audit_log.html',
+        events=events,
+        groups=groups,
+        page=page,
+        has_next=has_next,
+        filters={key: '' if value is None else value for key, value in filters.items()},
+    )
+
+@admin_bp.route('/admin/sql_profile', methods=['GET', 'POST'])
+@permission_required('view_logs')
+def sql_profile():
+    """Маршруты з найбільшим часом SQL та підозрами на N+1 (sql_profiler.py)."""
+    if request.method == 'POST':
+        sql_profiler.store.reset()
+        flash("Статистику SQL очищено", "success")
+        return redirect(url_for('admin.sql_profile'))
+
+    log_action(session.get('username', 'невідомо'), "переглянув профіль SQL-запитів")
+    return render_template(
+        'sql_profile.html',
+        enabled=sql_profiler.SQL_PROFILING,
+        routes=sql_profiler.store.worst_routes(),
+        threshold=sql_profiler.SQL_N_PLUS_ONE_THRESHOLD
+    )
+
+@admin_bp.route('/admin/completeness')
+@permission_required('view_completeness')
+def completeness_dashboard():
+    """Заповненість даних усіх активних груп (зі зведених таблиць completeness.py)."""
+    conn = get_db()
+    groups = conn.execute("""
+        SELECT g.id,
+               g.name || ' (' || g.start_year || ', ' || g.study_form || ', ' || g.program_credits || ' кредитів)' AS display_name,
+               COUNT(sc.student_id) AS student_count,
+               COALESCE(SUM(sc.fields_filled), 0) AS fields_filled,
+               COALESCE(SUM(sc.fields_total), 0) AS fields_total,
+               COALESCE(SUM(sc.has_military), 0) AS military_count,
+               COALESCE(SUM(sc.military_filled), 0) AS military_filled,
+               COALESCE(SUM(sc.military_total), 0) AS military_total,
+               COALESCE(SUM(sc.grades_filled), 0) AS grades_filled,
+               COALESCE(gc.subjects_total, 0) * COUNT(sc.student_id) AS grades_total,
+               COALESCE(SUM(sc.activities_filled), 0) AS activities_filled,
+               COALESCE(gc.activities_total, 0) * COUNT(sc.student_id) AS activities_total
+        FROM groups g
+        LEFT JOIN group_completeness gc ON gc.group_id = g.id
+        LEFT JOIN student_completeness sc ON sc.group_id = g.id AND sc.archived = FALSE
+        WHERE g.archived = FALSE
+        GROUP BY g.id
+        ORDER BY g.start_year DESC, g.name
+    """).fetchall()
+    conn.close()
+
+    log_action(session.get('username', 'невідомо'), "переглянув заповненість даних по групах")
+    return render_template('completeness.html', groups=groups)
 
 @admin_bp.route('/admin/users', methods=['GET', 'POST'])
 @permission_required('manage_users')
@@ -1298,7 +1371,8 @@ def manage_users():
             'manage_students':              'Управління студентами (Видалення студента та його війс. док.)',
             'manage_accreditations':        'Управління акредетаціями',
             'manage_diplomas':              'Управління номерами диплому і додатку',
-            'import_education_docs':        'Управління імпортом документів'
+            'import_education_docs':        'Управління імпортом документів',
+            'view_completeness':            'Заповненість даних по групах'
                  
         }
 
@@ -1318,6 +1392,7 @@ def manage_users():
             """, (is_admin, json.dumps(selected_perms), user_id))
 
             conn.commit()
+            permissions.bump(user_id)
             log_action(
                 session.get('username', 'невідомо'),
                 f"оновив права користувача ID {user_id} (is_admin={is_admin})"
@@ -1368,14 +1443,13 @@ def add_user():
                 flash(f'Користувач з ім’ям "{username}" вже існує', 'danger')
                 return redirect(url_for('admin.add_user'))
 
-            conn.execute(
+            user_id = conn.execute(
                 """
                 INSERT INTO users (username, password_hash, role, is_admin, permissions)
                 VALUES (?, ?, ?, ?, ?)
                 """,
                 (username, generate_password_hash(password), role, is_admin, permissions)
-            )
-            user_id = conn.lastrowid
+            ).lastrowid
 
             # Додаємо зв’язки з групами
             for gid in group_ids:
@@ -1386,6 +1460,7 @@ def add_user():
                     )
 
             conn.commit()
+            access.invalidate(user_id)
             log_action(
                 session.get('username', 'невідомо'),
                 f"додав нового користувача '{username}' (ID {user_id})"
@@ -1444,6 +1519,8 @@ def edit_user(user_id):
                     )
 
             conn.commit()
+            permissions.bump(user_id)
+            access.invalidate(user_id)
             log_action(
                 session.get('username', 'невідомо'),
                 f"змінив роль/групи користувача ID {user_id} → роль: {role}"
@@ -1545,6 +1622,8 @@ def delete_user(user_id):
             conn.execute("DELETE FROM users WHERE id = ?", (user_id,))
             conn.execute("DELETE FROM user_groups WHERE user_id = ?", (user_id,))
             conn.commit()
+            permissions.bump(user_id)
+            access.invalidate(user_id)
 
             log_action(
                 session.get('username', 'невідомо'),
@@ -1594,8 +1673,20 @@ def group_export():
         else:
             # Получаем список активных студентов из формы
             active_students = request.form.getlist('active_students')
-            # Перенаправляем с параметрами, включая активных студентов
-            return redirect(url_for('admin.generate_group_docs', group_id=selected_group_id, birth_year=selected_year, template=selected_template, active_students=','.join(active_students)))
+            if not os.path.exists(selected_template):
+                flash(f'Шаблон {selected_template} не знайдено.', 'error')
+                conn.close()
+                return redirect(url_for('admin.group_export'))
+            # Генерация выполняется в фоне, запрос только ставит задание в очередь
+            job_id = export_jobs.submit(conn, {
+                'group_id': selected_group_id,
+                'birth_year': selected_year,
+                'template': selected_template,
+                'active_students': active_students,
+            }, session.get('username', 'невідомо'), user_id=session.get('user_id'))
+            conn.close()
+            log_action(session.get('username', 'невідомо'), f"поставив у чергу генерацію документів #{job_id} (group_id={selected_group_id}, birth_year={selected_year})", selected_group_id)
+            return redirect(url_for('admin.export_job', job_id=job_id))
 
     if selected_group_id or selected_year:
         base_query = """
@@ -1607,8 +1698,8 @@ def group_export():
             base_query += " AND group_id = ?"
             params.append(selected_group_id)
         if selected_year:
-            base_query += " AND SUBSTR(birth_date, 7, 4) >= ?"
-            params.append(str(selected_year))
+            base_query += " AND birth_date_iso >= ?"
+            params.append(year_start(selected_year))
         try:
             students = conn.execute(base_query, params).fetchall()
         except Exception as e:
@@ -1616,6 +1707,7 @@ def group_export():
             conn.close()
             return "Помилка бази даних", 500
 
+    jobs = export_jobs.recent(conn, None if access.is_unrestricted() else session.get('user_id'))
     conn.close()
     log_action(session.get('username', 'невідомо'), f"відкрив форму експорту документів для групи (group_id={selected_group_id}, birth_year={selected_year})")
     return render_template(
@@ -1625,8 +1717,56 @@ def group_export():
         years=years,
         selected_group_id=selected_group_id,
         selected_year=selected_year,
-        selected_template=selected_template
+        selected_template=selected_template,
+        jobs=jobs
     )
+
+
+def _load_export_job(job_id):
+    """Задание экспорта, доступное текущему пользователю (автору или администратору), иначе 404."""
+    conn = get_db()
+    job = export_jobs.get(conn, job_id)
+    conn.close()
+    if job is None or (job['user_id'] != session.get('user_id') and not access.is_unrestricted()):
+        abort(404)
+    return job
+
+
+@admin_bp.route('/admin/export_jobs/<int:job_id>')
+@permission_required('group_export')
+def export_job(job_id):
+    """Страница задания экспорта с прогрессом."""
+    job = _load_export_job(job_id)
+    return render_template('export_job.html', job=job)
+
+
+@admin_bp.route('/admin/export_jobs/<int:job_id>/status')
+@permission_required('group_export')
+def export_job_status(job_id):
+    """Состояние задания для опроса со страницы (JSON)."""
+    job = _load_export_job(job_id)
+    return jsonify({
+        'id': job['id'],
+        'status': job['status'],
+        'title': job['title'],
+        'total': job['total'],
+        'done': job['done'],
+        'failed': job['failed'],
+        'error': job['error'],
+        'download_url': url_for('admin.export_job_download', job_id=job_id) if job['status'] == 'done' else None,
+    })
+
+
+@admin_bp.route('/admin/export_jobs/<int:job_id>/download')
+@permission_required('group_export')
+def export_job_download(job_id):
+    """Готовый архив задания."""
+    job = _load_export_job(job_id)
+    if job['status'] != 'done' or not job['result_path'] or not os.path.exists(job['result_path']):
+        flash('Архив ще не готовий або більше не доступний.', 'error')
+        return redirect(url_for('admin.export_job', job_id=job_id))
+    log_action(session.get('username', 'невідомо'), f"завантажив архів завдання експорту #{job_id}")
+    return send_file(job['result_path'], as_attachment=True, download_name=job['title'] or f"export_{job_id}.zip")
     
 # Папка для временного хранения загруженных файлов
 UPLOAD_FOLDER = 'Uploads'
@@ -1770,49 +1910,13 @@ def generate_group_docs():
         flash('Оберіть групу або рік народження для генерації документів.', 'error')
         return redirect(url_for('admin.group_export'))
 
-    conn = get_db()
-    conn.row_factory = sqlite3.Row
-    base_query = """
-        SELECT s.*, 
-               g.name || ' (' || g.start_year || ', ' || g.study_form || ', ' || g.program_credits || ' кредитів)' AS group_name,
-               g.study_form,
-               g.start_year,
-               g.program_credits,
-               g.qualification_name,
-               g.degree_level,
-               g.specialty,
-               g.educational_program,
-               g.knowledge_area,
-               g.qualification_name_en,
-               g.degree_level_en,
-               g.specialty_en,
-               g.educational_program_en,
-               g.knowledge_area_en,
-               g.institution_name_and_status,
-               g.institution_name_and_status_en,
-               g.entry_requirements,
-               g.entry_requirements_en,
-               g.learning_outcomes,
-               g.learning_outcomes_en,
-               g.program_includes,
-               g.program_includes_en
-        FROM students s
-        LEFT JOIN groups g ON s.group_id = g.id
-        WHERE s.archived = FALSE  -- Исключение архивных студентов
-    """
-    params = []
-
-    # Фильтр по группе, если указан
-    if group_id:
-        base_query += " AND s.group_id = ?"
-        params.append(group_id)
-    # Фильтр по году рождения, если указан
-    if birth_year:
-        base_query += " AND SUBSTR(s.birth_date, 7, 4) >= ?"
-        params.append(str(birth_year))
+    if not os.path.exists(selected_template):
+        flash(f'Шаблон {selected_template} не знайдено.', 'error')
+        return redirect(url_for('admin.group_export'))
 
+    conn = get_db()
     try:
-        students = conn.execute(base_query, params).fetchall()
+        students = export_jobs.select_students(conn, group_id, birth_year, active_students)
         if not students:
             logging.error(f"Студенты не найдены для group_id={group_id}, birth_year={birth_year}")
             conn.close()
@@ -1822,40 +1926,28 @@ def generate_group_docs():
         conn.close()
         return "Ошибка базы данных", 500
 
-    # Фильтрация студентов по активным чекбоксам
-    if active_students and active_students[0]:  # Проверяем, не пустой ли список
-        students = [s for s in students if str(s['id']) in active_students]
-
-    # Получение имени группы, если group_id задан
-    group_name = "Зі всіх груп"
-    if group_id and students:
-        group_name = students[0]['group_name'] if students[0]['group_name'] else f"Група_{group_id}"
-
-    output_dir = os.path.join(os.getcwd(), 'generated_docs')
-    os.makedirs(output_dir, exist_ok=True)
+    group_name, zip_filename = export_jobs.archive_name(students, group_id, birth_year)
+    jobs, failures = export_jobs.prepare_documents(conn, students, selected_template)
+    conn.close()
 
-    zip_filename = f"{group_name}_{str(birth_year) if birth_year else 'Всі роки народження'}.zip"
-    zip_path = os.path.join(output_dir, zip_filename)
+    # Архив отдаётся клиенту по мере рендеринга документов и не записывается на диск
+    username = session.get('username', 'невідомо')
 
-    with ZipFile(zip_path, 'w') as zipf:
-        for student in students:
-            student_dict = dict(student)
-            military = conn.execute("SELECT * FROM military WHERE student_id = ?", (student['id'],)).fetchone()
-            military_dict = dict(military) if military else {}
+    def stream():
+        yield from export_jobs.iter_archive(selected_template, jobs, failures, username)
+        log_action(username, f"згенерував документи для групи {group_name} (рік народження: {birth_year or 'всі'})")
 
-            filename = f"{student_dict['last_name_UA']}_{student_dict['first_name_UA']}.docx".replace(" ", "_")
-            full_path = os.path.join(output_dir, filename)
+    return Response(
+        stream_with_context(stream()),
+        mimetype='application/zip',
+        headers={'Content-Disposition': _attachment_disposition(zip_filename)},
+    )
 
-            try:
-                gen_doc(student_dict, military_dict, template=selected_template, out=full_path, user_name=session.get('username', 'невідомо'))
-                zipf.write(full_path, arcname=filename)
-            except Exception as e:
-                logging.error(f"Ошибка при генерации документа для студента {student_dict.get('last_name_UA', '')}: {e}")
-                continue
 
-    log_action(session.get('username', 'невідомо'), f"згенерував документи для групи {group_name} (рік народження: {birth_year or 'всі'})")
-    conn.close()
-    return send_file(zip_path, as_attachment=True)
+def _attachment_disposition(filename):
+    """Заголовок Content-Disposition для скачивания файла с именем не в ASCII (RFC 6266)."""
+    ascii_name = filename.encode('ascii', 'ignore').decode('ascii').replace('"', '') or 'download'
+    return f"attachment; filename=\"{ascii_name}\"; filename*=UTF-8''{quote(filename)}"
     
 @admin_bp.route('/admin/archive/<int:group_id>', methods=['POST'])
 @permission_required('archive')
@@ -1878,6 +1970,7 @@ def archive_group(group_id):
     
     conn.commit()
     conn.close()
+    group_names.invalidate()
     
     log_action(session.get('username', 'невідомо'), f"заархівував групу ID {group_id}")
     flash('Групу успішно заархівовано', 'success')
@@ -1905,6 +1998,7 @@ def unarchive_group(group_id):
     
     conn.commit()
     conn.close()
+    group_names.invalidate()
     
     log_action(session.get('username', 'невідомо'), f"розархівував групу ID {group_id}")
     flash('Групу успішно розархівовано', 'success')
@@ -1934,7 +2028,7 @@ def archive():
             SELECT id, last_name_UA, first_name_UA, birth_date
             FROM students
             WHERE group_id = ? AND archived = TRUE
-            ORDER BY last_name_UA
+            ORDER BY full_name_sort_key, id
         """, (group['id'],)).fetchall()
         students_by_group[group['id']] = students
 
@@ -6,11 +6,27 @@ import logging
 from werkzeug.utils import secure_filename
 from db import get_db
 from utils import log_action, login_required, permission_required, transliterate_ukrainian, generate_english_name
-from gen_docx import gen_doc
+from gen_docx import gen_doc, document_filename, DOCX_MIMETYPE
+from pagination import encode_cursor, decode_cursor, CountCache
+from search_index import build_match_query
+import access
+import sort_keys
 import sqlite3
 
 students_bp = Blueprint('students', __name__)
 
+# Выражения сортировки списка студентов; вместе с s.id образуют ключ курсора
+STUDENT_SORT_EXPRESSIONS = {
+    'id': "s.id",
+    'last_name_UA': "s.last_name_sort_key",
+    'first_name_UA': "s.first_name_sort_key",
+    'middle_name_UA': "s.middle_name_sort_key",
+    'birth_date': "s.birth_date_iso",
+    'group_id': "COALESCE(s.group_id, 0)",
+}
+
+student_count_cache = CountCache(ttl=30)
+
 @students_bp.route('/students', methods=['GET'])
 @login_required('')
 def student_list():
@@ -22,33 +38,41 @@ def student_list():
     per_page = request.args.get('per_page', 10, type=int)
     sort_by = request.args.get('sort_by', 'id')
     sort_order = request.args.get('sort_order', 'desc')
+    after = request.args.get('after')
+    before = request.args.get('before')
 
     # Проверка допустимых значений для пагинации и сортировки
     if per_page not in [10, 20, 50, 100]:
         per_page = 10
+    if page < 1:
+        page = 1
 
-    allowed_sort_fields = ['id', 'last_name_UA', 'first_name_UA', 'middle_name_UA', 'birth_date', 'group_id']
-    if sort_by not in allowed_sort_fields:
+    if sort_by not in STUDENT_SORT_EXPRESSIONS:
         sort_by = 'id'
     if sort_order not in ['asc', 'desc']:
         sort_order = 'desc'
 
+    # Курсор имеет приоритет над номером страницы: глубокие страницы не требуют OFFSET
+    cursor = decode_cursor(after, sort_by, sort_order)
+    backwards = False
+    if cursor is None:
+        cursor = decode_cursor(before, sort_by, sort_order)
+        backwards = cursor is not None
+
     offset = (page - 1) * per_page
 
     # Подключение к базе данных
     conn = get_db()
-    role = session.get('role')
-    user_id = session.get('user_id')
 
-    # Получение group_ids из базы данных для пользователя
-    group_ids = [row['group_id'] for row in conn.execute("SELECT group_id FROM user_groups WHERE user_id = ?", (user_id,)).fetchall()]
+    # Группы пользователя из кэша области доступа (access.py), без запроса к user_groups
+    group_ids = sorted(access.user_group_ids())
 
     # Логирование действия
     log_action(session.get('username', 'невідомо'), f"переглянув список студентів (group_id={group_id})", group_ids=[group_id] if group_id else group_ids)
 
-    # Базовый запрос для получения студентов (без избыточного WHERE)
-    base_query = """
-        SELECT s.*, 
+    # Колонки списка: студент, военные данные, группа и счётчики заполненности из сводных таблиц (completeness.py)
+    select_columns = """
+               s.*,
                m.id AS has_military,
                m.registration_number_of_the_DRPVR,
                m.military_registration_document,
@@ -71,79 +95,112 @@ def student_list():
                g.degree_level_en,
                g.specialty_en,
                g.educational_program_en,
-               g.knowledge_area_en
-        FROM students s
+               g.knowledge_area_en,
+               COALESCE(sc.grades_filled, 0) AS grades_filled,
+               COALESCE(sc.activities_filled, 0) AS activities_filled_fields,
+               COALESCE(gc.subjects_total, 0) AS grades_total,
+               COALESCE(gc.activities_total, 0) AS activities_total_fields
+    """
+    joins = """
         LEFT JOIN military m ON m.student_id = s.id
         LEFT JOIN groups g ON s.group_id = g.id
+        LEFT JOIN student_completeness sc ON sc.student_id = s.id
+        LEFT JOIN group_completeness gc ON gc.group_id = s.group_id
     """
-    count_query = "SELECT COUNT(*) FROM students s"
     where_clauses = ["s.archived = FALSE"]  # Базовое условие для исключения архивных студентов
-    params = []
+
+    # Ограничение по группам для не-администраторов — соединение с user_groups по первичному ключу;
+    # оно стоит первым после FROM, поэтому его параметры идут перед параметрами WHERE
+    scope_sql, params = ("", []) if group_id else access.scope_join()
 
     # Фильтр по группе из параметра group_id
     if group_id:
         where_clauses.append("s.group_id = ?")
         params.append(group_id)
 
-    # Ограничение по группе для не-администраторов
-    if role != 'admin' and not group_id:
-        if group_ids:
-            placeholders = ','.join('?' for _ in group_ids)
-            where_clauses.append(f"s.group_id IN ({placeholders})")
-            params.extend(group_ids)
-        else:
-            # Если нет групп, возвращаем пустой список
-            students = []
-            total_students = 0
-            students_with_filled_fields = []
-            conn.close()
-            return render_template(
-                'students.html',
-                students=students_with_filled_fields,
-                search=search,
-                group_id=group_id,
-                page=page,
-                per_page=per_page,
-                total_pages=0,
-                sort_by=sort_by,
-                sort_order=sort_order
-            )
+    # Пользователь без групп видит пустой список
+    if not group_id and not access.has_any_group():
+        students = []
+        total_students = 0
+        students_with_filled_fields = []
+        conn.close()
+        return render_template(
+            'students.html',
+            students=students_with_filled_fields,
+            search=search,
+            group_id=group_id,
+            page=page,
+            per_page=per_page,
+            total_pages=0,
+            prev_cursor=None,
+            next_cursor=None,
+            sort_by=sort_by,
+            sort_order=sort_order
+        )
 
     # Проверка доступа к группе для не-администраторов
-    if role != 'admin' and group_id and group_id not in group_ids:
+    if group_id and not access.can_access_group(group_id):
         conn.close()
         flash("У вас немає доступу до цієї групи.", "error")
         return redirect(url_for('students.student_list'))
 
-    # Поиск по имени, фамилии, отчеству
-    if search:
-        where_clauses.append("(s.last_name_UA LIKE ? OR s.first_name_UA LIKE ? OR s.middle_name_UA LIKE ?)")
-        params.extend([f'%{search}%', f'%{search}%', f'%{search}%'])
+    # Поиск по ФИО (UA/ENG), коду ЄДЕБО и названию группы через индекс FTS5
+    match_query = build_match_query(search)
+    if match_query:
+        where_clauses.append("s.id IN (SELECT rowid FROM students_fts WHERE students_fts MATCH ?)")
+        params.append(match_query)
 
-    # Дополнительное условие для корректной сортировки по дате рождения
+    # При сортировке по дате рождения исключаются студенты с нераспознанной датой
     if sort_by == 'birth_date':
-        where_clauses.append("LENGTH(s.birth_date) = 10 AND INSTR(s.birth_date, '.') = 3 AND INSTR(SUBSTR(s.birth_date, 4), '.') = 3")
+        where_clauses.append("s.birth_date_iso IS NOT NULL")
 
     # Формирование условий WHERE
-    if where_clauses:
-        where_sql = " WHERE " + " AND ".join(where_clauses)
-        base_query += where_sql
-        count_query += where_sql
+    where_sql = " WHERE " + " AND ".join(where_clauses)
+    count_query = f"SELECT COUNT(*) FROM students s{scope_sql}{where_sql}"
 
-    # Сортировка
-    if sort_by == 'birth_date':
-        base_query += f" ORDER BY SUBSTR(s.birth_date, 7, 4) || SUBSTR(s.birth_date, 4, 2) || SUBSTR(s.birth_date, 1, 2) {sort_order.upper()}"
-    elif sort_by in ['last_name_UA', 'first_name_UA', 'middle_name_UA']:
-        base_query += f" ORDER BY s.{sort_by} COLLATE UKRAINIAN {sort_order.upper()}"
+    # Сортировка по ключу (выражение сортировки, id); при движении назад порядок обращается
+    sort_expr = STUDENT_SORT_EXPRESSIONS[sort_by]
+    descending = (sort_order == 'desc') != backwards
+    direction = 'DESC' if descending else 'ASC'
+
+    if cursor is not None:
+        where_sql += f" AND ({sort_expr}, s.id) {'<' if descending else '>'} (?, ?)"
+        query_params = params + list(cursor)
     else:
-        base_query += f" ORDER BY s.{sort_by} {sort_order.upper()}"
+        query_params = list(params)
+
+    base_query = (
+        f"SELECT {sort_expr} AS sort_key, {select_columns}"
+        f" FROM students s{scope_sql}{joins}{where_sql}"
+        f" ORDER BY {sort_expr} {direction}, s.id {direction}"
+    )
 
-    base_query += " LIMIT ? OFFSET ?"
-    params_with_limit = params + [per_page, offset]
+    # Берём на одну запись больше, чтобы узнать, есть ли следующая страница
+    if cursor is not None:
+        base_query += " LIMIT ?"
+        query_params.append(per_page + 1)
+    else:
+        base_query += " LIMIT ? OFFSET ?"
+        query_params.extend([per_page + 1, offset])
 
     # Выполнение запросов
-    students = conn.execute(base_query, params_with_limit).fetchall()
-    total_students = conn.execute(count_query, params).fetchone()[0]
+    students = conn.execute(base_query, query_params).fetchall()
+    has_more = len(students) > per_page
+    students = students[:per_page]
+    if backwards:
+        students.reverse()
+
+    # Общее количество кэшируется, чтобы не пересчитывать его при каждом переходе
+    total_students = student_count_cache.get_or_count(conn, count_query, params)
+
+    # Токены соседних страниц
+    prev_cursor = next_cursor = None
+    if students:
+        first, last = students[0], students[-1]
+        if (backwards and has_more) or (not backwards and (cursor is not None or page > 1)):
+            prev_cursor = encode_cursor(sort_by, sort_order, first['sort_key'], first['id'])
+        if (not backwards and has_more) or backwards:
+            next_cursor = encode_cursor(sort_by, sort_order, last['sort_key'], last['id'])
 
     # Обработка данных студентов
     students_with_filled_fields = []
@@ -179,29 +236,15 @@ def student_list():
             student_dict['military_filled_fields'] = 0
             student_dict['military_total_fields'] = military_total_fields
 
-        # Вычисление заполненности оценок по предметам
-        subjects = conn.execute("SELECT id FROM subjects WHERE group_id = ?", (student_dict['group_id'],)).fetchall()
-        student_dict['has_grades'] = len(subjects) > 0
-        grades = conn.execute("SELECT grade FROM grades WHERE student_id = ?", (student_dict['id'],)).fetchall()
-        grades_filled = sum(1 for grade in grades if grade['grade'] is not None and str(grade['grade']).strip())
-        grades_total = len(subjects)
-        student_dict['grades_filled'] = grades_filled
-        student_dict['grades_total'] = grades_total
+        # Заполненность оценок и активностей берётся из сводных таблиц (completeness.py)
+        grades_filled = student_dict['grades_filled']
+        grades_total = student_dict['grades_total']
+        student_dict['has_grades'] = grades_total > 0
         student_dict['grades_fill_percentage'] = (grades_filled / grades_total * 100) if grades_total > 0 else 0
 
-        # Вычисление заполненности активностей (практики, курсовые работы, аттестации)
-        practices = conn.execute("SELECT id FROM practices WHERE group_id = ?", (student_dict['group_id'],)).fetchall()
-        courseworks = conn.execute("SELECT id FROM courseworks WHERE group_id = ?", (student_dict['group_id'],)).fetchall()
-        attestations = conn.execute("SELECT id FROM attestations WHERE group_id = ?", (student_dict['group_id'],)).fetchall()
-        student_dict['has_activities'] = len(practices) > 0 or len(courseworks) > 0 or len(attestations) > 0
-        activities_grades = conn.execute(
-            "SELECT grade FROM activity_grades WHERE student_id = ? AND entity_type IN ('practice', 'coursework', 'attestation')",
-            (student_dict['id'],)
-        ).fetchall()
-        activities_total = len(practices) + len(courseworks) + len(attestations)
-        activities_filled = sum(1 for grade in activities_grades if grade['grade'] is not None and str(grade['grade']).strip())
-        student_dict['activities_filled_fields'] = activities_filled
-        student_dict['activities_total_fields'] = activities_total
+        activities_filled = student_dict['activities_filled_fields']
+        activities_total = student_dict['activities_total_fields']
+        student_dict['has_activities'] = activities_total > 0
         student_dict['activities_fill_percentage'] = (activities_filled / activities_total * 100) if activities_total > 0 else 0
 
         students_with_filled_fields.append(student_dict)
@@ -227,6 +270,8 @@ def student_list():
         page=page,
         per_page=per_page,
         total_pages=total_pages,
+        prev_cursor=prev_cursor,
+        next_cursor=next_cursor,
         sort_by=sort_by,
         sort_order=sort_order
     )
@@ -248,7 +293,7 @@ def student_details(student_id):
         flash("Студента не знайдено")
         return redirect(url_for('students.student_list'))
     
-    if session.get('role') != 'admin' and student['group_id'] not in session.get('group_ids', []):
+    if not access.can_access_group(student['group_id']):
         conn.close()
         flash("Доступ заборонено: студент не належить до вашої групи")
         return redirect(url_for('students.student_list'))
@@ -380,7 +425,7 @@ def student_details(student_id):
     student_dict = dict(student)
     military_dict = dict(military) if military else None
     
-    log_action(session.get('username', 'невідомо'), f"переглянув сторінку студента ID {student_id}", group_ids=[student['group_id']])
+    log_action(session.get('username', 'невідомо'), f"переглянув сторінку студента ID {student_id}", group_ids=[student['group_id']], student_id=student_id)
     conn.close()
     
     return render_template(
@@ -399,26 +444,15 @@ def student_details(student_id):
 def add_student():
     """Добавление нового студента."""
     conn = get_db()
-    role = session.get('role')
-    group_ids = session.get('group_ids', [])
-    # Получение доступных групп
-    if role == 'admin':
-        groups = conn.execute("""
-            SELECT id, name, start_year, study_form, program_credits,
-                   name || ' (' || start_year || ', ' || study_form || ', ' || program_credits || ' кредитів)' AS display_name
-            FROM groups
-            WHERE archived = FALSE
-            ORDER BY name, start_year
-        """).fetchall()
-    else:
-        placeholders = ','.join('?' for _ in group_ids)
-        groups = conn.execute(f"""
-            SELECT id, name, start_year, study_form, program_credits,
-                   name || ' (' || start_year || ', ' || study_form || ', ' || program_credits || ' кредитів)' AS display_name
-            FROM groups
-            WHERE id IN ({placeholders}) AND archived = FALSE
-            ORDER BY name, start_year
-        """, group_ids).fetchall()
+    # Доступные группы: для не-администраторов — через соединение с user_groups
+    scope_sql, scope_params = access.scope_join('g.id')
+    groups = conn.execute(f"""
+        SELECT g.id, g.name, g.start_year, g.study_form, g.program_credits,
+               g.name || ' (' || g.start_year || ', ' || g.study_form || ', ' || g.program_credits || ' кредитів)' AS display_name
+        FROM groups g{scope_sql}
+        WHERE g.archived = FALSE
+        ORDER BY g.name, g.start_year
+    """, scope_params).fetchall()
 
     if request.method == 'POST':
         group = request.form.get('group_id')
@@ -428,7 +462,7 @@ def add_student():
             flash("Некоректна група", "error")
             conn.close()
             return render_template('add_student.html', groups=groups)
-        if role != 'admin' and group_int not in group_ids:
+        if not access.can_access_group(group_int):
             flash("Доступ заборонено: група не належить до ваших груп", "error")
             conn.close()
             return render_template('add_student.html', groups=groups)
@@ -450,11 +484,12 @@ def add_student():
         last_name_eng, first_name_eng = generate_english_name(last_name_ua, first_name_ua)
 
         # Вставка студента
-        conn.execute("""
+        conn.execute(f"""
             INSERT INTO students (
                 last_name_UA, first_name_UA, middle_name_UA,
-                last_name_ENG, first_name_ENG, birth_date, group_id, edebo_code
-            ) VALUES (?, ?, ?, ?, ?, ?, ?, ?)
+                last_name_ENG, first_name_ENG, birth_date, group_id, edebo_code,
+                {sort_keys.INSERT_COLUMNS}
+            ) VALUES (?, ?, ?, ?, ?, ?, ?, ?, {sort_keys.INSERT_PLACEHOLDERS})
         """, (
             last_name_ua,
             first_name_ua,
@@ -463,7 +498,8 @@ def add_student():
             first_name_eng,
             birth_date,
             group_int,
-            request.form.get('edebo_code')
+            request.form.get('edebo_code'),
+            *sort_keys.values(last_name_ua, first_name_ua, request.form.get('middle_name_UA'))
         ))
         conn.commit()
         student_id = conn.execute("SELECT last_insert_rowid()").fetchone()[0]
@@ -524,13 +560,14 @@ def add_student():
         log_action(
             session.get('username', 'невідомо'),
             f"додав студента: {last_name_ua}",
-            group_ids=[group_int]
+            group_ids=[group_int],
+            student_id=student_id
         )
         conn.close()
         return redirect(url_for('students.student_list'))
 
     conn.close()
-    log_action(session.get('username', 'невідомо'), "відкрив форму додавання студента", group_ids=session.get('group_ids', []))
+    log_action(session.get('username', 'невідомо'), "відкрив форму додавання студента", group_ids=sorted(access.user_group_ids()))
     return render_template('add_student.html', groups=groups)
     
 @students_bp.route('/students/<int:student_id>/edit', methods=['GET', 'POST'])
@@ -538,8 +575,6 @@ def add_student():
 def edit_student(student_id):
     """Редактирование данных студента."""
     conn = get_db()
-    role = session.get('role')
-    group_ids = session.get('group_ids', [])
 
     student = conn.execute("SELECT * FROM students WHERE id = ?", (student_id,)).fetchone()
     if not student:
@@ -547,29 +582,20 @@ def edit_student(student_id):
         conn.close()
         return redirect(url_for('students.student_list'))
 
-    if role != 'admin' and student['group_id'] not in group_ids:
+    if not access.can_access_group(student['group_id']):
         flash('Ви не маєте доступу до цього студента', 'error')
         conn.close()
         return redirect(url_for('students.student_list'))
 
-    # Доступные группы
-    if role == 'admin':
-        groups = conn.execute("""
-            SELECT id, name, start_year, study_form, program_credits,
-                   name || ' (' || start_year || ', ' || study_form || ', ' || program_credits || ' кредитів)' AS display_name
-            FROM groups
-            WHERE archived = FALSE
-            ORDER BY name, start_year
-        """).fetchall()
-    else:
-        placeholders = ','.join('?' for _ in group_ids)
-        groups = conn.execute(f"""
-            SELECT id, name, start_year, study_form, program_credits,
-                   name || ' (' || start_year || ', ' || study_form || ', ' || program_credits || ' кредитів)' AS display_name
-            FROM groups
-            WHERE id IN ({placeholders})
-            ORDER BY name, start_year
-        """, group_ids).fetchall()
+    # Доступные группы: для не-администраторов — через соединение с user_groups
+    scope_sql, scope_params = access.scope_join('g.id')
+    groups = conn.execute(f"""
+        SELECT g.id, g.name, g.start_year, g.study_form, g.program_credits,
+               g.name || ' (' || g.start_year || ', ' || g.study_form || ', ' || g.program_credits || ' кредитів)' AS display_name
+        FROM groups g{scope_sql}
+        {'' if scope_sql else 'WHERE g.archived = FALSE'}
+        ORDER BY g.name, g.start_year
+    """, scope_params).fetchall()
 
     if request.method == 'POST':
         group = request.form.get('group_id')
@@ -580,7 +606,7 @@ def edit_student(student_id):
             conn.close()
             return render_template('edit_student.html', student=student, groups=groups)
 
-        if role != 'admin' and group_int not in group_ids:
+        if not access.can_access_group(group_int):
             flash("Доступ заборонено: група не належить до ваших груп", "error")
             conn.close()
             return render_template('edit_student.html', student=student, groups=groups)
@@ -611,11 +637,11 @@ def edit_student(student_id):
                 conn.close()
                 return render_template('edit_student.html', student=student, groups=groups)
 
-            conn.execute("""
+            conn.execute(f"""
                 UPDATE students SET
                     last_name_UA=?, first_name_UA=?, middle_name_UA=?,
                     last_name_ENG=?, first_name_ENG=?, birth_date=?,
-                    group_id=?, edebo_code=?
+                    group_id=?, edebo_code=?, {sort_keys.UPDATE_ASSIGNMENTS}
                 WHERE id=?
             """, (
                 request.form['last_name_UA'],
@@ -626,11 +652,12 @@ def edit_student(student_id):
                 birth_date,
                 group_int,
                 request.form.get('edebo_code'),
+                *sort_keys.values(request.form['last_name_UA'], request.form['first_name_UA'], request.form.get('middle_name_UA')),
                 student_id
             ))
             conn.commit()
 
-        log_action(session.get('username', 'невідомо'), f"редагував студента ID {student_id}", group_ids=[group_int])
+        log_action(session.get('username', 'невідомо'), f"редагував студента ID {student_id}", group_ids=[group_int], student_id=student_id)
         conn.close()
         return redirect(url_for('students.student_list'))
 
@@ -649,7 +676,7 @@ def delete_student(student_id):
         conn.execute("DELETE FROM activity_grades WHERE student_id = ?", (student_id,))
         conn.execute("DELETE FROM students WHERE id = ?", (student_id,))
         conn.commit()
-        log_action(session.get('username', 'невідомо'), f"видалив студента ID {student_id}: {student['last_name_UA']}", group_ids=[student['group_id']])
+        log_action(session.get('username', 'невідомо'), f"видалив студента ID {student_id}: {student['last_name_UA']}", group_ids=[student['group_id']], student_id=student_id)
     else:
         flash("Студента не знайдено")
     conn.close()
@@ -699,10 +726,10 @@ def add_military(student_id):
         conn.commit()
         conn.close()
 
-        log_action(session.get('username', 'невідомо'), f"додав військові дані для студента ID {student_id}", session.get('group_id'))
+        log_action(session.get('username', 'невідомо'), f"додав військові дані для студента ID {student_id}", session.get('group_id'), student_id=student_id)
         return redirect(url_for('students.student_list'))
 
-    log_action(session.get('username', 'невідомо'), f"відкрив форму додавання військових даних для студента ID {student_id}", session.get('group_id'))
+    log_action(session.get('username', 'невідомо'), f"відкрив форму додавання військових даних для студента ID {student_id}", session.get('group_id'), student_id=student_id)
     return render_template('add_military.html', student_id=student_id)
 
 @students_bp.route('/students/<int:student_id>/military', methods=['GET', 'POST'])
@@ -759,12 +786,12 @@ def military_data(student_id):
                 ) VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, ?)
             """, data)
         conn.commit()
-        log_action(session.get('username', 'невідомо'), f"змінив військові дані для студента ID {student_id}", session.get('group_id'))
+        log_action(session.get('username', 'невідомо'), f"змінив військові дані для студента ID {student_id}", session.get('group_id'), student_id=student_id)
         conn.close()
         return redirect(url_for('students.student_list'))
 
     conn.close()
-    log_action(session.get('username', 'невідомо'), f"відкрив форму редагування військових даних для студента ID {student_id}", session.get('group_id'))
+    log_action(session.get('username', 'невідомо'), f"відкрив форму редагування військових даних для студента ID {student_id}", session.get('group_id'), student_id=student_id)
     return render_template('edit_military.html', student_id=student_id, military=military)
 
 @students_bp.route('/students/<int:student_id>/military/delete')
@@ -774,7 +801,7 @@ def delete_military(student_id):
     conn = get_db()
     conn.execute("DELETE FROM military WHERE student_id = ?", (student_id,))
     conn.commit()
-    log_action(session.get('username', 'невідомо'), f"видалив військові дані для студента ID {student_id}")
+    log_action(session.get('username', 'невідомо'), f"видалив військові дані для студента ID {student_id}", student_id=student_id)
     conn.close()
     return redirect(url_for('students.student_list'))
 
@@ -836,31 +863,28 @@ def generate(student_id):
                 return redirect(url_for('students.student_list'))
 
             military_dict = dict(military) if military else {}
-            student_name_part = f"{student_dict['last_name_UA']}_{student_dict['first_name_UA']}".replace(" ", "_")
-            project_root = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
-            output_dir = os.path.join(project_root, 'generated_docs')
-            os.makedirs(output_dir, exist_ok=True)
-            output_path = os.path.join(output_dir, f"{student_name_part}.docx")
+            filename = document_filename(student_dict)
 
+            # Документ рендерится в память: на диске не остаётся файлов, и одноимённые студенты не перезаписывают друг друга
             try:
-                gen_doc(student_dict, military_dict, template=selected_template, out=output_path, user_name=session.get('username', 'невідомо'))
+                document = gen_doc(student_dict, military_dict, template=selected_template, user_name=session.get('username', 'невідомо'))
             except Exception as e:
                 logging.error(f"Помилка при генерації документа для студента ID {student_id}: {str(e)}")
                 flash(f"Помилка при генерації документа: {str(e)}")
                 return redirect(url_for('students.student_list'))
 
-            log_action(session.get('username', 'невідомо'), f"згенерував документ для студента ID {student_id}", session.get('group_id'))
+            log_action(session.get('username', 'невідомо'), f"згенерував документ для студента ID {student_id}", session.get('group_id'), student_id=student_id)
             try:
-                return send_file(output_path, as_attachment=True)
+                return send_file(document, as_attachment=True, download_name=filename, mimetype=DOCX_MIMETYPE)
             except Exception as e:
-                logging.error(f"Помилка при відправленні файлу {output_path}: {str(e)}")
+                logging.error(f"Помилка при відправленні файлу {filename}: {str(e)}")
                 flash(f"Помилка при відправленні файлу: {str(e)}")
                 return redirect(url_for('students.student_list'))
 
         flash("Студента не знайдено")
         return redirect(url_for('students.student_list'))
 
-    log_action(session.get('username', 'невідомо'), f"відкрив форму генерації документа для студента ID {student_id}", session.get('group_id'))
+    log_action(session.get('username', 'невідомо'), f"відкрив форму генерації документа для студента ID {student_id}", session.get('group_id'), student_id=student_id)
     return render_template('generate_word.html', student_id=student_id)
 
 @students_bp.route('/activities_grades/<int:student_id>', methods=['GET', 'POST'])
@@ -896,7 +920,7 @@ def edit_activities_grades(student_id):
         return redirect(url_for('students.student_list'))
 
     # Проверка доступа
-    if session.get('role') != 'admin' and student['group_id'] not in session.get('group_ids', []):
+    if not access.can_access_group(student['group_id']):
         conn.close()
         flash("Доступ заборонено: студент не належить до вашої групи", "error")
         return redirect(url_for('students.student_list'))
@@ -936,6 +960,8 @@ def edit_activities_grades(student_id):
 
     if request.method == 'POST':
         try:
+            upserts = []
+            deletes = []
             for entity_type, entities in [('practice', practices), ('coursework', courseworks), ('attestation', attestations)]:
                 for entity in entities:
                     grade_key = f'grade_{entity_type}_{entity["id"]}'
@@ -949,43 +975,27 @@ def edit_activities_grades(student_id):
                             if not 0 <= grade_value <= 100:
                                 flash(f"Некоректна оцінка для {entity['name']}: має бути від 0 до 100", "error")
                                 continue
-
-                            key = (entity['id'], entity_type)
-                            if key in grade_map:
-                                # Обновление существующей записи
-                                conn.execute("""
-                                    UPDATE activity_grades
-                                    SET grade = ?, name = ?
-                                    WHERE id = ? AND student_id = ? AND entity_id = ? AND entity_type = ?
-                                """, (grade_value, student_name, grade_map[key]['id'], student_id, entity['id'], entity_type))
-                            else:
-                                # Вставка новой записи
-                                conn.execute("""
-                                    INSERT INTO activity_grades (student_id, entity_id, entity_type, grade, name)
-                                    VALUES (?, ?, ?, ?, ?)
-                                """, (student_id, entity['id'], entity_type, grade_value, student_name))
+                            upserts.append((student_id, entity['id'], entity_type, grade_value, student_name))
                         except ValueError:
                             # Удаление записи при некорректной оценке
-                            conn.execute("""
-                                DELETE FROM activity_grades
-                                WHERE student_id = ? AND entity_id = ? AND entity_type = ?
-                            """, (student_id, entity['id'], entity_type))
+                            deletes.append((student_id, entity['id'], entity_type))
                             flash(f"Некоректна оцінка для {entity['name']}: має бути числом", "error")
                     else:
                         # Удаление записи при пустой оценке
-                        if key in grade_map:
-                            conn.execute("""
-                                DELETE FROM activity_grades
-                                WHERE id = ? AND student_id = ? AND entity_id = ? AND entity_type = ?
-                            """, (grade_map[key]['id'], student_id, entity['id'], entity_type))
-                        else:
-                            conn.execute("""
-                                DELETE FROM activity_grades
-                                WHERE student_id = ? AND entity_id = ? AND entity_type = ?
-                            """, (student_id, entity['id'], entity_type))
+                        deletes.append((student_id, entity['id'], entity_type))
+
+            conn.executemany("""
+                INSERT INTO activity_grades (student_id, entity_id, entity_type, grade, name)
+                VALUES (?, ?, ?, ?, ?)
+                ON CONFLICT (student_id, entity_type, entity_id) DO UPDATE SET grade = excluded.grade, name = excluded.name
+            """, upserts)
+            conn.executemany("""
+                DELETE FROM activity_grades
+                WHERE student_id = ? AND entity_id = ? AND entity_type = ?
+            """, deletes)
             conn.commit()
             flash("Оцінки успішно збережено", "success")
-            log_action(session.get('username', 'невідомо'), f"відредагував оцінки для студента ID {student_id}", [student['group_id']])
+            log_action(session.get('username', 'невідомо'), f"відредагував оцінки для студента ID {student_id}", [student['group_id']], student_id=student_id)
             conn.close()
             return redirect(url_for('students.student_list'))
         except Exception as e:
@@ -1031,20 +1041,18 @@ def edit_grades(student_id):
     grade_map = {g['subject_id']: g['grade'] for g in existing_grades}
 
     if request.method == 'POST':
+        rows = []
         for subject in subjects:
             grade_value = request.form.get(f'grade_{subject["id"]}')
             if grade_value:
-                if subject["id"] in grade_map:
-                    conn.execute("""
-                        UPDATE grades SET grade = ?
-                        WHERE student_id = ? AND subject_id = ?
-                    """, (grade_value, student_id, subject["id"]))
-                else:
-                    conn.execute("""
-                        INSERT INTO grades (student_id, subject_id, grade)
-                        VALUES (?, ?, ?)
-                    """, (student_id, subject["id"], grade_value))
+                rows.append((student_id, subject["id"], grade_value))
+        conn.executemany("""
+            INSERT INTO grades (student_id, subject_id, grade)
+            VALUES (?, ?, ?)
+            ON CONFLICT (student_id, subject_id) DO UPDATE SET grade = excluded.grade
+        """, rows)
         conn.commit()
+        conn.close()
         flash("Оцінки збережено")
         return redirect(url_for('students.student_list'))
 
@@ -1106,14 +1114,16 @@ def import_from_excel():
                 # Генерация английских имен
                 last_name_eng, first_name_eng = generate_english_name(last_name, first_name)
 
-                conn.execute("""
+                conn.execute(f"""
                     INSERT INTO students (
                         last_name_UA, first_name_UA, middle_name_UA,
-                        last_name_ENG, first_name_ENG, birth_date, group_id, edebo_code
-                    ) VALUES (?, ?, ?, ?, ?, ?, ?, ?)
+                        last_name_ENG, first_name_ENG, birth_date, group_id, edebo_code,
+                        {sort_keys.INSERT_COLUMNS}
+                    ) VALUES (?, ?, ?, ?, ?, ?, ?, ?, {sort_keys.INSERT_PLACEHOLDERS})
                 """, (
                     last_name, first_name, middle_name,
-                    last_name_eng, first_name_eng, birth_date, group_id, edebo_code
+                    last_name_eng, first_name_eng, birth_date, group_id, edebo_code,
+                    *sort_keys.values(last_name, first_name, middle_name)
                 ))
                 student_id = conn.execute("SELECT last_insert_rowid()").fetchone()[0]
 
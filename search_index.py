@@ -0,0 +1,91 @@
+"""Полнотекстовый индекс FTS5 для поиска студентов.
+
+Таблица students_fts хранит ФИО (UA и ENG), код ЄДЕБО и название группы,
+rowid совпадает с students.id. Синхронизация выполняется триггерами SQLite.
+"""
+
+FTS_COLUMNS = [
+    'last_name_UA', 'first_name_UA', 'middle_name_UA',
+    'last_name_ENG', 'first_name_ENG', 'edebo_code', 'group_name'
+]
+
+STUDENT_COLUMNS = FTS_COLUMNS[:-1]
+
+
+def _index_students_sql(condition):
+    """Добавляет в индекс студентов, подходящих под условие."""
+    columns = ', '.join(f's.{column}' for column in STUDENT_COLUMNS)
+    return f"""
+        INSERT INTO students_fts (rowid, {', '.join(FTS_COLUMNS)})
+        SELECT s.id, {columns}, g.name
+        FROM students s
+        LEFT JOIN groups g ON g.id = s.group_id
+        WHERE {condition};
+    """
+
+
+def schema_sql():
+    """DDL таблицы FTS5 и триггеров синхронизации."""
+    return f"""
+    CREATE VIRTUAL TABLE IF NOT EXISTS students_fts USING fts5(
+        {', '.join(FTS_COLUMNS)},
+        tokenize = 'unicode61 remove_diacritics 2',
+        prefix = '2 3'
+    );
+
+    CREATE TRIGGER IF NOT EXISTS trg_students_fts_insert
+    AFTER INSERT ON students
+    BEGIN
+        {_index_students_sql('s.id = NEW.id')}
+    END;
+
+    CREATE TRIGGER IF NOT EXISTS trg_students_fts_update
+    AFTER UPDATE OF {', '.join(STUDENT_COLUMNS)}, group_id ON students
+    BEGIN
+        DELETE FROM students_fts WHERE rowid = OLD.id;
+        {_index_students_sql('s.id = NEW.id')}
+    END;
+
+    CREATE TRIGGER IF NOT EXISTS trg_students_fts_delete
+    AFTER DELETE ON students
+    BEGIN
+        DELETE FROM students_fts WHERE rowid = OLD.id;
+    END;
+
+    CREATE TRIGGER IF NOT EXISTS trg_students_fts_group_rename
+    AFTER UPDATE OF name ON groups
+    BEGIN
+        UPDATE students_fts SET group_name = NEW.name
+        WHERE rowid IN (SELECT id FROM students WHERE group_id = NEW.id);
+    END;
+    """
+
+
+def rebuild(conn):
+    """Полностью перестраивает индекс по текущим данным."""
+    conn.execute("DELETE FROM students_fts")
+    conn.execute(_index_students_sql('1'))
+    conn.commit()
+
+
+def install(conn):
+    """Создаёт индекс и триггеры, при первом запуске заполняет индекс."""
+    exists = conn.execute(
+        "SELECT 1 FROM sqlite_master WHERE type = 'table' AND name = 'students_fts'"
+    ).fetchone()
+    conn.executescript(schema_sql())
+    if not exists:
+        rebuild(conn)
+
+
+def build_match_query(search):
+    """Превращает строку поиска в выражение MATCH.
+
+    Каждое слово ищется как префикс, все слова должны встретиться:
+    "Шевч Тар" -> "Шевч"* AND "Тар"*. Возвращает None для пустого поиска.
+    """
+    terms = [term.replace('"', '""') for term in search.split()]
+    terms = [term for term in terms if term.strip('"')]
+    if not terms:
+        return None
+    return ' AND '.join(f'"{term}"*' for term in terms)
@@ -0,0 +1,81 @@
+"""Хранимые ключи сортировки ФИО студентов по украинскому алфавиту.
+
+Колонки *_sort_key таблицы students вычисляются в Python (db.ukrainian_sort_key)
+там, где приложение записывает ФИО, и индексируются, поэтому сортировка по ФИО
+не вызывает колляцию для каждого сравнения. Триггеров нет: функция
+ukrainian_sort_key зарегистрирована только на соединениях приложения, а база
+должна оставаться доступной для записи из sqlite3, DB Browser и скриптов.
+Студенты, добавленные в обход приложения, получают ключи при запуске модуля
+как скрипта (python sort_keys.py).
+"""
+from db import ukrainian_sort_key
+
+SORT_KEY_COLUMNS = {
+    'last_name_sort_key': 'last_name_UA',
+    'first_name_sort_key': 'first_name_UA',
+    'middle_name_sort_key': 'middle_name_UA',
+}
+
+# Колонки ключей в порядке значений values()
+SORT_KEY_FIELDS = [*SORT_KEY_COLUMNS, 'full_name_sort_key']
+
+# Фрагменты SQL для INSERT и UPDATE студентов; параметры — values()
+INSERT_COLUMNS = ', '.join(SORT_KEY_FIELDS)
+INSERT_PLACEHOLDERS = ', '.join('?' for _ in SORT_KEY_FIELDS)
+UPDATE_ASSIGNMENTS = ', '.join(f"{field} = ?" for field in SORT_KEY_FIELDS)
+
+
+def values(last_name, first_name, middle_name):
+    """Ключи сортировки для ФИО в порядке SORT_KEY_FIELDS."""
+    keys = [ukrainian_sort_key(name) for name in (last_name, first_name, middle_name)]
+    return (*keys, '\x01'.join(keys))
+
+
+def schema_sql():
+    """DDL индексов для ключей сортировки."""
+    return """
+    CREATE INDEX IF NOT EXISTS idx_students_last_name_sort ON students (last_name_sort_key, id);
+    CREATE INDEX IF NOT EXISTS idx_students_first_name_sort ON students (first_name_sort_key, id);
+    CREATE INDEX IF NOT EXISTS idx_students_middle_name_sort ON students (middle_name_sort_key, id);
+    CREATE INDEX IF NOT EXISTS idx_students_group_full_name_sort ON students (group_id, full_name_sort_key);
+    """
+
+
+def drop_triggers(conn):
+    """Удаляет триггеры прежней версии, которые вызывали ukrainian_sort_key из SQL."""
+    conn.execute("DROP TRIGGER IF EXISTS trg_students_sort_keys_insert")
+    conn.execute("DROP TRIGGER IF EXISTS trg_students_sort_keys_update")
+
+
+def rebuild(conn):
+    """Пересчитывает ключи сортировки для всех студентов; возвращает количество изменённых."""
+    rows = conn.execute(f"""
+        SELECT id, {', '.join(SORT_KEY_COLUMNS.values())}, {INSERT_COLUMNS} FROM students
+    """).fetchall()
+    changed = []
+    for row in rows:
+        keys = values(row[1], row[2], row[3])
+        if keys != tuple(row[4:]):
+            changed.append((*keys, row[0]))
+    conn.executemany(f"UPDATE students SET {UPDATE_ASSIGNMENTS} WHERE id = ?", changed)
+    conn.commit()
+    return len(changed)
+
+
+def install(conn):
+    """Добавляет колонки ключей и индексы; заполняет новые колонки."""
+    existing = {row[1] for row in conn.execute("PRAGMA table_info(students)")}
+    missing = [key for key in SORT_KEY_FIELDS if key not in existing]
+    for key in missing:
+        conn.execute(f"ALTER TABLE students ADD COLUMN {key} TEXT NOT NULL DEFAULT ''")
+    conn.executescript(schema_sql())
+    if missing:
+        rebuild(conn)
+
+
+if __name__ == '__main__':
+    from db import connect
+
+    conn = connect()
+    print(f"Оновлено ключі сортування студентів: {rebuild(conn)}")
+    conn.dispose()
@@ -0,0 +1,140 @@
+"""Профилирование SQL по HTTP-запросам и поиск N+1.
+
+Включается SQL_PROFILING = True в config.py (или SQL_PROFILING=1 в окружении).
+Соединение запроса (db.get_db) сообщает профилю каждый выполненный запрос с
+его длительностью, включая выборку строк (fetch*/итерация курсора), а set_trace_callback дополнительно считает все операторы,
+которые выполнила SQLite, включая тела триггеров. Итоги запроса отдаются в
+заголовках X-SQL-Count / X-SQL-Time и накапливаются по маршрутам для
+страницы /admin/sql_profile.
+"""
+import re
+import threading
+from collections import Counter
+
+from flask import g, request
+
+from config import SQL_PROFILING, SQL_PROFILER_SLOWEST, SQL_N_PLUS_ONE_THRESHOLD
+from utils import logger
+
+_STRING = re.compile(r"'(?:[^']|'')*'")
+_NUMBER = re.compile(r"\b\d+(?:\.\d+)?\b")
+_IN_LIST = re.compile(r"\(\s*\?(?:\s*,\s*\?)+\s*\)")
+_SPACES = re.compile(r"\s+")
+
+
+def normalize(sql):
+    """Приводит запрос к шаблону: литералы и списки IN заменяются на ?."""
+    sql = _STRING.sub('?', sql)
+    sql = _NUMBER.sub('?', sql)
+    sql = _IN_LIST.sub('(?, ...)', sql)
+    return _SPACES.sub(' ', sql).strip()
+
+
+class RequestProfile:
+    """Запросы к БД, выполненные за один HTTP-запрос."""
+
+    def __init__(self):
+        self.statements = []
+        self.traced = 0
+
+    def record(self, sql, elapsed):
+        """Добавляет запрос; возвращает его номер для add_time()."""
+        self.statements.append((normalize(sql), elapsed))
+        return len(self.statements) - 1
+
+    def add_time(self, index, elapsed):
+        """Добавляет к запросу время выборки его строк."""
+        sql, total = self.statements[index]
+        self.statements[index] = (sql, total + elapsed)
+
+    def trace(self, sql):
+        self.traced += 1
+
+    @property
+    def count(self):
+        return len(self.statements)
+
+    @property
+    def total_time(self):
+        return sum(elapsed for _, elapsed in self.statements)
+
+    def slowest(self, limit=SQL_PROFILER_SLOWEST):
+        return sorted(self.statements, key=lambda item: item[1], reverse=True)[:limit]
+
+    def n_plus_one(self, threshold=SQL_N_PLUS_ONE_THRESHOLD):
+        """Шаблоны запросов, повторённые не меньше threshold раз."""
+        repeats = Counter(sql for sql, _ in self.statements)
+        return {sql: count for sql, count in repeats.items() if count >= threshold}
+
+
+class ProfileStore:
+    """Накопленная статистика по маршрутам."""
+
+    def __init__(self):
+        self._routes = {}
+        self._lock = threading.Lock()
+
+    def add(self, route, profile):
+        total_time = profile.total_time
+        suspects = profile.n_plus_one()
+        with self._lock:
+            stats = self._routes.setdefault(route, {
+                'route': route, 'requests': 0, 'queries': 0, 'max_queries': 0,
+                'traced': 0, 'time': 0.0, 'max_time': 0.0, 'n_plus_one': {}, 'slowest': [],
+            })
+            stats['requests'] += 1
+            stats['queries'] += profile.count
+            stats['max_queries'] = max(stats['max_queries'], profile.count)
+            stats['traced'] += profile.traced
+            stats['time'] += total_time
+            stats['max_time'] = max(stats['max_time'], total_time)
+            for sql, count in suspects.items():
+                stats['n_plus_one'][sql] = max(stats['n_plus_one'].get(sql, 0), count)
+            slowest = stats['slowest'] + profile.slowest()
+            stats['slowest'] = sorted(slowest, key=lambda item: item[1], reverse=True)[:SQL_PROFILER_SLOWEST]
+
+    def worst_routes(self, limit=50):
+        """Маршруты, отсортированные по среднему времени SQL на запрос."""
+        with self._lock:
+            routes = [dict(stats, n_plus_one=dict(stats['n_plus_one'])) for stats in self._routes.values()]
+        for stats in routes:
+            stats['avg_time'] = stats['time'] / stats['requests']
+            stats['avg_queries'] = stats['queries'] / stats['requests']
+        return sorted(routes, key=lambda stats: stats['avg_time'], reverse=True)[:limit]
+
+    def reset(self):
+        with self._lock:
+            self._routes.clear()
+
+
+store = ProfileStore()
+
+
+def current_profile():
+    """Профиль текущего HTTP-запроса или None, если профилирование выключено."""
+    return g.get('sql_profile')
+
+
+def _start_profile():
+    g.sql_profile = RequestProfile()
+
+
+def _finish_profile(response):
+    profile = g.pop('sql_profile', None)
+    if profile is None:
+        return response
+    response.headers['X-SQL-Count'] = str(profile.count)
+    response.headers['X-SQL-Time'] = f"{profile.total_time * 1000:.2f}"
+
+    route = request.endpoint or request.path
+    store.add(route, profile)
+    for sql, count in profile.n_plus_one().items():
+        logger.warning(f"Можливий N+1 у {route}: {count} однакових запитів: {sql[:200]}")
+    return response
+
+
+def init_app(app):
+    if not SQL_PROFILING:
+        return
+    app.before_request(_start_profile)
+    app.after_request(_finish_profile)
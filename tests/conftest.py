@@ -0,0 +1,124 @@
+"""Общие фикстуры тестов: приложение на временной базе с небольшим набором данных."""
+import os
+import sys
+import tempfile
+
+import pytest
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, ROOT)
+
+# config.DB_PATH читается при импорте, поэтому база задаётся до импорта приложения
+os.environ['STUDENTS_DB'] = os.path.join(tempfile.mkdtemp(prefix='students-tests-'), 'students.db')
+
+GROUP_STUDENTS = 120
+GROUP_SUBJECTS = 5
+OTHER_GROUP_STUDENTS = 3
+
+
+def add_group(conn, name):
+    return conn.execute("""
+        INSERT INTO groups (name, start_year, study_form, program_credits, degree_level, degree_level_en,
+                            knowledge_area, knowledge_area_en, specialty, specialty_en,
+                            educational_program, educational_program_en, qualification_name, qualification_name_en)
+        VALUES (?, 2022, 'Денна', 240, 'бакалавр', 'Bachelor', 'Інформаційні технології', 'IT',
+                '121 Інженерія ПЗ', '121 Software Engineering', 'Інженерія ПЗ', 'Software Engineering',
+                'Бакалавр', 'Bachelor')
+    """, (name,)).lastrowid
+
+
+def seed(conn):
+    """Администратор, группа с учебным планом и студенты с частью оценок.
+
+    Вторая группа без учебного плана доступна только администратору, куратор
+    (curator) видит лишь первую.
+    """
+    from werkzeug.security import generate_password_hash
+    import sort_keys
+
+    conn.execute(
+        "INSERT INTO users (username, password_hash, role, is_admin) VALUES (?, ?, 'admin', 1)",
+        ('admin', generate_password_hash('admin123'))
+    )
+    group_id = add_group(conn, 'КН-1')
+    other_group_id = add_group(conn, 'КН-2')
+    curator_id = conn.execute(
+        "INSERT INTO users (username, password_hash, role) VALUES (?, ?, 'user')",
+        ('curator', generate_password_hash('curator123'))
+    ).lastrowid
+    conn.execute("INSERT INTO user_groups (user_id, group_id) VALUES (?, ?)", (curator_id, group_id))
+    for i in range(OTHER_GROUP_STUDENTS):
+        conn.execute(
+            "INSERT INTO students (last_name_UA, first_name_UA, group_id) VALUES (?, 'Олена', ?)",
+            (f'Коваль{i}', other_group_id)
+        )
+    subject_ids = [
+        conn.execute(
+            "INSERT INTO subjects (code, name, credits, group_id, position) VALUES (?, ?, 4, ?, ?)",
+            (f'ОК{i}', f'Дисципліна {i}', group_id, i)
+        ).lastrowid
+        for i in range(1, GROUP_SUBJECTS + 1)
+    ]
+    practice_id = conn.execute(
+        "INSERT INTO practices (code, name, credits, type, position, group_id) VALUES ('П1', 'Практика', 6, 'Залік', 1, ?)",
+        (group_id,)
+    ).lastrowid
+    coursework_id = conn.execute(
+        "INSERT INTO courseworks (code, name, credits, type, position, group_id) VALUES ('К1', 'Курсова', 3, 'Екзамен', 1, ?)",
+        (group_id,)
+    ).lastrowid
+    for i in range(GROUP_STUDENTS):
+        student_id = conn.execute("""
+            INSERT INTO students (last_name_UA, first_name_UA, middle_name_UA, last_name_ENG, first_name_ENG,
+                                  birth_date, group_id, edebo_code)
+            VALUES (?, ?, 'Іванович', ?, 'Ivan', '01.01.2004', ?, ?)
+        """, (f'Петренко{i}', 'Іван', f'Petrenko{i}', group_id, str(10000 + i))).lastrowid
+        # У i-го студента заполнено i % (GROUP_SUBJECTS + 1) оценок, у каждого третьего следующая оценка пустая;
+        # у чётных оценена практика, у каждого третьего курсовая есть без оценки
+        filled = i % (GROUP_SUBJECTS + 1)
+        for subject_id in subject_ids[:filled]:
+            conn.execute("INSERT INTO grades (student_id, subject_id, grade) VALUES (?, ?, '90')", (student_id, subject_id))
+        if i % 3 == 0 and filled < GROUP_SUBJECTS:
+            conn.execute("INSERT INTO grades (student_id, subject_id, grade) VALUES (?, ?, '  ')", (student_id, subject_ids[filled]))
+        if i % 2 == 0:
+            conn.execute(
+                "INSERT INTO activity_grades (student_id, entity_id, entity_type, grade) VALUES (?, ?, 'practice', 85)",
+                (student_id, practice_id)
+            )
+        if i % 3 == 0:
+            conn.execute(
+                "INSERT INTO activity_grades (student_id, entity_id, entity_type, grade) VALUES (?, ?, 'coursework', NULL)",
+                (student_id, coursework_id)
+            )
+    conn.commit()
+    # Данные вставлены в обход маршрутов — ключи сортировки ФИО считаются так же, как для внешних скриптов
+    sort_keys.rebuild(conn)
+
+
+@pytest.fixture(scope='session')
+def app():
+    from app import app as flask_app
+    from db import get_db
+
+    flask_app.config['TESTING'] = True
+    with flask_app.app_context():
+        conn = get_db()
+        seed(conn)
+        conn.close()
+    yield flask_app
+    import audit
+    audit.writer.flush()
+
+
+@pytest.fixture
+def client(app):
+    client = app.test_client()
+    client.post('/login', data={'username': 'admin', 'password': 'admin123'})
+    return client
+
+
+@pytest.fixture
+def curator_client(app):
+    client = app.test_client()
+    client.post('/login', data={'username': 'curator', 'password': 'curator123'})
+    return client
@@ -0,0 +1,112 @@
+"""Журнал действий: ошибки пачки не останавливают поток записи, события видны на /admin/audit_log."""
+import os
+import threading
+from datetime import datetime
+
+import pytest
+from flask import template_rendered
+
+import audit
+import db
+
+
+def event(action, group_ids=None):
+    return {
+        'created_at': datetime.now().strftime('%Y-%m-%d %H:%M:%S'),
+        'user_id': None, 'username': 'tester', 'role': 'admin', 'action': action,
+        'mode': None, 'student_id': None, 'group_ids': group_ids,
+    }
+
+
+def flush(writer, timeout=10):
+    """flush() с ограничением времени: зависание считается ошибкой теста."""
+    thread = threading.Thread(target=writer.flush, daemon=True)
+    thread.start()
+    thread.join(timeout)
+    assert not thread.is_alive(), 'flush() не дождался записи очереди'
+
+
+def logged(action):
+    conn = db.connect()
+    try:
+        return conn.execute("SELECT COUNT(*) FROM audit_log WHERE action = ?", (action,)).fetchone()[0]
+    finally:
+        conn.dispose()
+
+
+@pytest.fixture
+def writer(app):
+    return audit.AuditWriter()
+
+
+def test_failed_batch_does_not_stop_writer(writer):
+    # Множество не сериализуется в JSON — пачка с ним завершается TypeError
+    writer.submit(event('зламана подія', group_ids={1}))
+    flush(writer)
+    writer.submit(event('подія після помилки', group_ids=[1]))
+    flush(writer)
+
+    assert writer._thread.is_alive()
+    assert logged('подія після помилки') == 1
+
+
+def test_dead_thread_is_restarted(writer):
+    writer.submit(event('перша подія'))
+    flush(writer)
+    # Имитация потока, который завершился
+    dead = threading.Thread(target=lambda: None)
+    dead.start()
+    dead.join()
+    writer._thread = dead
+
+    writer.submit(event('подія після перезапуску'))
+    flush(writer)
+
+    assert writer._thread is not dead and writer._thread.is_alive()
+    assert logged('подія після перезапуску') == 1
+
+
+def test_failed_batch_keeps_valid_events(writer, caplog):
+    # Три события попадают в одну пачку: очередь заполняется до запуска потока
+    writer._pid = os.getpid()
+    for item in (event('до зламаної'), event('зламана в пачці', group_ids={1}), event('після зламаної', group_ids=[1])):
+        writer._queue.put(item)
+    writer._ensure_started()
+    flush(writer)
+
+    assert logged('до зламаної') == 1
+    assert logged('після зламаної') == 1
+    assert logged('зламана в пачці') == 0
+    dropped = [record.message for record in caplog.records if 'пропущено' in record.message]
+    assert len(dropped) == 1 and 'зламана в пачці' in dropped[0]
+
+
+def rendered_events(client, app, **filters):
+    captured = []
+
+    def record(sender, template, context, **extra):
+        if 'events' in context:
+            captured.append(context['events'])
+
+    template_rendered.connect(record, app)
+    try:
+        response = client.get('/admin/audit_log', query_string=filters)
+    finally:
+        template_rendered.disconnect(record, app)
+    assert response.status_code == 200
+    return [(item['username'], item['action']) for item in captured[0]]
+
+
+def test_audit_log_view_filters_events(app, client):
+    conn = db.connect()
+    first, second = [row['id'] for row in conn.execute("SELECT id FROM groups ORDER BY name")][:2]
+    conn.dispose()
+    writer = audit.AuditWriter()
+    writer.submit(dict(event('подія першої групи', group_ids=[first]), username='audit-a', role='user'))
+    writer.submit(dict(event('подія другої групи', group_ids=[second]), username='audit-a', role='user'))
+    writer.submit(dict(event('подія іншого користувача'), username='audit-b', created_at='2020-01-01 10:00:00'))
+    flush(writer)
+
+    assert rendered_events(client, app, username='audit-a', group_id=first) == [('audit-a', 'подія першої групи')]
+    assert rendered_events(client, app, date_to='2020-01-01') == [('audit-b', 'подія іншого користувача')]
+    assert ('audit-b', 'подія іншого користувача') not in rendered_events(client, app, date_from='2021-01-01')
@@ -0,0 +1,121 @@
+"""Кэшированные шаблоны DOCX дают тот же документ, что и DocxTemplate.
+
+Проверяются оптимизации рендеринга копии: пакет без тела и resolve_listing
+только по нужным абзацам.
+"""
+import io
+import zipfile
+
+import docx
+import pytest
+from docxtpl import DocxTemplate
+from jinja2 import Environment
+
+import docx_templates
+import gen_docx
+
+GROUP = {
+    'group_name': 'КН-1 (2022, Денна, 240 кредитів)', 'degree_level': 'Бакалавр', 'study_years': '4',
+    'study_form_eu': 'Full', 'end_year': '2026', 'end_year_short': '26',
+    'learning_outcomes': ['Результат 1', 'Результат 2'], 'program_includes_en': ['Subjects'],
+    'accreditation_text': 'Сертифікат', 'accreditation_text_en': 'Certificate',
+}
+STUDENTS = [
+    {**GROUP, 'id': 1, 'last_name_UA': 'Петренко', 'first_name_UA': 'Іван', 'document_number': 'АА 1'},
+    {**GROUP, 'id': 2, 'last_name_UA': 'Коваль', 'first_name_UA': 'Олена', 'document_number': ''},
+]
+
+DOCUMENT_PARAGRAPHS = [
+    'Диплом {{ group_name }} {{ degree_level|upper }} {{ study_years }} роки, {{ end_year_short }}',
+    '{{ last_name_UA }} {{ first_name_UA }} — {{ group_name }}',
+    '{% for line in learning_outcomes %}{{ loop.index }}. {{ line }}; {% endfor %}',
+    '{% for line in learning_outcomes %}{{ line }} ({{ last_name_UA }}) {% endfor %}',
+    '{% if document_number %}{{ document_number }}{% else %}{{ accreditation_text }}{% endif %}',
+    '{% set degree_level = last_name_UA %}{{ degree_level }}',
+    '{{ learning_outcomes }} {{ program_includes_en|join(", ") }} {{ accreditation_text_en|lower }}',
+]
+
+
+LISTING_VALUES = ['без спецсимволів', 'колонка\tтаб', 'рядок\nрядок', 'абзац\aабзац', 'сторінка\fсторінка']
+
+
+@pytest.mark.parametrize('values', [LISTING_VALUES, LISTING_VALUES[:1]])
+def test_resolve_listing_matches_docxtpl(tmp_path, values):
+    template = make_template(tmp_path / 'template.docx', ['{{ value }}'])
+    paragraphs = ''.join(
+        f'<w:p><w:pPr><w:jc w:val="center"/></w:pPr><w:r><w:rPr><w:b/></w:rPr><w:t>{value}</w:t></w:r></w:p>'
+        for value in values
+    )
+    xml = f'<w:body>{paragraphs}<w:tbl><w:tr><w:tc>{paragraphs}</w:tc></w:tr></w:tbl><w:sectPr/></w:body>'
+
+    assert docx_templates.load(template).resolve_listing(xml) == DocxTemplate(template).resolve_listing(xml)
+
+
+def render_plain(template, context, **kwargs):
+    document = DocxTemplate(template)
+    document.render(dict(context), **kwargs)
+    out = io.BytesIO()
+    document.save(out)
+    return package_parts(out.getvalue())
+
+
+def render_cached(template, context, **kwargs):
+    document = docx_templates.load(template)
+    document.render(dict(context), **kwargs)
+    out = io.BytesIO()
+    document.save(out)
+    return package_parts(out.getvalue())
+
+
+@pytest.mark.parametrize('value', LISTING_VALUES)
+def test_cached_document_matches_docxtpl(tmp_path, value):
+    template = make_template(tmp_path / 'template.docx', DOCUMENT_PARAGRAPHS + ['{{ value }}'], header='{{ value }}')
+    context = dict(STUDENTS[0], value=value)
+
+    assert render_cached(template, context) == render_plain(template, context)
+
+
+@pytest.mark.parametrize('kwargs', [{'autoescape': True}, {'jinja_env': Environment()}])
+def test_custom_environment_renders_original_body(tmp_path, kwargs):
+    template = make_template(tmp_path / 'template.docx', DOCUMENT_PARAGRAPHS, header='{{ last_name_UA }} & Co')
+
+    assert render_cached(template, STUDENTS[0], **kwargs) == render_plain(template, STUDENTS[0], **kwargs)
+
+
+def test_package_copy_has_empty_body(tmp_path):
+    template = make_template(tmp_path / 'template.docx', DOCUMENT_PARAGRAPHS)
+    compiled = docx_templates.cache.get(template)
+
+    body = docx.Document(io.BytesIO(compiled.package)).element.body
+
+    assert len(body) == 0
+    assert package_parts(compiled.package).keys() == package_parts(compiled.data).keys()
+
+
+def make_template(path, paragraphs, header=None):
+    document = docx.Document()
+    for text in paragraphs:
+        document.add_paragraph(text)
+    if header is not None:
+        document.sections[0].header.paragraphs[0].text = header
+    document.save(path)
+    return str(path)
+
+
+def package_parts(data):
+    with zipfile.ZipFile(io.BytesIO(data)) as package:
+        return {name: package.read(name) for name in package.namelist()}
+
+
+def rendered(context, template):
+    out = io.BytesIO()
+    gen_docx.render_document(dict(context), template, out)
+    return package_parts(out.getvalue())
+
+
+@pytest.mark.parametrize('paragraph', DOCUMENT_PARAGRAPHS)
+def test_render_document_matches_docxtpl(tmp_path, paragraph):
+    template = make_template(tmp_path / 'template.docx', [paragraph], header='{{ group_name }} / {{ last_name_UA }}')
+
+    for student in STUDENTS:
+        assert rendered(student, template) == render_plain(template, student)
@@ -0,0 +1,114 @@
+"""Задания экспорта: недописанные архивы удаляются, устаревшие задания очищаются, сбои не останавливают поток."""
+import json
+import sqlite3
+import time
+from datetime import datetime, timedelta
+
+import pytest
+
+import db
+import export_jobs
+
+
+@pytest.fixture
+def conn(app):
+    conn = db.connect()
+    yield conn
+    conn.execute("DELETE FROM export_jobs")
+    conn.commit()
+    conn.dispose()
+
+
+def test_failed_archive_leaves_no_partial_file(monkeypatch, tmp_path, conn):
+    def broken_archive(*args, **kwargs):
+        yield b'PK'
+        raise RuntimeError('рендеринг перервано')
+
+    monkeypatch.setattr(export_jobs, 'prepare_documents', lambda *args: ([], []))
+    monkeypatch.setattr(export_jobs, 'iter_archive', broken_archive)
+    zip_path = tmp_path / 'job_1.zip'
+
+    with pytest.raises(RuntimeError):
+        export_jobs.write_archive(conn, [], 'template.docx', str(zip_path), 'admin')
+
+    assert list(tmp_path.iterdir()) == []
+
+
+def add_job(conn, tmp_path, status, age_days):
+    finished_at = (datetime.now() - timedelta(days=age_days)).strftime('%Y-%m-%d %H:%M:%S')
+    job_id = conn.execute("""
+        INSERT INTO export_jobs (created_at, finished_at, username, status, params)
+        VALUES (?, ?, 'admin', ?, ?)
+    """, (finished_at, finished_at if status != 'running' else None, status, json.dumps({}))).lastrowid
+    path = tmp_path / f'job_{job_id}.zip'
+    path.write_bytes(b'PK')
+    conn.execute("UPDATE export_jobs SET result_path = ? WHERE id = ?", (str(path), job_id))
+    conn.commit()
+    return job_id, path
+
+
+def test_purge_expired_removes_old_jobs_and_archives(tmp_path, conn):
+    old_done, old_done_path = add_job(conn, tmp_path, 'done', 10)
+    old_failed, _ = add_job(conn, tmp_path, 'failed', 10)
+    fresh, fresh_path = add_job(conn, tmp_path, 'done', 1)
+    running, running_path = add_job(conn, tmp_path, 'running', 10)
+
+    assert export_jobs.purge_expired(conn, days=7) == 2
+
+    remaining = {row['id'] for row in conn.execute("SELECT id FROM export_jobs")}
+    assert remaining == {fresh, running}
+    assert not old_done_path.exists()
+    assert fresh_path.exists() and running_path.exists()
+
+
+def wait_for_status(conn, job_id, status, timeout=10):
+    deadline = time.monotonic() + timeout
+    while time.monotonic() < deadline:
+        conn.rollback()
+        job = export_jobs.get(conn, job_id)
+        if job['status'] == status:
+            return job
+        time.sleep(0.05)
+    raise AssertionError(f'завдання #{job_id} не перейшло в статус {status}')
+
+
+def test_failure_in_failure_path_marks_job_failed(monkeypatch, tmp_path, conn):
+    template = tmp_path / 'template.docx'
+    template.write_bytes(b'PK')
+    monkeypatch.setattr(export_jobs, 'EXPORT_DIR', str(tmp_path / 'exports'))
+    monkeypatch.setattr(export_jobs, 'select_students', lambda *args: [{'id': 1}])
+    monkeypatch.setattr(export_jobs, 'archive_name', lambda *args: ('КН-1', 'КН-1.zip'))
+
+    def broken_archive(conn, students, template, zip_path, username, progress=None):
+        # Недописанный архив, который write_archive не успел удалить
+        with open(f"{zip_path}.part", 'wb') as f:
+            f.write(b'PK')
+        raise RuntimeError('рендеринг перервано')
+
+    monkeypatch.setattr(export_jobs, 'write_archive', broken_archive)
+    fail = export_jobs.ExportRunner._fail
+    calls = []
+
+    def locked_once(self, conn, job_id, error):
+        calls.append(job_id)
+        if len(calls) == 1:
+            raise sqlite3.OperationalError('database is locked')
+        fail(self, conn, job_id, error)
+
+    monkeypatch.setattr(export_jobs.ExportRunner, '_fail', locked_once)
+    params = json.dumps({'template': str(template)})
+    first, second = [
+        conn.execute("INSERT INTO export_jobs (created_at, username, params) VALUES (?, 'admin', ?)",
+                     (export_jobs._now(), params)).lastrowid
+        for _ in range(2)
+    ]
+    conn.commit()
+
+    runner = export_jobs.ExportRunner()
+    runner.wake()
+
+    # Первое задание отмечено ошибкой, которая вышла из _execute; второе — обычной ошибкой рендеринга
+    assert wait_for_status(conn, first, 'failed')['error'] == 'database is locked'
+    assert wait_for_status(conn, second, 'failed')['error'] == 'рендеринг перервано'
+    assert list((tmp_path / 'exports').iterdir()) == []
+    assert runner._thread.is_alive()
@@ -0,0 +1,116 @@
+"""Контекст документов: общая часть группы кэшируется, но документ получает прежние типы."""
+import io
+import zipfile
+
+import docx
+import pytest
+
+import gen_docx
+
+STUDENT = {
+    'id': 1, 'group_id': 1, 'last_name_UA': 'Петренко', 'first_name_UA': 'Іван', 'birth_date': '01.01.2004',
+    'group_name': 'КН-1 (2022, Денна, 240 кредитів)', 'start_year': 2022, 'study_form': 'Денна',
+    'program_credits': 240, 'degree_level': 'Бакалавр',
+    'learning_outcomes': 'Результат 1\nРезультат 2\n', 'learning_outcomes_en': 'Outcome 1\nOutcome 2',
+    'program_includes': 'Дисципліни', 'program_includes_en': 'Subjects',
+}
+
+
+@pytest.fixture(autouse=True)
+def fresh_group_contexts():
+    gen_docx.group_contexts.clear()
+    yield
+    gen_docx.group_contexts.clear()
+
+
+def make_template(path, *paragraphs):
+    document = docx.Document()
+    for text in paragraphs:
+        document.add_paragraph(text)
+    document.save(path)
+    return str(path)
+
+
+def document_xml(data):
+    with zipfile.ZipFile(io.BytesIO(data)) as package:
+        return package.read('word/document.xml').decode('utf-8')
+
+
+@pytest.mark.parametrize('field', gen_docx.GROUP_LINE_FIELDS)
+def test_line_fields_are_lists_in_document_context(tmp_path, field):
+    template = make_template(tmp_path / 'template.docx', '{{ student_name }}')
+
+    context = gen_docx.prepare_context(dict(STUDENT), {}, template, {})
+
+    assert isinstance(context[field], list)
+
+
+def test_document_context_does_not_change_cached_group_context(tmp_path):
+    template = make_template(tmp_path / 'template.docx', '{{ learning_outcomes }}')
+
+    first = gen_docx.prepare_context(dict(STUDENT), {}, template, {})
+    first['learning_outcomes'].append('Зайвий рядок')
+    first['study_years'] = '10'
+    second = gen_docx.prepare_context(dict(STUDENT), {}, template, {})
+
+    assert second['learning_outcomes'] == ['Результат 1', 'Результат 2']
+    assert second['study_years'] == '4'
+
+
+def test_list_fields_render_as_lists(tmp_path):
+    template = make_template(tmp_path / 'template.docx', '{{ learning_outcomes }}', '{{ program_includes_en }}')
+    context = gen_docx.prepare_context(dict(STUDENT), {}, template, {})
+
+    out = io.BytesIO()
+    gen_docx.render_document(context, template, out)
+    xml = document_xml(out.getvalue())
+
+    assert "['Результат 1', 'Результат 2']" in xml
+    assert "['Subjects']" in xml
+
+
+FOOTNOTES_XML = (
+    '<?xml version="1.0" encoding="UTF-8" standalone="yes"?>'
+    '<w:footnotes xmlns:w="http://schemas.openxmlformats.org/wordprocessingml/2006/main">'
+    '<w:footnote w:id="1"><w:p><w:r><w:t>{{ diploma_number }}</w:t></w:r></w:p></w:footnote>'
+    '</w:footnotes>'
+)
+
+
+def add_footnotes(path, xml):
+    """Добавляет в пакет DOCX часть сносок с текстом xml."""
+    with zipfile.ZipFile(path) as source:
+        entries = {info.filename: source.read(info) for info in source.infolist()}
+    entries['word/footnotes.xml'] = xml.encode('utf-8')
+    entries['[Content_Types].xml'] = entries['[Content_Types].xml'].replace(b'</Types>', (
+        b'<Override PartName="/word/footnotes.xml" ContentType='
+        b'"application/vnd.openxmlformats-officedocument.wordprocessingml.footnotes+xml"/></Types>'
+    ))
+    entries['word/_rels/document.xml.rels'] = entries['word/_rels/document.xml.rels'].replace(b'</Relationships>', (
+        b'<Relationship Id="rIdFootnotes" Target="footnotes.xml" Type='
+        b'"http://schemas.openxmlformats.org/officeDocument/2006/relationships/footnotes"/></Relationships>'
+    ))
+    with zipfile.ZipFile(path, 'w') as target:
+        for name, data in entries.items():
+            target.writestr(name, data)
+
+
+def test_sources_include_variables_of_footnotes(tmp_path):
+    template = make_template(tmp_path / 'template.docx', '{{ last_name_UA }}')
+    add_footnotes(template, FOOTNOTES_XML)
+
+    assert 'diploma' in gen_docx.template_sources(template)
+
+
+def test_sources_include_variables_of_core_properties(tmp_path):
+    document = docx.Document()
+    document.add_paragraph('{{ last_name_UA }}')
+    document.core_properties.title = '{{ document_number }}'
+    document.core_properties.subject = '{{ military_rank }}'
+    template = str(tmp_path / 'template.docx')
+    document.save(template)
+
+    sources = gen_docx.template_sources(template)
+
+    assert {'education_doc', 'military'} <= sources
+    assert 'diploma' not in sources
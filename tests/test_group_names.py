@@ -0,0 +1,36 @@
+"""Кэш названий групп замечает переименование из другого процесса по истечении ttl."""
+import sqlite3
+
+import db
+import group_names
+from config import DB_PATH
+from conftest import add_group
+
+
+def rename(group_id, name):
+    # Как update_groups.py: обычное соединение sqlite3 в обход приложения
+    conn = sqlite3.connect(DB_PATH)
+    conn.execute("UPDATE groups SET name = ? WHERE id = ?", (name, group_id))
+    conn.commit()
+    conn.close()
+
+
+def test_external_rename_is_seen_after_ttl(app, monkeypatch):
+    clock = [1000.0]
+    monkeypatch.setattr(group_names.time, 'monotonic', lambda: clock[0])
+    cache = group_names.GroupNameCache(ttl=60)
+    conn = db.connect()
+    try:
+        group_id = add_group(conn, 'ТТ-11')
+        conn.commit()
+        assert cache.display_names(conn, [group_id])[0].startswith('ТТ-11 (')
+
+        rename(group_id, 'ТТ-21')
+        clock[0] += 30
+        assert cache.display_names(conn, [group_id])[0].startswith('ТТ-11 (')
+        clock[0] += 31
+        assert cache.display_names(conn, [group_id])[0].startswith('ТТ-21 (')
+    finally:
+        conn.execute("DELETE FROM groups WHERE id = ?", (group_id,))
+        conn.commit()
+        conn.dispose()
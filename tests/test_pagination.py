@@ -0,0 +1,40 @@
+"""Токены курсора пагинации: подделанные и устаревшие токены дают первую страницу."""
+import base64
+import json
+
+import pytest
+
+from pagination import decode_cursor, encode_cursor
+
+
+def raw_token(payload):
+    return base64.urlsafe_b64encode(json.dumps(payload).encode('utf-8')).decode('ascii').rstrip('=')
+
+
+@pytest.mark.parametrize('key', ['Петренко', 42, 3.5, None])
+def test_round_trip(key):
+    assert decode_cursor(encode_cursor('id', 'asc', key, 7), 'id', 'asc') == (key, 7)
+
+
+@pytest.mark.parametrize('token', [
+    None,
+    '',
+    'not-a-token',
+    raw_token(['id', 'asc', 1]),
+    raw_token(['id', 'desc', 1, 5]),
+    raw_token(['id', 'asc', 1, '5']),
+    raw_token(['id', 'asc', 1, True]),
+    raw_token(['id', 'asc', [1], 5]),
+    raw_token(['id', 'asc', {'a': 1}, 5]),
+    raw_token(['id', 'asc', False, 5]),
+])
+def test_rejects_invalid_tokens(token):
+    assert decode_cursor(token, 'id', 'asc') is None
+
+
+def test_tampered_cursor_falls_back_to_first_page(client):
+    first = client.get('/students?sort_by=last_name_UA&sort_order=asc')
+    tampered = client.get('/students?sort_by=last_name_UA&sort_order=asc&after=' + raw_token(['last_name_UA', 'asc', [1], 5]))
+
+    assert tampered.status_code == 200
+    assert tampered.data == first.data
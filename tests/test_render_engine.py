@@ -0,0 +1,37 @@
+"""Журнал воркеров рендеринга передаётся процессу приложения через очередь."""
+import logging
+
+import pytest
+
+import utils
+from render_engine import RenderEngine
+
+
+class Collected(logging.Handler):
+    def __init__(self):
+        super().__init__()
+        self.messages = []
+
+    def emit(self, record):
+        self.messages.append(record.getMessage())
+
+
+@pytest.fixture
+def collected():
+    handler = Collected()
+    utils.logger.addHandler(handler)
+    yield handler
+    utils.logger.removeHandler(handler)
+
+
+def test_worker_log_reaches_app_process(collected, tmp_path):
+    missing = str(tmp_path / 'missing.docx')
+    engine = RenderEngine(workers=2)
+    try:
+        results = engine.render_many(missing, [('a', {}), ('b', {})])
+    finally:
+        engine.shutdown()
+
+    assert all(result.error for result in results)
+    # Сообщение _init_worker выводится только в воркере
+    assert any(message.startswith(f"Не вдалося завантажити шаблон {missing} у воркері") for message in collected.messages)
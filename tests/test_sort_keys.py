@@ -0,0 +1,67 @@
+"""Ключи сортировки ФИО: пишутся приложением, база доступна для записи без его функций SQLite."""
+import sqlite3
+
+import pytest
+
+import db
+import sort_keys
+from config import DB_PATH
+
+
+def stored_keys(student_id):
+    conn = db.connect()
+    try:
+        row = conn.execute(f"SELECT {sort_keys.INSERT_COLUMNS} FROM students WHERE id = ?", (student_id,)).fetchone()
+    finally:
+        conn.dispose()
+    return tuple(row)
+
+
+@pytest.fixture
+def group_id(app):
+    conn = db.connect()
+    try:
+        return conn.execute("SELECT id FROM groups WHERE name = 'КН-1'").fetchone()[0]
+    finally:
+        conn.dispose()
+
+
+def test_plain_connection_can_write_students(app, group_id):
+    conn = sqlite3.connect(DB_PATH)
+    try:
+        student_id = conn.execute(
+            "INSERT INTO students (last_name_UA, first_name_UA, group_id) VALUES ('Ґалаган', 'Яна', ?)", (group_id,)
+        ).lastrowid
+        conn.execute("UPDATE students SET last_name_UA = 'Єременко' WHERE id = ?", (student_id,))
+        conn.commit()
+    finally:
+        conn.close()
+
+    rebuild_conn = db.connect()
+    try:
+        assert sort_keys.rebuild(rebuild_conn) >= 1
+    finally:
+        rebuild_conn.dispose()
+    assert stored_keys(student_id) == sort_keys.values('Єременко', 'Яна', None)
+
+
+def test_routes_store_sort_keys(client, group_id):
+    form = {'group_id': group_id, 'birth_date': '01.02.2004', 'last_name_UA': 'Їжак', 'first_name_UA': 'Ірина',
+            'middle_name_UA': 'Олегівна', 'edebo_code': '777'}
+    client.post('/students/add', data=form)
+
+    conn = db.connect()
+    try:
+        student_id = conn.execute("SELECT id FROM students WHERE edebo_code = '777'").fetchone()[0]
+    finally:
+        conn.dispose()
+    assert stored_keys(student_id) == sort_keys.values('Їжак', 'Ірина', 'Олегівна')
+
+    client.post(f'/students/{student_id}/edit', data={**form, 'last_name_UA': 'Бондар', 'last_name_ENG': 'Bondar'})
+
+    assert stored_keys(student_id) == sort_keys.values('Бондар', 'Ірина', 'Олегівна')
+
+
+def test_full_name_key_orders_by_last_name_first():
+    # Є идёт после Е в украинском алфавите, хотя имя Анна раньше Яків
+    assert sort_keys.values('Ейсмонт', 'Яків', '')[-1] < sort_keys.values('Єрмак', 'Анна', '')[-1]
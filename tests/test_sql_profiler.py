@@ -0,0 +1,51 @@
+"""Профиль SQL: время выборки строк учитывается в запросе, который их вернул."""
+import time
+
+import pytest
+
+import db
+from sql_profiler import RequestProfile
+
+ROWS = 5
+DELAY = 0.01
+
+
+@pytest.fixture
+def profiled(tmp_path):
+    conn = db.connect(str(tmp_path / 'profile.db'))
+    conn.create_function('slow', 1, lambda value: time.sleep(DELAY) or value)
+    conn.profiler = RequestProfile()
+    yield conn
+    conn.dispose()
+
+
+QUERY = f"""
+    WITH RECURSIVE n(x) AS (SELECT 1 UNION ALL SELECT x + 1 FROM n WHERE x < {ROWS})
+    SELECT slow(x) FROM n
+"""
+
+
+@pytest.mark.parametrize('fetch', [
+    lambda cursor: cursor.fetchall(),
+    lambda cursor: list(cursor),
+    lambda cursor: cursor.fetchmany(ROWS) + cursor.fetchmany(),
+    lambda cursor: [cursor.fetchone() for _ in range(ROWS + 1)],
+], ids=['fetchall', 'iteration', 'fetchmany', 'fetchone'])
+def test_fetch_time_is_added_to_statement(profiled, fetch):
+    cursor = profiled.execute(QUERY)
+    after_execute = profiled.profiler.total_time
+    rows = [row for row in fetch(cursor) if row is not None]
+
+    assert len(rows) == ROWS
+    assert profiled.profiler.count == 1
+    # execute() вычисляет только первую строку, остальные — при выборке
+    assert after_execute < ROWS * DELAY
+    assert profiled.profiler.total_time >= ROWS * DELAY
+
+
+def test_fetch_is_not_timed_without_profiler(profiled):
+    cursor = profiled.execute("SELECT 1")
+    profiled.profiler = None
+    cursor.execute("SELECT 2")
+
+    assert cursor.fetchall()[0][0] == 2
@@ -0,0 +1,144 @@
+"""Запросы страницы списка студентов: их число не зависит от per_page, счётчики заполненности верны."""
+from contextlib import contextmanager
+
+import pytest
+from flask import template_rendered
+
+import db
+from routes.students import student_count_cache
+
+
+@contextmanager
+def traced_statements(monkeypatch):
+    """Собирает SQL всех соединений, которые запрос берёт из пула."""
+    statements = []
+    acquire = db.pool.acquire
+
+    def traced_acquire():
+        conn = acquire()
+        conn.set_trace_callback(statements.append)
+        return conn
+
+    with monkeypatch.context() as patch:
+        patch.setattr(db.pool, 'acquire', traced_acquire)
+        yield statements
+
+
+@contextmanager
+def rendered_students(app):
+    """Список студентов, переданный в шаблон страницы."""
+    captured = []
+
+    def record(sender, template, context, **extra):
+        if 'students' in context:
+            captured.append(context['students'])
+
+    template_rendered.connect(record, app)
+    try:
+        yield captured
+    finally:
+        template_rendered.disconnect(record, app)
+
+
+def count_statements(client, monkeypatch, per_page):
+    # Количество студентов кэшируется — сбрасываем, чтобы страницы были в равных условиях
+    student_count_cache.clear()
+    with traced_statements(monkeypatch) as statements:
+        response = client.get(f'/students?per_page={per_page}')
+    assert response.status_code == 200
+    return len(statements)
+
+
+def test_query_count_does_not_depend_on_per_page(client, monkeypatch):
+    # Первый запрос заполняет кэши прав и групп пользователя
+    client.get('/students')
+
+    counts = {per_page: count_statements(client, monkeypatch, per_page) for per_page in (10, 100)}
+
+    assert counts[10] == counts[100]
+
+
+def old_counters(conn, student):
+    """Счётчики оценок и активностей так, как их считал прежний цикл по студентам страницы."""
+    subjects = conn.execute("SELECT id FROM subjects WHERE group_id = ?", (student['group_id'],)).fetchall()
+    grades = conn.execute("SELECT grade FROM grades WHERE student_id = ?", (student['id'],)).fetchall()
+    grades_filled = sum(1 for grade in grades if grade['grade'] is not None and str(grade['grade']).strip())
+    practices = conn.execute("SELECT id FROM practices WHERE group_id = ?", (student['group_id'],)).fetchall()
+    courseworks = conn.execute("SELECT id FROM courseworks WHERE group_id = ?", (student['group_id'],)).fetchall()
+    attestations = conn.execute("SELECT id FROM attestations WHERE group_id = ?", (student['group_id'],)).fetchall()
+    activities_grades = conn.execute(
+        "SELECT grade FROM activity_grades WHERE student_id = ? AND entity_type IN ('practice', 'coursework', 'attestation')",
+        (student['id'],)
+    ).fetchall()
+    activities_total = len(practices) + len(courseworks) + len(attestations)
+    activities_filled = sum(1 for grade in activities_grades if grade['grade'] is not None and str(grade['grade']).strip())
+    return {
+        'has_grades': len(subjects) > 0,
+        'grades_filled': grades_filled,
+        'grades_total': len(subjects),
+        'grades_fill_percentage': (grades_filled / len(subjects) * 100) if subjects else 0,
+        'has_activities': activities_total > 0,
+        'activities_filled_fields': activities_filled,
+        'activities_total_fields': activities_total,
+        'activities_fill_percentage': (activities_filled / activities_total * 100) if activities_total > 0 else 0,
+    }
+
+
+@pytest.mark.parametrize('per_page', [10, 100])
+def test_counters_match_per_student_loop(app, client, per_page):
+    with rendered_students(app) as captured:
+        client.get(f'/students?per_page={per_page}')
+    students = captured[-1]
+
+    conn = db.connect()
+    try:
+        expected = {student['id']: old_counters(conn, student) for student in students}
+    finally:
+        conn.dispose()
+
+    assert len(students) == per_page
+    for student in students:
+        assert {key: student[key] for key in expected[student['id']]} == expected[student['id']]
+
+
+def test_completeness_follows_grade_changes(app, client):
+    conn = db.connect()
+    student_id, subject_id = conn.execute("""
+        SELECT s.id, sub.id FROM students s JOIN subjects sub ON sub.group_id = s.group_id
+        WHERE NOT EXISTS (SELECT 1 FROM grades g WHERE g.student_id = s.id AND g.subject_id = sub.id)
+        ORDER BY s.id DESC LIMIT 1
+    """).fetchone()
+    before = conn.execute(
+        "SELECT grades_filled FROM student_completeness WHERE student_id = ?", (student_id,)
+    ).fetchone()[0]
+    conn.execute("INSERT INTO grades (student_id, subject_id, grade) VALUES (?, ?, '75')", (student_id, subject_id))
+    conn.commit()
+    conn.dispose()
+
+    with rendered_students(app) as captured:
+        client.get('/students?per_page=100')
+    student = next(student for student in captured[-1] if student['id'] == student_id)
+
+    assert student['grades_filled'] == before + 1
+
+
+@pytest.mark.parametrize('sort_by', ['id', 'last_name_UA', 'birth_date'])
+def test_scope_limits_list_to_user_groups(app, curator_client, sort_by):
+    conn = db.connect()
+    try:
+        allowed = {row['id'] for row in conn.execute("""
+            SELECT s.id FROM students s JOIN user_groups ug ON ug.group_id = s.group_id
+            JOIN users u ON u.id = ug.user_id WHERE u.username = 'curator'
+        """)}
+    finally:
+        conn.dispose()
+
+    with rendered_students(app) as captured:
+        response = curator_client.get(f'/students?per_page=100&sort_by={sort_by}&sort_order=asc')
+    page = captured[-1]
+    with rendered_students(app) as captured:
+        curator_client.get(f'/students?per_page=100&sort_by={sort_by}&sort_order=asc&page=2')
+    page += captured[-1]
+
+    assert response.status_code == 200
+    assert page and {student['id'] for student in page} <= allowed
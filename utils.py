@@ -1,8 +1,12 @@
 from functools import wraps
-from flask import session, redirect, url_for, flash
+from flask import session, redirect, url_for, flash, has_request_context
 import logging
 import os
+from logging.handlers import QueueHandler, QueueListener, RotatingFileHandler
+from config import LOG_MAX_BYTES, LOG_BACKUP_COUNT
 from db import get_db
+import audit
+import permissions
 import json
 
 # Настройка пути к файлу
@@ -17,57 +21,65 @@ logger.setLevel(logging.DEBUG)
 if logger.handlers:
     logger.handlers.clear()
 
-# Создаем обработчики
-file_handler = logging.FileHandler(log_file_path, encoding='utf-8')
-console_handler = logging.StreamHandler()
-
 # Форматирование
 formatter = logging.Formatter('%(asctime)s %(levelname)s | %(message)s ', datefmt='%Y-%m-%d | %H:%M:%S |')
-file_handler.setFormatter(formatter)
-console_handler.setFormatter(formatter)
 
-# Добавляем обработчики к логгеру
-logger.addHandler(file_handler)
+# При импорте — только консоль. Файл app.log открывает процесс приложения
+# (configure_file_logging), воркеры рендеринга пишут через очередь (log_to_queue)
+console_handler = logging.StreamHandler()
+console_handler.setFormatter(formatter)
 logger.addHandler(console_handler)
+file_handler = None
+
+def configure_file_logging():
+    """
+    Подключает к логгеру файл app.log. Вызывается один раз в процессе приложения.
+    """
+    global file_handler
+    if file_handler is not None:
+        return
+    # Ротация по размеру: журнал не растёт бесконечно, log_reader.py читает и ротированные файлы
+    file_handler = RotatingFileHandler(log_file_path, maxBytes=LOG_MAX_BYTES, backupCount=LOG_BACKUP_COUNT, encoding='utf-8', delay=True)
+    file_handler.setFormatter(formatter)
+    logger.addHandler(file_handler)
+
+    # Проверка создания файла логов
+    try:
+        with open(log_file_path, 'a', encoding='utf-8'):
+            pass
+        logger.debug(f"Логирование инициализировано. Файл логов: {log_file_path}")
+    except Exception as e:
+        logger.error(f"Ошибка при доступе к файлу логов {log_file_path}: {e}")
+        print(f"Ошибка при доступе к файлу логов: {e}")
+
+def log_to_queue(log_queue):
+    """
+    Направляет логгер дочернего процесса в очередь; записи выводит процесс
+    приложения (log_queue_listener).
+    """
+    logger.handlers.clear()
+    logger.addHandler(QueueHandler(log_queue))
+
+def log_queue_listener(log_queue):
+    """
+    Запущенный слушатель, который передаёт записи из очереди обработчикам логгера
+    этого процесса (консоль и app.log).
+    """
+    listener = QueueListener(log_queue, *logger.handlers, respect_handler_level=True)
+    listener.start()
+    return listener
 
-# Проверка создания файла логов
-try:
-    with open(log_file_path, 'a', encoding='utf-8'):
-        pass
-    logger.debug(f"Логирование инициализировано. Файл логов: {log_file_path}")
-except Exception as e:
-    logger.error(f"Ошибка при доступе к файлу логов {log_file_path}: {e}")
-    print(f"Ошибка при доступе к файлу логов: {e}")
-
-def log_action(username, action, group_ids=None, mode=None):
-    """Логирование действий пользователя."""
-    conn = get_db()
-    role = session.get('role')  # Получаем роль пользователя из сессии
-
-    # Определяем строку с группами только если есть group_ids и роль не admin
-    group_names_str = ''
-    if group_ids is not None and role != 'admin':
-        placeholders = ','.join('?' for _ in group_ids)
-        group_names = conn.execute(
-            f"""
-            SELECT name || ' (' || start_year || ', ' || study_form || ', ' || program_credits || ' кредитів)' AS display_name
-            FROM groups
-            WHERE id IN ({placeholders})
-            ORDER BY name, start_year
-            """,
-            group_ids
-        ).fetchall()
-        group_names_str = ', '.join([row['display_name'] for row in group_names]) if group_names else 'немає груп'
-
-    conn.close()
-
-    # Формируем лог с учетом режима, если он передан
-    if mode:
-        logger.info(f"👤 {username} - {action} (режим: {mode})")
-    elif group_names_str:
-        logger.info(f"👤 {username} - {action} (групи: {group_names_str})")
-    else:
-        logger.info(f"👤 {username} - {action}")
+def log_action(username, action, group_ids=None, mode=None, student_id=None):
+    """Логирование действий пользователя.
+
+    Событие ставится в очередь audit.py: запись в audit_log и app.log
+    выполняет фоновый поток, поток запроса не ждёт ввода-вывода.
+    """
+    user_id = role = None
+    if has_request_context():
+        user_id = session.get('user_id')
+        role = session.get('role')  # Получаем роль пользователя из сессии
+    audit.record(username, action, group_ids=group_ids, mode=mode, student_id=student_id, user_id=user_id, role=role)
 
 def login_required(role=None):
     """Декоратор для проверки авторизации и роли пользователя (стара версія для сумісності).
@@ -98,26 +110,20 @@ def permission_required(permission=None):
                 flash('Потрібна авторизація', 'danger')
                 return redirect(url_for('auth.login'))
 
-            # Спочатку перевіряємо сесію (кеш)
-            is_admin = session.get('is_admin', False)
-            perms = session.get('permissions', [])
-
-            # Якщо немає в сесії, завантажуємо з БД
-            if not hasattr(session, 'is_admin'):
-                conn = get_db()
-                user = conn.execute("""
-                    SELECT role, is_admin, permissions 
-                    FROM users 
-                    WHERE id = ?
-                """, (session['user_id'],)).fetchone()
-                conn.close()
-                if not user:
-                    session.clear()
-                    return redirect(url_for('auth.login'))
-                is_admin = bool(user['is_admin']) or (user['role'] == 'admin')
-                perms = json.loads(user['permissions'] or '[]')
+            # Права беруться из кэша процесса (permissions.py); к базе — только при промахе
+            user = permissions.cache.get(get_db, session['user_id'])
+            if user is None:
+                session.clear()
+                return redirect(url_for('auth.login'))
+            is_admin = user.is_admin
+            perms = user.permissions
+
+            # Копия в сессии нужна шаблонам (меню); обновляем её только при изменении
+            if session.get('is_admin') != is_admin or session.get('permissions') != perms:
                 session['is_admin'] = is_admin
                 session['permissions'] = perms
+            if session.get('role') != user.role:
+                session['role'] = user.role
 
             if permission is None:
                 return f(*args, **kwargs)